@@ -1,6 +1,7 @@
 import librosa
 import librosa.filters
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 # import tensorflow as tf
 from scipy import signal
 from scipy.io import wavfile
@@ -50,6 +51,115 @@ def melspectrogram(wav):
         return _normalize(S)
     return S
 
+class MelChunks:
+    """The mel window of every video frame, backed by a strided view of the spectrogram.
+
+    ``windows`` is a read-only ``(n_windows, num_mels, mel_step_size)`` view
+    where window ``j`` is ``mel[:, j:j + mel_step_size]``, and ``starts`` holds
+    the window used by each video frame. Indexing with an int returns a view;
+    indexing with a slice or array gathers the batch in a single copy.
+    """
+
+    def __init__(self, windows, starts):
+        self.windows = windows
+        self.starts = starts
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        return self.windows[self.starts[index]]
+
+    def __iter__(self):
+        for start in self.starts:
+            yield self.windows[start]
+
+def mel_chunks(mel, fps, mel_step_size=16):
+    """Split a ``(num_mels, T)`` spectrogram into one window per video frame.
+
+    Frame ``i`` starts at ``int(i * 80 / fps)``; the last frame is clamped to
+    the final ``mel_step_size`` columns, so ``len()`` and every window match
+    the original per-frame slicing loop. No mel data is copied.
+    """
+    num_mels, length = mel.shape
+    if length < mel_step_size:
+        raise ValueError('Audio is too short: {} mel frames, need at least {}'.format(length, mel_step_size))
+
+    mel_idx_multiplier = 80. / fps
+    last_start = length - mel_step_size
+    count = int(np.ceil((last_start + 1) / mel_idx_multiplier)) + 1
+    starts = (np.arange(count) * mel_idx_multiplier).astype(np.int64)
+    starts = np.append(starts[starts <= last_start], last_start)
+
+    windows = as_strided(mel, shape=(last_start + 1, num_mels, mel_step_size),
+                         strides=(mel.strides[1], mel.strides[0], mel.strides[1]),
+                         writeable=False)
+    return MelChunks(windows, starts)
+
+def frame_levels(mel, fps, num_frames):
+    """Loudness of each video frame in dB (relative to ``hp.ref_level_db``).
+
+    A frame's level is that of its loudest mel column, each column being
+    averaged over the mel bands of the (denormalized) spectrogram.
+    """
+    column = (_denormalize(mel) if hp.signal_normalization else mel).mean(axis=0)
+    starts = np.minimum((np.arange(num_frames) * (80. / fps)).astype(np.int64), len(column) - 1)
+    return np.maximum.reduceat(column, starts)
+
+def speech_mask(levels, threshold_db=40.):
+    """True for frames louder than ``threshold_db`` below the loudest frame."""
+    return levels > levels.max() - threshold_db
+
+def silence_runs(speech):
+    """``(start, end)`` of every run of non-speech frames in a speech mask."""
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], ~speech, [0]]).astype(np.int8)))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+def lip_sync_weights(speech, min_silence, fade):
+    """Weight of the lip-synced face in each frame, from a speech mask.
+
+    Weights are 0 inside silences of at least ``min_silence`` frames, where
+    the original frame can be used without running the model, and 1
+    elsewhere. Over the first and last ``fade`` frames of each such silence
+    they ramp down and back up, for a crossfade between the two.
+    """
+    weights = np.ones(len(speech))
+    ramp = np.arange(1, fade + 1) / (fade + 1.)
+    for start, end in silence_runs(speech):
+        if end - start < max(min_silence, 2 * fade + 1):
+            continue
+        weights[start:end] = 0.
+        if start > 0:
+            weights[start:start + fade] = ramp[::-1]
+        if end < len(speech):
+            weights[end - fade:end] = ramp
+    return weights
+
+def split_at_silence(speech, segment_frames, quantum=1):
+    """Split frames ``[0, len(speech))`` into ``(start, end)`` segments of about ``segment_frames``.
+
+    Each cut goes in the middle of the longest silence between 0.5x and 1.5x
+    ``segment_frames`` after the previous cut, or at ``segment_frames`` when
+    there is none, rounded to a multiple of ``quantum`` frames.
+    """
+    n = len(speech)
+    runs = silence_runs(speech)
+    cuts = [0]
+    while n - cuts[-1] > segment_frames * 3 // 2:
+        lo, hi = cuts[-1] + segment_frames // 2, cuts[-1] + segment_frames * 3 // 2
+        best = None
+        for start, end in runs:
+            start, end = max(start, lo), min(end, hi)
+            if end > start and (best is None or end - start > best[1] - best[0]):
+                best = (start, end)
+        cut = (best[0] + best[1]) // 2 if best else cuts[-1] + segment_frames
+        cut = max(int(round(cut / quantum)) * quantum, cuts[-1] + quantum)
+        if cut >= n:
+            break
+        cuts.append(cut)
+    cuts.append(n)
+    return list(zip(cuts[:-1], cuts[1:]))
+
 def _lws_processor():
     import lws
     return lws.lws(hp.n_fft, get_hop_size(), fftsize=hp.win_size, mode="speech")
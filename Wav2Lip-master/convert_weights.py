@@ -0,0 +1,49 @@
+import argparse, os, time
+import torch
+
+import mmap_weights
+from models import Wav2Lip
+from face_detection.detection.sfd.net_s3fd import s3fd
+
+parser = argparse.ArgumentParser(description='Convert Wav2Lip and S3FD checkpoints to memory-mappable weight files')
+
+parser.add_argument('--checkpoint_path', type=str, help='Wav2Lip checkpoint to convert', default=None)
+parser.add_argument('--outfile', type=str, help='Converted generator weights, defaults to the checkpoint path with .safetensors', default=None)
+
+parser.add_argument('--s3fd_path', type=str, help='S3FD weights to convert as well', default=None)
+parser.add_argument('--s3fd_outfile', type=str, help='Converted detector weights, defaults to the weights path with .safetensors', default=None)
+
+parser.add_argument('--half', default=False, action='store_true',
+					help='Store fp16 weights (half the file size; upcast to fp32 on load, so not page-shared)')
+
+def convert(path, outfile, net, half):
+	start = time.perf_counter()
+	state_dict = mmap_weights.strip_checkpoint(torch.load(path, map_location=lambda storage, loc: storage))
+	pickle_seconds = time.perf_counter() - start
+	net.load_state_dict(state_dict)
+
+	outfile = outfile or os.path.splitext(path)[0] + '.safetensors'
+	mmap_weights.save(state_dict, outfile, half=half, metadata={'source': mmap_weights.source_signature(path)})
+
+	start = time.perf_counter()
+	converted, _ = mmap_weights.load(outfile, dtype=torch.float32)
+	mmap_seconds = time.perf_counter() - start
+	mmap_weights.assign(net, converted)
+	error = max(float((state_dict[k].float() - converted[k]).abs().max()) for k in state_dict)
+
+	print('Converted {} to {}'.format(path, outfile))
+	print('  size {:.1f} MB -> {:.1f} MB, load {:.3f}s (torch.load) -> {:.3f}s (mmap), max abs error {:.2e}'.format(
+		os.path.getsize(path) / 2 ** 20, os.path.getsize(outfile) / 2 ** 20, pickle_seconds, mmap_seconds, error))
+
+def main():
+	args = parser.parse_args()
+	if args.checkpoint_path is None and args.s3fd_path is None:
+		parser.error('nothing to convert, pass --checkpoint_path and/or --s3fd_path')
+
+	if args.checkpoint_path is not None:
+		convert(args.checkpoint_path, args.outfile, Wav2Lip(), args.half)
+	if args.s3fd_path is not None:
+		convert(args.s3fd_path, args.s3fd_outfile, s3fd(), args.half)
+
+if __name__ == '__main__':
+	main()
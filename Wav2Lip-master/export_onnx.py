@@ -0,0 +1,57 @@
+import argparse, os
+import torch
+
+import onnx_backend
+from models import Wav2Lip
+from face_detection.detection.sfd.net_s3fd import s3fd
+
+parser = argparse.ArgumentParser(description='Export the Wav2Lip generator and the S3FD face detector to ONNX')
+
+parser.add_argument('--checkpoint_path', type=str, help='Name of saved checkpoint to load weights from', required=True)
+parser.add_argument('--outfile', type=str, help='ONNX file for the generator, defaults to the checkpoint path with .onnx', default=None)
+
+parser.add_argument('--s3fd_path', type=str, help='S3FD weights to export as well', default=None)
+parser.add_argument('--s3fd_outfile', type=str, help='ONNX file for the detector, defaults to the weights path with .onnx', default=None)
+
+parser.add_argument('--opset', type=int, default=onnx_backend.OPSET)
+parser.add_argument('--skip_verify', default=False, action='store_true',
+					help='Do not compare ONNX Runtime outputs against PyTorch after exporting')
+
+def load_wav2lip(path):
+	checkpoint = torch.load(path, map_location=lambda storage, loc: storage)
+	s = checkpoint["state_dict"]
+	new_s = {}
+	for k, v in s.items():
+		new_s[k.replace('module.', '')] = v
+	model = Wav2Lip()
+	model.load_state_dict(new_s)
+	return model.eval()
+
+def load_s3fd(path):
+	net = s3fd()
+	net.load_state_dict(torch.load(path, map_location=lambda storage, loc: storage))
+	return net.eval()
+
+def main():
+	args = parser.parse_args()
+
+	outfile = args.outfile or os.path.splitext(args.checkpoint_path)[0] + '.onnx'
+	model = load_wav2lip(args.checkpoint_path)
+	onnx_backend.export_wav2lip(model, outfile, args.opset)
+	print('Exported Wav2Lip to {}'.format(outfile))
+	if not args.skip_verify:
+		print('Max abs error vs PyTorch: {:.2e}'.format(onnx_backend.verify_wav2lip(model, outfile)))
+	# The backend exports again when the checkpoint no longer matches this record
+	onnx_backend.record_source(outfile, args.checkpoint_path)
+
+	if args.s3fd_path is not None:
+		s3fd_outfile = args.s3fd_outfile or os.path.splitext(args.s3fd_path)[0] + '.onnx'
+		net = load_s3fd(args.s3fd_path)
+		onnx_backend.export_s3fd(net, s3fd_outfile, args.opset)
+		print('Exported S3FD to {}'.format(s3fd_outfile))
+		if not args.skip_verify:
+			print('Max abs error vs PyTorch: {:.2e}'.format(onnx_backend.verify_s3fd(net, s3fd_outfile)))
+		onnx_backend.record_source(s3fd_outfile, args.s3fd_path)
+
+if __name__ == '__main__':
+	main()
@@ -5,3 +5,4 @@ __email__ = 'adrian.bulat@nottingham.ac.uk'
 __version__ = '1.0.1'
 
 from .api import FaceAlignment, LandmarksType, NetworkSize
+from .shared import SharedFaceDetector, DetectorClosedError, get_shared_detector
@@ -45,7 +45,7 @@ ROOT = os.path.dirname(os.path.abspath(__file__))
 
 class FaceAlignment:
     def __init__(self, landmarks_type, network_size=NetworkSize.LARGE,
-                 device='cuda', flip_input=False, face_detector='sfd', verbose=False):
+                 device='cuda', flip_input=False, face_detector='sfd', verbose=False, **detector_kwargs):
         self.device = device
         self.flip_input = flip_input
         self.landmarks_type = landmarks_type
@@ -59,9 +59,20 @@ class FaceAlignment:
         # Get the face detector
         face_detector_module = __import__('face_detection.detection.' + face_detector,
                                           globals(), locals(), [face_detector], 0)
-        self.face_detector = face_detector_module.FaceDetector(device=device, verbose=verbose)
-
-    def get_detections_for_batch(self, images):
+        self.face_detector = face_detector_module.FaceDetector(device=device, verbose=verbose, **detector_kwargs)
+
+    def get_detections_for_batch(self, images, scale=1.0):
+        """Face box ``(x1, y1, x2, y2)`` (or None) per BGR image of the batch.
+
+        With ``scale < 1`` the detector runs on a copy of the batch downscaled
+        by that factor, and the boxes are mapped back to full resolution.
+        S3FD's cost grows with the pixel count, so ``scale=0.5`` detects a
+        1080p frame for about a quarter of the cost.
+        """
+        if scale != 1.0:
+            height, width = images.shape[1:3]
+            size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+            images = np.stack([cv2.resize(image, size, interpolation=cv2.INTER_AREA) for image in images])
         images = images[..., ::-1]
         detected_faces = self.face_detector.detect_from_batch(images.copy())
         results = []
@@ -73,7 +84,7 @@ class FaceAlignment:
             d = d[0]
             d = np.clip(d, 0, None)
             
-            x1, y1, x2, y2 = map(int, d[:-1])
+            x1, y1, x2, y2 = map(int, d[:-1] / scale)
             results.append((x1, y1, x2, y2))
 
         return results
\ No newline at end of file
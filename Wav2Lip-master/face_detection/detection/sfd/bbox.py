@@ -10,6 +10,11 @@ import argparse
 import numpy as np
 import torch
 
+try:
+    from torchvision.ops import batched_nms as _tv_batched_nms
+except BaseException:
+    _tv_batched_nms = None
+
 try:
     from iou import IOU
 except BaseException:
@@ -64,6 +69,62 @@ def nms(dets, thresh):
     return keep
 
 
+def batch_nms(bboxlists, thresh, score_thresh=None):
+    """Greedy NMS over every image of a batch at once.
+
+    Args:
+        bboxlists: (array) detections from batch_detect, Shape: [num_boxes, B, 5]
+        thresh: (float) IoU above which the lower scoring box is suppressed
+        score_thresh: (float) drop boxes scoring <= this before NMS. Boxes are
+            visited in score order, so this gives the same survivors above the
+            threshold as filtering after NMS, on far fewer candidates.
+    Return:
+        list of B arrays of kept row indices into bboxlists, highest score first
+    """
+    dets = np.ascontiguousarray(np.asarray(bboxlists).transpose(1, 0, 2))    # (B, N, 5)
+    B, N = dets.shape[:2]
+    scores = dets[:, :, 4]
+    valid = np.ones((B, N), dtype=bool) if score_thresh is None else scores > score_thresh
+
+    if _tv_batched_nms is not None:
+        img_idx, box_idx = np.nonzero(valid)
+        boxes = torch.from_numpy(dets[img_idx, box_idx, :4].astype(np.float32))
+        # (x2 + 1, y2 + 1) reproduces the inclusive-pixel areas used by nms()
+        boxes[:, 2:] += 1
+        keep = _tv_batched_nms(boxes, torch.from_numpy(scores[img_idx, box_idx].astype(np.float32)),
+                               torch.from_numpy(img_idx), thresh).numpy()
+        # Group by image while keeping the descending score order inside each image
+        keep = keep[np.argsort(img_idx[keep], kind='stable')]
+        counts = np.bincount(img_idx[keep], minlength=B)
+        return np.split(box_idx[keep], np.cumsum(counts)[:-1])
+
+    # NumPy fallback: sort each image by score, then run the greedy pass over
+    # candidate ranks with every image of the batch processed together.
+    order = np.argsort(-np.where(valid, scores, -np.inf), axis=1, kind='stable')
+    M = int(valid.sum(1).max()) if N else 0
+    order = order[:, :M]
+    alive = np.take_along_axis(valid, order, 1)
+    d = np.take_along_axis(dets, order[:, :, None], 1)
+
+    x1, y1, x2, y2 = d[:, :, 0], d[:, :, 1], d[:, :, 2], d[:, :, 3]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    xx1 = np.maximum(x1[:, :, None], x1[:, None, :])
+    yy1 = np.maximum(y1[:, :, None], y1[:, None, :])
+    xx2 = np.minimum(x2[:, :, None], x2[:, None, :])
+    yy2 = np.minimum(y2[:, :, None], y2[:, None, :])
+    w, h = np.maximum(0.0, xx2 - xx1 + 1), np.maximum(0.0, yy2 - yy1 + 1)
+    inter = w * h
+    ovr = inter / (areas[:, :, None] + areas[:, None, :] - inter)    # (B, M, M)
+
+    later = np.triu(np.ones((M, M), dtype=bool), 1)
+    for k in range(M):
+        alive &= ~(alive[:, k:k + 1] & (ovr[:, k, :] > thresh) & later[k])
+
+    img_idx, rank = np.nonzero(alive)
+    counts = np.bincount(img_idx, minlength=B)
+    return np.split(order[img_idx, rank], np.cumsum(counts)[:-1])
+
+
 def encode(matched, priors, variances):
     """Encode the variances from the priorbox layers into the ground truth boxes
     we have matched (based on jaccard overlap) with the prior boxes.
@@ -67,29 +67,40 @@ def batch_detect(net, imgs, device):
     with torch.no_grad():
         olist = net(imgs)
 
-    bboxlist = []
     for i in range(len(olist) // 2):
         olist[i * 2] = F.softmax(olist[i * 2], dim=1)
     olist = [oelem.data.cpu() for oelem in olist]
+
+    return decode_batch(olist)
+
+def decode_batch(olist):
+    """(N, BB, 5) boxes and scores of every anchor hit in the softmaxed S3FD outputs ``olist``."""
+    BB = olist[0].size(0)
+
+    # Gather every anchor whose face score passes the threshold in any image,
+    # across all feature-map levels, and decode them in a single batched call.
+    # Rows keep the same order as a per-hit loop over np.where(ocls > 0.05).
+    locs, priors, scores = [], [], []
     for i in range(len(olist) // 2):
         ocls, oreg = olist[i * 2], olist[i * 2 + 1]
-        FB, FC, FH, FW = ocls.size()  # feature map size
         stride = 2**(i + 2)    # 4,8,16,32,64,128
         anchor = stride * 4
-        poss = zip(*np.where(ocls[:, 1, :, :] > 0.05))
-        for Iindex, hindex, windex in poss:
-            axc, ayc = stride / 2 + windex * stride, stride / 2 + hindex * stride
-            score = ocls[:, 1, hindex, windex]
-            loc = oreg[:, :, hindex, windex].contiguous().view(BB, 1, 4)
-            priors = torch.Tensor([[axc / 1.0, ayc / 1.0, stride * 4 / 1.0, stride * 4 / 1.0]]).view(1, 1, 4)
-            variances = [0.1, 0.2]
-            box = batch_decode(loc, priors, variances)
-            box = box[:, 0] * 1.0
-            # cv2.rectangle(imgshow,(int(x1),int(y1)),(int(x2),int(y2)),(0,0,255),1)
-            bboxlist.append(torch.cat([box, score.unsqueeze(1)], 1).cpu().numpy())
-    bboxlist = np.array(bboxlist)
-    if 0 == len(bboxlist):
-        bboxlist = np.zeros((1, BB, 5))
+        _, hindex, windex = torch.nonzero(ocls[:, 1, :, :] > 0.05, as_tuple=True)
+        axc = stride / 2 + windex.float() * stride
+        ayc = stride / 2 + hindex.float() * stride
+        wh = torch.full_like(axc, anchor)
+        priors.append(torch.stack([axc, ayc, wh, wh], 1))    # (N, 4)
+        locs.append(oreg[:, :, hindex, windex].permute(2, 0, 1))    # (N, BB, 4)
+        scores.append(ocls[:, 1, hindex, windex].t())    # (N, BB)
+
+    priors = torch.cat(priors, 0)
+    if 0 == len(priors):
+        return np.zeros((1, BB, 5))
+
+    variances = [0.1, 0.2]
+    boxes = batch_decode(torch.cat(locs, 0), priors.unsqueeze(1), variances)
+    scores = torch.cat(scores, 0).unsqueeze(2)
+    bboxlist = torch.cat([boxes, scores], 2).numpy()    # (N, BB, 5)
 
     return bboxlist
 
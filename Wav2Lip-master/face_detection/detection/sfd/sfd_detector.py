@@ -14,17 +14,30 @@ models_urls = {
 
 
 class SFDDetector(FaceDetector):
-    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False):
+    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False,
+                 path_to_onnx=None):
         super(SFDDetector, self).__init__(device, verbose)
 
-        # Initialise the face detector
-        if not os.path.isfile(path_to_detector):
-            model_weights = load_url(models_urls['s3fd'])
-        else:
-            model_weights = torch.load(path_to_detector)
+        # Exported network run by ONNX Runtime on the CPU instead of eager PyTorch
+        if path_to_onnx is not None:
+            from onnx_backend import OnnxS3FD
+            self.device = 'cpu'
+            self.face_detector = OnnxS3FD(path_to_onnx)
+            return
 
+        # Initialise the face detector
         self.face_detector = s3fd()
-        self.face_detector.load_state_dict(model_weights)
+        if path_to_detector is not None and path_to_detector.endswith('.safetensors'):
+            # Converted weights are memory-mapped instead of unpickled
+            import mmap_weights
+            model_weights, _ = mmap_weights.load(path_to_detector, dtype=torch.float32)
+            mmap_weights.assign(self.face_detector, model_weights)
+        else:
+            if path_to_detector is None or not os.path.isfile(path_to_detector):
+                model_weights = load_url(models_urls['s3fd'])
+            else:
+                model_weights = torch.load(path_to_detector)
+            self.face_detector.load_state_dict(model_weights)
         self.face_detector.to(device)
         self.face_detector.eval()
 
@@ -40,9 +53,8 @@ class SFDDetector(FaceDetector):
 
     def detect_from_batch(self, images):
         bboxlists = batch_detect(self.face_detector, images, device=self.device)
-        keeps = [nms(bboxlists[:, i, :], 0.3) for i in range(bboxlists.shape[1])]
+        keeps = batch_nms(bboxlists, 0.3, score_thresh=0.5)
         bboxlists = [bboxlists[keep, i, :] for i, keep in enumerate(keeps)]
-        bboxlists = [[x for x in bboxlist if x[-1] > 0.5] for bboxlist in bboxlists]
 
         return bboxlists
 
@@ -0,0 +1,103 @@
+import threading
+import queue
+from concurrent.futures import Future
+
+import numpy as np
+
+from .api import FaceAlignment, LandmarksType
+
+
+class DetectorClosedError(RuntimeError):
+    """Raised for detection requests made after the shared detector was closed."""
+
+
+class SharedFaceDetector:
+    """A long-lived face detector that can be shared between threads and jobs.
+
+    The S3FD weights are loaded once. Detection requests from any thread are
+    put on a bounded queue and executed in order by a single worker thread, so
+    callers block (back-pressure) instead of piling up batches when the
+    detector is saturated.
+
+    Arguments:
+        device {string} -- 'cpu' or 'cuda'
+        max_pending {int} -- maximum number of queued detection requests
+        warmup {bool} -- run a dummy batch at start-up to initialise kernels
+    """
+
+    def __init__(self, device='cuda', max_pending=8, warmup=True, **detector_kwargs):
+        self.device = device
+        self.fa = FaceAlignment(LandmarksType._2D, flip_input=False, device=device, **detector_kwargs)
+        self.closed = False
+
+        self._requests = queue.Queue(maxsize=max_pending)
+        self._worker = threading.Thread(target=self._run, name='s3fd-detector', daemon=True)
+        self._worker.start()
+
+        if warmup:
+            self.warm_up()
+
+    @property
+    def face_detector(self):
+        return self.fa.face_detector
+
+    def submit(self, images, scale=1.0):
+        """Queue a batch of BGR images, returns a Future of the per-image boxes.
+
+        ``scale`` is passed to ``FaceAlignment.get_detections_for_batch``.
+        """
+        if self.closed:
+            raise DetectorClosedError('Face detector has been closed')
+        future = Future()
+        self._requests.put((future, images, scale))
+        return future
+
+    def get_detections_for_batch(self, images, scale=1.0):
+        return self.submit(images, scale).result()
+
+    def warm_up(self, size=128):
+        """Run a blank batch so cudnn / oneDNN kernels are initialised before the first job."""
+        self.get_detections_for_batch(np.zeros((1, size, size, 3), dtype=np.uint8))
+
+    def pending(self):
+        return self._requests.qsize()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._requests.put((None, None, None))
+        self._worker.join()
+
+    def _run(self):
+        while True:
+            future, images, scale = self._requests.get()
+            if future is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.fa.get_detections_for_batch(images, scale))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+_shared_detectors = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_detector(device='cuda', path_to_detector=None, max_pending=8, path_to_onnx=None):
+    """Return the process-wide detector for a device, creating it on first use.
+
+    With ``path_to_onnx`` the exported S3FD runs on ONNX Runtime (CPU) instead.
+    """
+    key = (device, path_to_detector, path_to_onnx)
+    with _shared_lock:
+        detector = _shared_detectors.get(key)
+        if detector is None or detector.closed:
+            kwargs = {} if path_to_detector is None else {'path_to_detector': path_to_detector}
+            if path_to_onnx is not None:
+                kwargs['path_to_onnx'] = path_to_onnx
+            detector = SharedFaceDetector(device=device, max_pending=max_pending, **kwargs)
+            _shared_detectors[key] = detector
+        return detector
@@ -0,0 +1,63 @@
+"""Inference-time Conv + BatchNorm folding for the ``models.conv`` blocks.
+
+``models.conv.Conv2d`` and ``Conv2dTranspose`` run conv -> BatchNorm ->
+activation as separate ops. In eval mode the BatchNorm is an affine
+transform per output channel, so it can be folded into the conv weight and
+bias, leaving one kernel per block. Fusion applies to ``Wav2Lip`` and
+``SyncNet_color``; ``Wav2Lip_disc_qual`` is built from ``nonorm_Conv2d``
+blocks and has nothing to fold.
+"""
+
+import copy
+
+import torch
+from torch import nn
+
+
+def fold_batchnorm(conv, bn):
+    """Return a copy of ``conv`` with the eval-mode ``bn`` folded into its weight and bias."""
+    fused = copy.deepcopy(conv)
+    scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+    # ConvTranspose2d weights are (in, out, kh, kw)
+    shape = (1, -1, 1, 1) if isinstance(conv, nn.ConvTranspose2d) else (-1, 1, 1, 1)
+
+    fused.weight = nn.Parameter((conv.weight * scale.reshape(shape)).detach())
+    fused.bias = nn.Parameter(((bias - bn.running_mean) * scale + bn.bias).detach())
+    return fused
+
+
+def is_conv_bn_block(module):
+    """True for models.conv Conv2d / Conv2dTranspose blocks (conv followed by BatchNorm)."""
+    block = getattr(module, 'conv_block', None)
+    return (isinstance(block, nn.Sequential) and len(block) == 2
+            and isinstance(block[1], nn.BatchNorm2d))
+
+
+def fuse_model(model):
+    """Fold BatchNorm into the conv of every block in place; returns the number of blocks fused.
+
+    The model must be in eval mode: training would update the running
+    statistics that were folded away.
+    """
+    if model.training:
+        raise ValueError('Conv + BatchNorm fusion is for eval-mode models only')
+
+    fused = 0
+    for module in model.modules():
+        if is_conv_bn_block(module):
+            module.conv_block = nn.Sequential(fold_batchnorm(module.conv_block[0], module.conv_block[1]))
+            fused += 1
+    return fused
+
+
+def max_fusion_error(model, inputs):
+    """Largest absolute output difference between ``model`` and a fused copy on ``inputs``."""
+    fused = copy.deepcopy(model).eval()
+    fuse_model(fused)
+    with torch.no_grad():
+        expected = model.eval()(*inputs)
+        actual = fused(*inputs)
+    if torch.is_tensor(expected):
+        expected, actual = [expected], [actual]
+    return max(float((e - a).abs().max()) for e, a in zip(expected, actual))
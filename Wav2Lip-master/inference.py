@@ -4,7 +4,7 @@ import scipy, cv2, os, sys, argparse, audio
 import json, subprocess, random, string
 from tqdm import tqdm
 from glob import glob
-import torch, face_detection
+import torch, face_detection, streaming
 from models import Wav2Lip
 import platform
 
@@ -50,108 +50,77 @@ parser.add_argument('--rotate', default=False, action='store_true',
 parser.add_argument('--nosmooth', default=False, action='store_true',
 					help='Prevent smoothing face detections over a short temporal window')
 
-args = parser.parse_args()
-args.img_size = 96
+parser.add_argument('--precision', default='fp32', choices=streaming.PRECISIONS,
+					help='Generator precision, bf16 runs under bfloat16 autocast')
 
-if os.path.isfile(args.face) and args.face.split('.')[1] in ['jpg', 'png', 'jpeg']:
-	args.static = True
+parser.add_argument('--channels_last', default=False, action='store_true',
+					help='Run the generator with channels_last (NHWC) memory format')
 
-def get_smoothened_boxes(boxes, T):
-	for i in range(len(boxes)):
-		if i + T > len(boxes):
-			window = boxes[len(boxes) - T:]
-		else:
-			window = boxes[i : i + T]
-		boxes[i] = np.mean(window, axis=0)
-	return boxes
-
-def face_detect(images):
-	detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, 
-											flip_input=False, device=device)
-
-	batch_size = args.face_det_batch_size
-	
-	while 1:
-		predictions = []
-		try:
-			for i in tqdm(range(0, len(images), batch_size)):
-				predictions.extend(detector.get_detections_for_batch(np.array(images[i:i + batch_size])))
-		except RuntimeError:
-			if batch_size == 1: 
-				raise RuntimeError('Image too big to run face detection on GPU. Please use the --resize_factor argument')
-			batch_size //= 2
-			print('Recovering from OOM error; New batch size: {}'.format(batch_size))
-			continue
-		break
-
-	results = []
-	pady1, pady2, padx1, padx2 = args.pads
-	for rect, image in zip(predictions, images):
-		if rect is None:
-			cv2.imwrite('temp/faulty_frame.jpg', image) # check this frame where the face was not detected.
-			raise ValueError('Face not detected! Ensure the video contains a face in all the frames.')
-
-		y1 = max(0, rect[1] - pady1)
-		y2 = min(image.shape[0], rect[3] + pady2)
-		x1 = max(0, rect[0] - padx1)
-		x2 = min(image.shape[1], rect[2] + padx2)
-		
-		results.append([x1, y1, x2, y2])
-
-	boxes = np.array(results)
-	if not args.nosmooth: boxes = get_smoothened_boxes(boxes, T=5)
-	results = [[image[y1: y2, x1:x2], (y1, y2, x1, x2)] for image, (x1, y1, x2, y2) in zip(images, boxes)]
-
-	del detector
-	return results 
+parser.add_argument('--detection_scale', type=float, default=1.,
+					help='Detect faces on frames downscaled by this factor; unlike --resize_factor, '
+					'lip-sync and output stay at full resolution')
+parser.add_argument('--keyframe_interval', type=int, default=1,
+					help='Run face detection on every Nth frame only, interpolating the boxes in between')
+parser.add_argument('--keyframe_threshold', type=float, default=0.,
+					help='Also detect on frames differing from the last keyframe by more than this (gray levels)')
 
-def datagen(frames, mels):
-	img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
+parser.add_argument('--composite_workers', type=int, default=4,
+					help='Threads pasting generated faces back into frames')
 
-	if args.box[0] == -1:
-		if not args.static:
-			face_det_results = face_detect(frames) # BGR2RGB for CNN face detection
-		else:
-			face_det_results = face_detect([frames[0]])
-	else:
-		print('Using the specified bounding box instead of face detection...')
-		y1, y2, x1, x2 = args.box
-		face_det_results = [[f[y1: y2, x1:x2], (y1, y2, x1, x2)] for f in frames]
+args = parser.parse_args()
+args.img_size = 96
 
-	for i, m in enumerate(mels):
-		idx = 0 if args.static else i%len(frames)
-		frame_to_save = frames[idx].copy()
-		face, coords = face_det_results[idx].copy()
+if os.path.isfile(args.face) and args.face.split('.')[1] in ['jpg', 'png', 'jpeg']:
+	args.static = True
 
-		face = cv2.resize(face, (args.img_size, args.img_size))
-			
-		img_batch.append(face)
-		mel_batch.append(m)
-		frame_batch.append(frame_to_save)
-		coords_batch.append(coords)
+def transform_frame(frame):
+	if args.resize_factor > 1:
+		frame = cv2.resize(frame, (frame.shape[1]//args.resize_factor, frame.shape[0]//args.resize_factor))
 
-		if len(img_batch) >= args.wav2lip_batch_size:
-			img_batch, mel_batch = np.asarray(img_batch), np.asarray(mel_batch)
+	if args.rotate:
+		frame = cv2.rotate(frame, cv2.cv2.ROTATE_90_CLOCKWISE)
 
-			img_masked = img_batch.copy()
-			img_masked[:, args.img_size//2:] = 0
+	y1, y2, x1, x2 = args.crop
+	if x2 == -1: x2 = frame.shape[1]
+	if y2 == -1: y2 = frame.shape[0]
 
-			img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.
-			mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1])
+	return frame[y1:y2, x1:x2]
 
-			yield img_batch, mel_batch, frame_batch, coords_batch
-			img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
+def keyframe_boxes(detector):
+	boxes, keyframes = streaming.detect_keyframe_boxes(streaming.read_frames(args.face, transform=transform_frame),
+														detector, args.pads, interval=args.keyframe_interval,
+														threshold=args.keyframe_threshold,
+														batch_size=args.face_det_batch_size, scale=args.detection_scale)
+	print('Detected faces on {} of {} frames'.format(len(keyframes), len(boxes)))
+	if not args.nosmooth:
+		streaming.smooth_boxes(boxes, T=5)
+	return dict(enumerate(boxes))
 
-	if len(img_batch) > 0:
-		img_batch, mel_batch = np.asarray(img_batch), np.asarray(mel_batch)
+def face_detect(frames):
+	detector = face_detection.get_shared_detector(device=device)
 
-		img_masked = img_batch.copy()
-		img_masked[:, args.img_size//2:] = 0
+	try:
+		if args.keyframe_interval > 1 and not args.static:
+			# Every position already has a box, so detect_faces only looks them up
+			boxes, smooth_window = keyframe_boxes(detector), None
+		else:
+			boxes, smooth_window = None, None if args.nosmooth else 5
+		for face in streaming.detect_faces(frames, detector, args.pads, batch_size=args.face_det_batch_size,
+											smooth_window=smooth_window, boxes=boxes, scale=args.detection_scale):
+			yield face
+	except streaming.FaceNotDetectedError as e:
+		cv2.imwrite('temp/faulty_frame.jpg', e.frame) # check this frame where the face was not detected.
+		raise
 
-		img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.
-		mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1])
+def datagen(frames, mels):
+	if args.box[0] == -1:
+		face_det_results = face_detect(frames) # BGR2RGB for CNN face detection
+	else:
+		print('Using the specified bounding box instead of face detection...')
+		y1, y2, x1, x2 = args.box
+		face_det_results = ((f, (y1, y2, x1, x2)) for _, f in frames)
 
-		yield img_batch, mel_batch, frame_batch, coords_batch
+	return streaming.datagen(face_det_results, mels, args.img_size, args.wav2lip_batch_size)
 
 mel_step_size = 16
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
@@ -168,51 +137,33 @@ def _load(checkpoint_path):
 def load_model(path):
 	model = Wav2Lip()
 	print("Load checkpoint from: {}".format(path))
-	checkpoint = _load(path)
-	s = checkpoint["state_dict"]
-	new_s = {}
-	for k, v in s.items():
-		new_s[k.replace('module.', '')] = v
-	model.load_state_dict(new_s)
+	if path.endswith('.safetensors'):
+		# Weights converted by convert_weights.py are memory-mapped
+		import mmap_weights
+		state_dict, _ = mmap_weights.load(path, dtype=torch.float32)
+		mmap_weights.assign(model, state_dict)
+	else:
+		checkpoint = _load(path)
+		s = checkpoint["state_dict"]
+		new_s = {}
+		for k, v in s.items():
+			new_s[k.replace('module.', '')] = v
+		model.load_state_dict(new_s)
 
 	model = model.to(device)
+	if args.channels_last:
+		model = model.to(memory_format=torch.channels_last)
 	return model.eval()
 
 def main():
 	if not os.path.isfile(args.face):
 		raise ValueError('--face argument must be a valid path to video/image file')
 
-	elif args.face.split('.')[1] in ['jpg', 'png', 'jpeg']:
-		full_frames = [cv2.imread(args.face)]
-		fps = args.fps
-
-	else:
+	fps = streaming.get_fps(args.face, default=args.fps)
+	if not args.static:
 		video_stream = cv2.VideoCapture(args.face)
-		fps = video_stream.get(cv2.CAP_PROP_FPS)
-
-		print('Reading video frames...')
-
-		full_frames = []
-		while 1:
-			still_reading, frame = video_stream.read()
-			if not still_reading:
-				video_stream.release()
-				break
-			if args.resize_factor > 1:
-				frame = cv2.resize(frame, (frame.shape[1]//args.resize_factor, frame.shape[0]//args.resize_factor))
-
-			if args.rotate:
-				frame = cv2.rotate(frame, cv2.cv2.ROTATE_90_CLOCKWISE)
-
-			y1, y2, x1, x2 = args.crop
-			if x2 == -1: x2 = frame.shape[1]
-			if y2 == -1: y2 = frame.shape[0]
-
-			frame = frame[y1:y2, x1:x2]
-
-			full_frames.append(frame)
-
-	print ("Number of frames available for inference: "+str(len(full_frames)))
+		print ("Number of frames available for inference: "+str(int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))))
+		video_stream.release()
 
 	if not args.audio.endswith('.wav'):
 		print('Extracting raw audio...')
@@ -228,53 +179,38 @@ def main():
 	if np.isnan(mel.reshape(-1)).sum() > 0:
 		raise ValueError('Mel contains nan! Using a TTS voice? Add a small epsilon noise to the wav file and try again')
 
-	mel_chunks = []
-	mel_idx_multiplier = 80./fps 
-	i = 0
-	while 1:
-		start_idx = int(i * mel_idx_multiplier)
-		if start_idx + mel_step_size > len(mel[0]):
-			mel_chunks.append(mel[:, len(mel[0]) - mel_step_size:])
-			break
-		mel_chunks.append(mel[:, start_idx : start_idx + mel_step_size])
-		i += 1
+	mel_chunks = audio.mel_chunks(mel, fps, mel_step_size)
 
 	print("Length of mel chunks: {}".format(len(mel_chunks)))
 
-	full_frames = full_frames[:len(mel_chunks)]
+	# Frames are decoded lazily, looping the video if the audio is longer
+	transform = None if streaming.is_image(args.face) else transform_frame
+	frames = streaming.read_frames(args.face, len(mel_chunks), transform=transform, static=args.static)
 
 	batch_size = args.wav2lip_batch_size
-	gen = datagen(full_frames.copy(), mel_chunks)
-
-	for i, (img_batch, mel_batch, frames, coords) in enumerate(tqdm(gen, 
-											total=int(np.ceil(float(len(mel_chunks))/batch_size)))):
-		if i == 0:
-			model = load_model(args.checkpoint_path)
-			print ("Model loaded")
-
-			frame_h, frame_w = full_frames[0].shape[:-1]
-			out = cv2.VideoWriter('temp/result.avi', 
-									cv2.VideoWriter_fourcc(*'DIVX'), fps, (frame_w, frame_h))
-
-		img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(device)
-		mel_batch = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(device)
-
-		with torch.no_grad():
-			pred = model(mel_batch, img_batch)
-
-		pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
-		
-		for p, f, c in zip(pred, frames, coords):
-			y1, y2, x1, x2 = c
-			p = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
-
-			f[y1:y2, x1:x2] = p
-			out.write(f)
-
-	out.release()
-
-	command = 'ffmpeg -y -i {} -i {} -strict -2 -q:v 1 {}'.format(args.audio, 'temp/result.avi', args.outfile)
-	subprocess.call(command, shell=platform.system() != 'Windows')
+	gen = streaming.prefetch(datagen(frames, mel_chunks))
+	model = load_model(args.checkpoint_path)
+	if args.static:
+		# Same face every frame: encode it once, run only audio encoder + decoder per batch
+		model = streaming.StaticFaceModel(model)
+	print ("Model loaded")
+
+	out = None
+	meter = streaming.Throughput()
+	# The model runs one batch ahead in its own thread while faces are pasted back in parallel
+	predictions = streaming.prefetch(streaming.run_model(tqdm(gen, total=int(np.ceil(float(len(mel_chunks))/batch_size))),
+														model, device, args.precision, args.channels_last))
+	results = streaming.composite(predictions, args.composite_workers)
+	for f in meter.track(results):
+		if out is None:
+			frame_h, frame_w = f.shape[:-1]
+			# Frames are piped straight into ffmpeg, which muxes the audio and encodes in one pass
+			out = streaming.FFmpegWriter('ffmpeg', args.outfile, (frame_w, frame_h), fps,
+										audio_path=args.audio, output_args=['-strict', '-2', '-q:v', '1'])
+		out.write(f)
+
+	out.close()
+	print('Lip-synced {} frames at {:.1f} frames/sec'.format(meter.frames, meter.fps))
 
 if __name__ == '__main__':
 	main()
@@ -0,0 +1,136 @@
+"""Memory-mapped weight files for the Wav2Lip generator and S3FD.
+
+Training checkpoints are pickles that also carry the optimizer state and
+``module.`` prefixes from ``DataParallel``, and ``torch.load`` reads and
+unpickles all of it before the state dict can be rebuilt. The files written
+here hold only the prefix-normalized inference weights, in the safetensors
+layout: an 8-byte little-endian header length, a JSON header mapping each
+tensor to its dtype, shape and byte range, then the raw tensor data.
+
+:func:`load` maps the file copy-on-write and wraps each byte range with
+``torch.from_numpy``, so loading reads no data up front, and processes
+loading the same file share its pages through the page cache. Tensors are
+laid out largest itemsize first, which keeps every one naturally aligned.
+"""
+
+import os
+import json
+import uuid
+import struct
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+_DTYPES = {
+    'F64': np.float64, 'F32': np.float32, 'F16': np.float16,
+    'I64': np.int64, 'I32': np.int32, 'I16': np.int16, 'I8': np.int8,
+    'U8': np.uint8, 'BOOL': np.bool_,
+}
+_DTYPE_NAMES = {np.dtype(dtype): name for name, dtype in _DTYPES.items()}
+
+
+def strip_checkpoint(checkpoint):
+    """Inference state dict of a training checkpoint (or a bare state dict), without ``module.`` prefixes."""
+    state_dict = checkpoint.get('state_dict', checkpoint)
+    return OrderedDict((k.replace('module.', ''), v) for k, v in state_dict.items())
+
+
+def source_signature(path):
+    """``[size, mtime_ns]`` of a source file as a string, stored to detect stale conversions."""
+    stat = os.stat(path)
+    return json.dumps([stat.st_size, stat.st_mtime_ns])
+
+
+def save(state_dict, path, half=False, metadata=None):
+    """Write ``state_dict`` to ``path``; ``half`` stores floating-point tensors as fp16."""
+    arrays = {}
+    for name, tensor in state_dict.items():
+        tensor = tensor.detach().cpu()
+        if half and tensor.is_floating_point():
+            tensor = tensor.half()
+        arrays[name] = np.ascontiguousarray(tensor.numpy())
+
+    order = sorted(arrays, key=lambda name: (-arrays[name].dtype.itemsize, name))
+    header, offset = OrderedDict(), 0
+    for name in order:
+        array = arrays[name]
+        header[name] = {'dtype': _DTYPE_NAMES[array.dtype], 'shape': list(array.shape),
+                        'data_offsets': [offset, offset + array.nbytes]}
+        offset += array.nbytes
+    metadata = dict(metadata or {}, half=half)
+    header['__metadata__'] = {key: str(value) for key, value in metadata.items()}
+
+    encoded = json.dumps(header, separators=(',', ':')).encode()
+    encoded += b' ' * (-len(encoded) % 8)
+    # A unique temp file: several processes may convert the same checkpoint at once
+    tmp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack('<Q', len(encoded)))
+            f.write(encoded)
+            for name in order:
+                f.write(memoryview(arrays[name]).cast('B'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_header(path):
+    """``(header, metadata, data_start)`` of a weight file, without touching the tensor data."""
+    with open(path, 'rb') as f:
+        (length,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(length), object_pairs_hook=OrderedDict)
+    metadata = header.pop('__metadata__', {})
+    return header, metadata, 8 + length
+
+
+def load(path, dtype=None):
+    """``(state_dict, metadata)`` of a weight file, with tensors backed by a copy-on-write mmap.
+
+    With ``dtype`` floating-point tensors stored in another dtype (fp16
+    files) are converted, which copies them out of the mapping.
+    """
+    header, metadata, data_start = read_header(path)
+    state_dict = OrderedDict()
+    if not header:
+        return state_dict, metadata
+
+    buffer = np.memmap(path, dtype=np.uint8, mode='c', offset=data_start)
+    for name, info in header.items():
+        start, end = info['data_offsets']
+        array = buffer[start:end].view(_DTYPES[info['dtype']]).reshape(info['shape'])
+        tensor = torch.from_numpy(array)
+        if dtype is not None and tensor.is_floating_point() and tensor.dtype != dtype:
+            tensor = tensor.to(dtype)
+        state_dict[name] = tensor
+    return state_dict, metadata
+
+
+def assign(module, tensors, strict=True):
+    """Point ``module``'s parameters and buffers at ``tensors`` without copying them.
+
+    Like ``load_state_dict``, but the module ends up using the given tensors
+    (for example mmap-backed ones) instead of copies. With ``strict`` the
+    names must match the module's state dict exactly.
+    """
+    if strict:
+        expected = set(module.state_dict())
+        missing, unexpected = expected - set(tensors), set(tensors) - expected
+        if missing or unexpected:
+            raise KeyError('Weights do not match the model: missing {}, unexpected {}'.format(
+                sorted(missing), sorted(unexpected)))
+
+    for name, tensor in tensors.items():
+        path, _, attr = name.rpartition('.')
+        owner = module.get_submodule(path) if path else module
+        current = getattr(owner, attr)
+        if current.shape != tensor.shape:
+            raise ValueError('Weight {} has shape {}, expected {}'.format(
+                name, tuple(tensor.shape), tuple(current.shape)))
+        if attr in owner._parameters:
+            owner._parameters[attr].data = tensor
+        else:
+            owner._buffers[attr] = tensor
@@ -124,6 +124,31 @@ class Wav2Lip(nn.Module):
             
         return outputs
 
+    def encode_face(self, face_sequences):
+        """Feature pyramid of the face encoder for (B, 6, H, W) faces, shallowest first."""
+        feats = []
+        x = face_sequences
+        for f in self.face_encoder_blocks:
+            x = f(x)
+            feats.append(x)
+        return feats
+
+    def decode(self, audio_sequences, feats):
+        """Same as forward() for (B, 1, 80, 16) audio, but against precomputed face features.
+
+        Features with a batch size of 1 are broadcast across the audio batch, so
+        a still avatar only needs encode_face() once.
+        """
+        B = audio_sequences.size(0)
+        feats = list(feats)
+
+        x = self.audio_encoder(audio_sequences)
+        for f in self.face_decoder_blocks:
+            x = f(x)
+            x = torch.cat((x, feats.pop().expand(B, -1, -1, -1)), dim=1)
+
+        return self.output_block(x)
+
 class Wav2Lip_disc_qual(nn.Module):
     def __init__(self):
         super(Wav2Lip_disc_qual, self).__init__()
@@ -0,0 +1,155 @@
+"""ONNX export and ONNX Runtime inference for the Wav2Lip generator and the S3FD detector.
+
+The runtime wrappers are drop-in replacements for the eager modules: they
+take and return torch tensors, so ``streaming.run_model`` and
+``sfd.detect.batch_detect`` work unchanged whichever backend is loaded.
+"""
+
+import os
+import uuid
+
+import numpy as np
+
+# Opset 11 covers every op used by both networks and runs on old and new ONNX Runtime builds
+OPSET = 11
+
+WAV2LIP_INPUTS = ['mel', 'face']
+WAV2LIP_OUTPUTS = ['pred']
+S3FD_INPUTS = ['image']
+S3FD_OUTPUTS = ['cls1', 'reg1', 'cls2', 'reg2', 'cls3', 'reg3',
+                'cls4', 'reg4', 'cls5', 'reg5', 'cls6', 'reg6']
+
+
+def _wav2lip_sample(batch_size=2):
+    import torch
+    return torch.rand(batch_size, 1, 80, 16), torch.rand(batch_size, 6, 96, 96)
+
+
+def _s3fd_sample(batch_size=2, size=(256, 320)):
+    import torch
+    return (torch.rand(batch_size, 3, size[0], size[1]) * 255. - 117.,)
+
+
+def export_wav2lip(model, path, opset=OPSET):
+    """Export a Wav2Lip generator with a dynamic batch dimension."""
+    import torch
+
+    dynamic_axes = {name: {0: 'batch'} for name in WAV2LIP_INPUTS + WAV2LIP_OUTPUTS}
+    with torch.no_grad():
+        torch.onnx.export(model.eval(), _wav2lip_sample(), str(path),
+                          input_names=WAV2LIP_INPUTS, output_names=WAV2LIP_OUTPUTS,
+                          dynamic_axes=dynamic_axes, opset_version=opset)
+
+
+def export_s3fd(net, path, opset=OPSET):
+    """Export S3FD with dynamic batch, height and width."""
+    import torch
+
+    dynamic_axes = {'image': {0: 'batch', 2: 'height', 3: 'width'}}
+    dynamic_axes.update({name: {0: 'batch', 2: 'h', 3: 'w'} for name in S3FD_OUTPUTS})
+    with torch.no_grad():
+        torch.onnx.export(net.eval(), _s3fd_sample(), str(path),
+                          input_names=S3FD_INPUTS, output_names=S3FD_OUTPUTS,
+                          dynamic_axes=dynamic_axes, opset_version=opset)
+
+
+def source_path(path):
+    """Sidecar next to an exported model with the signature of the weights it came from."""
+    return '{}.source'.format(path)
+
+
+def record_source(path, weights_path):
+    """Record that the model at ``path`` was exported from ``weights_path`` as it is now."""
+    import mmap_weights
+
+    sidecar = source_path(path)
+    tmp_path = '{}.{}.tmp'.format(sidecar, uuid.uuid4().hex)
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(mmap_weights.source_signature(weights_path))
+        os.replace(tmp_path, sidecar)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def exported_from(path, weights_path):
+    """True if the model at ``path`` was exported from the current ``weights_path``."""
+    import mmap_weights
+
+    try:
+        with open(source_path(path)) as f:
+            recorded = f.read()
+    except OSError:
+        return False
+    return recorded == mmap_weights.source_signature(weights_path)
+
+
+def max_abs_error(module, runtime, inputs):
+    """Largest absolute difference between the eager module and an ONNX wrapper on ``inputs``."""
+    import torch
+
+    with torch.no_grad():
+        expected = module(*inputs)
+    actual = runtime(*inputs)
+    if torch.is_tensor(expected):
+        expected, actual = [expected], [actual]
+    return max(float((e.cpu() - a).abs().max()) for e, a in zip(expected, actual))
+
+
+def verify_wav2lip(model, path, batch_sizes=(1, 5), atol=1e-4):
+    """Check the exported generator against PyTorch at several batch sizes; returns the max error."""
+    runtime = OnnxWav2Lip(path)
+    error = max(max_abs_error(model.cpu().eval(), runtime, _wav2lip_sample(b)) for b in batch_sizes)
+    if error > atol:
+        raise ValueError('ONNX Wav2Lip output differs from PyTorch by {:.2e} (atol {:.0e})'.format(error, atol))
+    return error
+
+
+def verify_s3fd(net, path, batch_sizes=(1, 3), sizes=((256, 320), (480, 640)), atol=1e-3):
+    """Check the exported detector against PyTorch at several batch sizes and resolutions."""
+    runtime = OnnxS3FD(path)
+    error = max(max_abs_error(net.cpu().eval(), runtime, _s3fd_sample(b, size))
+                for b in batch_sizes for size in sizes)
+    if error > atol:
+        raise ValueError('ONNX S3FD output differs from PyTorch by {:.2e} (atol {:.0e})'.format(error, atol))
+    return error
+
+
+class OnnxModule:
+    """ONNX Runtime session exposed with the calling convention of a torch module."""
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = str(path)
+        self.session = onnxruntime.InferenceSession(self.path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def run(self, *inputs):
+        import torch
+
+        feed = {name: np.ascontiguousarray(x.detach().cpu().float().numpy())
+                for name, x in zip(self.input_names, inputs)}
+        return [torch.from_numpy(out) for out in self.session.run(None, feed)]
+
+    # Eager-module methods callers use on the models they load
+    def eval(self):
+        return self
+
+    def to(self, *args, **kwargs):
+        return self
+
+
+class OnnxWav2Lip(OnnxModule):
+    def __call__(self, audio_sequences, face_sequences):
+        return self.run(audio_sequences, face_sequences)[0]
+
+
+class OnnxS3FD(OnnxModule):
+    def __call__(self, x):
+        return self.run(x)
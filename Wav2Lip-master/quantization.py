@@ -0,0 +1,106 @@
+"""Post-training static int8 quantization of the Wav2Lip conv blocks for CPU inference.
+
+Every ``models.conv.Conv2d`` / ``Conv2dTranspose`` block (conv -> BatchNorm
+-> [residual add] -> ReLU) is replaced by a :class:`QuantizedBlock` that
+folds the BatchNorm into the conv and runs the block in int8 between float
+tensors. The skip connections, concatenations and the sigmoid output layer
+of ``Wav2Lip.forward`` stay in float, so the model code itself is untouched.
+"""
+
+import copy
+
+import numpy as np
+import torch
+from torch import nn
+
+try:
+    from torch.ao import quantization as tq
+    from torch.ao.nn.quantized import FloatFunctional
+except ImportError:  # torch < 1.10
+    from torch import quantization as tq
+    from torch.nn.quantized import FloatFunctional
+
+from fusion import fold_batchnorm, is_conv_bn_block
+
+
+def quantized_engine():
+    """fbgemm on x86, qnnpack on ARM."""
+    engines = torch.backends.quantized.supported_engines
+    return 'fbgemm' if 'fbgemm' in engines else 'qnnpack'
+
+
+class QuantizedBlock(nn.Module):
+    """A conv block quantized on its own: float in, int8 conv (+ skip) + ReLU, float out."""
+
+    def __init__(self, block, engine):
+        super().__init__()
+        self.conv = fold_batchnorm(block.conv_block[0], block.conv_block[1])
+        self.residual = getattr(block, 'residual', False)
+        self.relu = nn.ReLU()
+        self.skip = FloatFunctional()
+        self.quant = tq.QuantStub()
+        self.dequant = tq.DeQuantStub()
+
+        if isinstance(self.conv, nn.ConvTranspose2d):
+            # Quantized transposed convs only support per-tensor weights
+            self.qconfig = tq.QConfig(activation=tq.get_default_qconfig(engine).activation,
+                                      weight=tq.default_weight_observer)
+        else:
+            self.qconfig = tq.get_default_qconfig(engine)
+            if not self.residual:
+                tq.fuse_modules(self, [['conv', 'relu']], inplace=True)
+
+    def forward(self, x):
+        x = self.quant(x)
+        out = self.conv(x)
+        out = self.skip.add_relu(out, x) if self.residual else self.relu(out)
+        return self.dequant(out)
+
+
+def _swap_blocks(module, engine):
+    for name, child in module.named_children():
+        if is_conv_bn_block(child):
+            setattr(module, name, QuantizedBlock(child, engine))
+        else:
+            _swap_blocks(child, engine)
+
+
+def prepare(model, engine=None):
+    """Copy of a float model with observers inserted in every conv block, on the CPU."""
+    engine = engine or quantized_engine()
+    torch.backends.quantized.engine = engine
+
+    model = copy.deepcopy(model).cpu().eval()
+    _swap_blocks(model, engine)
+    return tq.prepare(model)
+
+
+def quantize(model, calibration_batches, engine=None):
+    """Static int8 quantization calibrated on ``(mel, face)`` float tensor batches."""
+    model = prepare(model, engine)
+    with torch.no_grad():
+        for mel, face in calibration_batches:
+            model(mel, face)
+    return tq.convert(model)
+
+
+def quantized_from_state_dict(model, state_dict, engine=None):
+    """Rebuild a quantized model from a float model and a saved quantized state dict."""
+    model = tq.convert(prepare(model, engine))
+    model.load_state_dict(state_dict)
+    return model
+
+
+def save_calibration_sample(path, mels, faces):
+    """Store calibration inputs: mels ``(N, 80, 16)`` float, faces ``(N, 96, 96, 6)`` uint8 (NHWC)."""
+    np.savez_compressed(path, mel=np.asarray(mels, dtype=np.float32), face=np.asarray(faces, dtype=np.uint8))
+
+
+def load_calibration_sample(path, batch_size=16):
+    """Yield model-ready ``(mel, face)`` float tensor batches from a calibration sample."""
+    sample = np.load(path)
+    mels, faces = sample['mel'], sample['face']
+    for i in range(0, len(mels), batch_size):
+        mel = torch.from_numpy(mels[i:i + batch_size]).unsqueeze(1)
+        face = torch.from_numpy(faces[i:i + batch_size]).permute(0, 3, 1, 2).float().div_(255.)
+        yield mel, face
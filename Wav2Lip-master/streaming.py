@@ -0,0 +1,787 @@
+"""Streaming stages for Wav2Lip inference.
+
+Inference runs as a chain of generators:
+
+    read_frames -> detect_faces -> datagen -> run_model -> composite -> writer
+
+Each stage pulls from the previous one, so only a batch or two of
+full-resolution frames is alive at any time and peak memory does not depend
+on the length of the video. ``prefetch`` runs the upstream part of the chain
+in a background thread behind a bounded queue, which overlaps decoding and
+detection with the model while keeping back-pressure. Face batches travel as
+contiguous uint8 NCHW arrays, sliced from a precompiled avatar bundle or
+filled into reused buffers, and only become float inside the model call
+(``ScaledFaces``). ``composite`` pastes the generated faces back on a thread
+pool while the model works on the next batch, and hands the frames on in
+their original order. ``FFmpegWriter`` pipes the finished frames straight
+into a single ffmpeg process for muxing and encoding, without an
+intermediate video file.
+"""
+import os
+import time
+import contextlib
+import queue
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+import cv2
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+
+
+class FaceNotDetectedError(ValueError):
+    """Raised when S3FD finds no face in a frame; ``frame`` holds the image."""
+
+    def __init__(self, message, frame=None):
+        super().__init__(message)
+        self.frame = frame
+
+
+def is_image(path):
+    return os.path.splitext(str(path))[1].lower() in IMAGE_EXTENSIONS
+
+
+def get_fps(path, default=25.):
+    if is_image(path):
+        return default
+    video_stream = cv2.VideoCapture(str(path))
+    fps = video_stream.get(cv2.CAP_PROP_FPS)
+    video_stream.release()
+    return fps or default
+
+
+def read_frames(path, num_frames=None, transform=None, static=False, start=0):
+    """Yield ``(position, frame)`` for ``num_frames`` output frames.
+
+    ``position`` is the index of the frame inside the source video. Videos
+    shorter than ``num_frames`` are looped, matching ``frames[i % len(frames)]``;
+    with ``num_frames=None`` every frame is read exactly once. Images, and
+    videos in ``static`` mode, repeat their first frame. Every yielded frame is
+    a fresh array that later stages may modify in place. Videos start at
+    position ``start`` (which must be below their frame count), so a segment
+    of a longer render sees the same frames as the full render would.
+    """
+    if static or is_image(path):
+        if is_image(path):
+            frame = cv2.imread(str(path))
+        else:
+            video_stream = cv2.VideoCapture(str(path))
+            _, frame = video_stream.read()
+            video_stream.release()
+        if frame is None:
+            raise ValueError('Could not read frames from {}'.format(path))
+        if transform is not None:
+            frame = transform(frame)
+        for _ in range(1 if num_frames is None else num_frames):
+            yield 0, frame.copy()
+        return
+
+    video_stream = cv2.VideoCapture(str(path))
+    # grab() skips frames without converting them, and unlike seeking is frame-exact
+    for _ in range(start):
+        video_stream.grab()
+    position = start
+    emitted = 0
+    try:
+        while num_frames is None or emitted < num_frames:
+            still_reading, frame = video_stream.read()
+            if not still_reading:
+                if position == 0:
+                    raise ValueError('Could not read frames from {}'.format(path))
+                if num_frames is None:
+                    break
+                # Loop the video from the start
+                video_stream.release()
+                video_stream = cv2.VideoCapture(str(path))
+                position = 0
+                continue
+            if transform is not None:
+                frame = transform(frame)
+            yield position, frame
+            position += 1
+            emitted += 1
+    finally:
+        video_stream.release()
+
+
+def batched(iterable, batch_size):
+    """Group an iterable into lists of at most ``batch_size`` items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _is_out_of_memory(error):
+    """True for CUDA and CPU allocator failures, which a smaller batch may avoid."""
+    message = str(error).lower()
+    return any(text in message for text in ('out of memory', "can't allocate memory", 'not enough memory'))
+
+
+def _detect_batch(detector, images, scale=1.0):
+    """Run the detector, halving the batch on out-of-memory errors.
+
+    Any other error (a closed shared detector, bad input) is raised as is.
+    """
+    try:
+        if scale != 1.0:
+            return detector.get_detections_for_batch(np.asarray(images), scale)
+        return detector.get_detections_for_batch(np.asarray(images))
+    except RuntimeError as e:
+        if not _is_out_of_memory(e):
+            raise
+        if len(images) == 1:
+            raise RuntimeError('Image too big to run face detection on GPU. Please use the --resize_factor argument')
+        half = len(images) // 2
+        print('Recovering from OOM error; New batch size: {}'.format(half))
+        return _detect_batch(detector, images[:half], scale) + _detect_batch(detector, images[half:], scale)
+
+
+def _pad_box(rect, shape, pads):
+    pady1, pady2, padx1, padx2 = pads
+    y1 = max(0, rect[1] - pady1)
+    y2 = min(shape[0], rect[3] + pady2)
+    x1 = max(0, rect[0] - padx1)
+    x2 = min(shape[1], rect[2] + padx2)
+    return np.array([x1, y1, x2, y2])
+
+
+class _BoxSmoother:
+    """Streaming form of the forward-window box smoothing of inference.py.
+
+    Box ``i`` becomes the mean of boxes ``[i, i + T)``; the last boxes of the
+    sequence all use the final window. Boxes are integer arrays updated in
+    place, exactly as in the list version, so the results are identical.
+    """
+
+    def __init__(self, T):
+        self.T = T
+        self.count = 0
+        self.pending = deque()
+        self.recent = deque(maxlen=T)
+
+    def push(self, box):
+        """Add the next box; returns the boxes that are now final."""
+        self.count += 1
+        self.recent.append(box)
+        self.pending.append(box)
+        if len(self.pending) < self.T:
+            return []
+        box = self.pending.popleft()
+        box[:] = np.mean(list(self.recent), axis=0)
+        return [box]
+
+    def flush(self):
+        window = list(self.recent)
+        if self.count < self.T:
+            window = window[self.count - self.T:]
+        done = []
+        while self.pending:
+            box = self.pending.popleft()
+            box[:] = np.mean(window, axis=0)
+            done.append(box)
+        return done
+
+
+def detect_faces(frames, detector, pads, batch_size=16, smooth_window=None, boxes=None, scale=1.0):
+    """Yield ``(frame, (y1, y2, x1, x2))`` for each ``(position, frame)`` of ``frames``.
+
+    Each video position is detected once; looped frames reuse its box. With
+    ``smooth_window`` boxes are averaged over that many following frames, which
+    holds back at most ``smooth_window - 1`` frames.
+
+    ``boxes`` is an optional dict of position -> padded ``[x1, y1, x2, y2]``.
+    Positions already in it skip detection, and new detections are added to
+    it, so callers can reuse or persist the boxes of a video.
+
+    ``scale < 1`` runs the detector on frames downscaled by that factor; the
+    boxes are still in full-resolution coordinates.
+    """
+    boxes = {} if boxes is None else boxes
+    smoother = _BoxSmoother(smooth_window) if smooth_window else None
+    waiting = deque()
+
+    def release(final_boxes):
+        for _ in final_boxes:
+            frame, position = waiting.popleft()
+            yield frame, boxes[position]
+
+    def coords(box):
+        x1, y1, x2, y2 = box
+        return (y1, y2, x1, x2)
+
+    for batch in batched(frames, batch_size):
+        todo = {}
+        for position, frame in batch:
+            if position not in boxes and position not in todo:
+                todo[position] = frame
+
+        predictions = _detect_batch(detector, list(todo.values()), scale) if todo else []
+        new_boxes = {}
+        for (position, image), rect in zip(todo.items(), predictions):
+            if rect is None:
+                raise FaceNotDetectedError('Face not detected! Ensure the video contains a face in all the frames.',
+                                           frame=image)
+            new_boxes[position] = _pad_box(rect, image.shape, pads)
+
+        for position, frame in batch:
+            if position in new_boxes:
+                box = boxes[position] = new_boxes.pop(position)
+                if smoother is not None:
+                    waiting.append((frame, position))
+                    for item in release(smoother.push(box)):
+                        yield item[0], coords(item[1])
+                    continue
+            elif smoother is not None and smoother.pending:
+                # The video looped: the tail of the first pass is now final
+                for item in release(smoother.flush()):
+                    yield item[0], coords(item[1])
+            yield frame, coords(boxes[position])
+
+    if smoother is not None:
+        for item in release(smoother.flush()):
+            yield item[0], coords(item[1])
+
+
+def smooth_boxes(boxes, T):
+    """Vectorized ``get_smoothened_boxes``: box ``i`` becomes the mean of boxes ``[i, i + T)``.
+
+    Updates ``boxes`` in place and returns it. Full windows are averaged in
+    one strided reduction; the last ``T - 1`` boxes all average the final
+    window while it is being overwritten, exactly as the loop in inference.py
+    does, so integer boxes come out identical.
+    """
+    n = len(boxes)
+    head = max(n - T + 1, 0)
+    if head:
+        windows = as_strided(boxes, shape=(head, T) + boxes.shape[1:],
+                             strides=(boxes.strides[0],) + boxes.strides, writeable=False)
+        boxes[:head] = windows.mean(axis=1)
+    for i in range(head, n):
+        boxes[i] = np.mean(boxes[n - T:], axis=0)
+    return boxes
+
+
+def thumbnail(frame, width=64):
+    """Small grayscale copy of a BGR frame for :func:`frame_difference`."""
+    height = max(1, frame.shape[0] * width // frame.shape[1])
+    return cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (width, height), interpolation=cv2.INTER_AREA)
+
+
+def frame_difference(a, b):
+    """Mean absolute difference of two thumbnails, in gray levels (0-255)."""
+    return float(cv2.absdiff(a, b).mean())
+
+
+def detect_keyframe_boxes(frames, detector, pads, interval=10, threshold=None, batch_size=16, scale=1.0):
+    """Padded ``[x1, y1, x2, y2]`` boxes for every frame, running the detector on keyframes only.
+
+    ``frames`` yields ``(position, frame)`` for each video frame once, as
+    :func:`read_frames` with ``num_frames=None``. A frame is a keyframe every
+    ``interval`` frames, when its :func:`frame_difference` from the previous
+    keyframe exceeds ``threshold``, and at the end of the video; the boxes of
+    the frames in between are linearly interpolated. ``scale`` is as for
+    :func:`detect_faces`.
+
+    Returns ``(boxes, keyframes)``: an int32 ``(n_frames, 4)`` array and the
+    keyframe positions.
+    """
+    keyframes, key_boxes, todo = [], [], []
+    last_key = last_thumb = last_frame = None
+    count = 0
+
+    def detect():
+        predictions = _detect_batch(detector, [image for _, image in todo], scale)
+        for (position, image), rect in zip(todo, predictions):
+            if rect is None:
+                raise FaceNotDetectedError('Face not detected! Ensure the video contains a face in all the frames.',
+                                           frame=image)
+            keyframes.append(position)
+            key_boxes.append(_pad_box(rect, image.shape, pads))
+        del todo[:]
+
+    for position, frame in frames:
+        count += 1
+        thumb = thumbnail(frame) if threshold else None
+        if (last_key is None or position - last_key >= interval
+                or (threshold and frame_difference(thumb, last_thumb) > threshold)):
+            todo.append((position, frame))
+            last_key, last_thumb, last_frame = position, thumb, None
+            if len(todo) >= batch_size:
+                detect()
+        else:
+            last_frame = (position, frame)
+
+    if last_frame is not None:
+        todo.append(last_frame)
+    if todo:
+        detect()
+    if not keyframes:
+        raise ValueError('No frames to detect faces in')
+
+    key_boxes = np.array(key_boxes, dtype=np.float64)
+    positions = np.arange(count)
+    boxes = np.stack([np.interp(positions, keyframes, key_boxes[:, k]) for k in range(4)], axis=1)
+    return np.rint(boxes).astype(np.int32), np.array(keyframes)
+
+
+def box_drift(reference, boxes):
+    """How far ``boxes`` stray from ``reference`` (both ``(n, 4)`` ``[x1, y1, x2, y2]``).
+
+    Returns the mean and max over frames of the largest corner error in
+    pixels, and the mean and lowest IoU.
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    boxes = np.asarray(boxes, dtype=np.float64)
+    error = np.abs(boxes - reference).max(axis=1)
+
+    width = np.minimum(reference[:, 2], boxes[:, 2]) - np.maximum(reference[:, 0], boxes[:, 0])
+    height = np.minimum(reference[:, 3], boxes[:, 3]) - np.maximum(reference[:, 1], boxes[:, 1])
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    area = lambda b: (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    iou = intersection / np.maximum(area(reference) + area(boxes) - intersection, 1e-9)
+    return {
+        'mean_error_px': float(error.mean()),
+        'max_error_px': float(error.max()),
+        'mean_iou': float(iou.mean()),
+        'min_iou': float(iou.min()),
+    }
+
+
+class BatchBuffers:
+    """A ring of preallocated uint8 batches handed out in turn.
+
+    Batch generators fill these instead of allocating a fresh array per
+    batch. A buffer comes round again after ``count`` batches, so ``count``
+    must exceed the number of batches alive downstream at once: with
+    ``prefetch(maxsize=1)`` in front of :func:`run_model` that is three (one
+    in the model, one queued, one waiting to be queued).
+    """
+
+    def __init__(self, batch_size, shape, count=4):
+        self.buffers = np.empty((count, batch_size) + tuple(shape), dtype=np.uint8)
+        self.next = 0
+
+    def take(self, size=None):
+        """The next buffer, trimmed to ``size`` items."""
+        buffer = self.buffers[self.next]
+        self.next = (self.next + 1) % len(self.buffers)
+        return buffer if size is None else buffer[:size]
+
+
+def pack_face(out, face):
+    """Write one ``(img_size, img_size, 3)`` face crop into ``out`` as a uint8 ``(6, img_size, img_size)`` Wav2Lip input.
+
+    Channels 0-2 hold the crop with its lower half (the mouth) masked out,
+    channels 3-5 the full crop.
+    """
+    chw = face.transpose(2, 0, 1)
+    half = chw.shape[1] // 2
+    out[3:] = chw
+    out[:3, :half] = chw[:, :half]
+    out[:3, half:] = 0
+    return out
+
+
+def datagen(faces, mels, img_size, batch_size, buffers=4):
+    """Pair ``(frame, coords)`` with mel chunks and yield model-ready batches.
+
+    Yields ``(img_batch, mel_batch, frame_batch, coords_batch)`` where the
+    image batch is a contiguous uint8 ``(n, 6, img_size, img_size)`` array
+    (see :func:`pack_face`) taken from a :class:`BatchBuffers` ring of
+    ``buffers`` batches, so it is only valid until that many more batches
+    have been generated. ``mels`` is sliced one batch at a time, so an
+    :class:`audio.MelChunks` view is gathered without per-frame copies.
+    """
+    pool = BatchBuffers(batch_size, (6, img_size, img_size), buffers)
+    img_batch, frame_batch, coords_batch = pool.take(), [], []
+    start = 0
+
+    for frame, coords in faces:
+        if start + len(frame_batch) >= len(mels):
+            break
+        y1, y2, x1, x2 = coords
+        face = cv2.resize(frame[y1:y2, x1:x2], (img_size, img_size))
+
+        pack_face(img_batch[len(frame_batch)], face)
+        frame_batch.append(frame)
+        coords_batch.append(coords)
+
+        if len(frame_batch) >= batch_size:
+            yield img_batch, _mel_batch(mels, start, len(frame_batch)), frame_batch, coords_batch
+            start += len(frame_batch)
+            img_batch, frame_batch, coords_batch = pool.take(), [], []
+
+    if len(frame_batch) > 0:
+        size = len(frame_batch)
+        yield img_batch[:size], _mel_batch(mels, start, size), frame_batch, coords_batch
+
+
+def _mel_batch(mels, start, size):
+    """Gather ``mels[start:start + size]`` as a ``(size, num_mels, T, 1)`` array."""
+    return np.asarray(mels[start:start + size])[..., np.newaxis]
+
+
+def bundle_datagen(frames, faces, boxes, mels, batch_size, buffers=4):
+    """Like :func:`datagen`, but reads face inputs from a precompiled avatar bundle.
+
+    ``faces`` is a uint8 ``(n_positions, 6, img_size, img_size)`` array (usually
+    a memmap) and ``boxes`` the matching int ``(n_positions, 4)`` array of
+    ``[x1, y1, x2, y2]``; ``frames`` yields ``(position, frame)`` as from
+    :func:`read_frames`. Runs of consecutive positions are sliced straight out
+    of ``faces`` without copying; other batches (where a looping avatar wraps
+    around) are gathered into a :class:`BatchBuffers` ring.
+    """
+    pool = BatchBuffers(batch_size, faces.shape[1:], buffers)
+    start = 0
+    for batch in batched(frames, batch_size):
+        batch = batch[:len(mels) - start]
+        if not batch:
+            break
+        positions = np.fromiter((position for position, _ in batch), dtype=np.intp, count=len(batch))
+
+        if np.all(positions == positions[0]):
+            img_batch = np.broadcast_to(faces[positions[0]], (len(positions),) + faces.shape[1:])
+        elif np.all(np.diff(positions) == 1):
+            img_batch = faces[positions[0]:positions[-1] + 1]
+        else:
+            # mode='clip' writes straight into the buffer ('raise' buffers the output)
+            img_batch = np.take(faces, positions, axis=0, out=pool.take(len(positions)), mode='clip')
+
+        frame_batch = [frame for _, frame in batch]
+        coords_batch = [(y1, y2, x1, x2) for x1, y1, x2, y2 in np.asarray(boxes[positions]).tolist()]
+        yield img_batch, _mel_batch(mels, start, len(batch)), frame_batch, coords_batch
+        start += len(batch)
+
+
+def _to_tensor(batch, device, channels_last=False, nhwc=False):
+    """Numpy batch -> tensor on ``device``, sharing memory with ``batch`` on the CPU.
+
+    Image batches are uint8 NCHW and stay uint8; :class:`ScaledFaces`
+    scales them inside the model call. ``nhwc`` batches (mels,
+    ``(n, 80, 16, 1)``) are permuted to NCHW, which for a single channel
+    moves no data. A batch that repeats one item with a zero batch stride (a
+    still avatar from :func:`bundle_datagen`) is converted once and
+    expanded, not copied.
+    """
+    import torch
+
+    repeat = len(batch) if len(batch) > 1 and batch.strides[0] == 0 else None
+    if repeat:
+        batch = batch[:1]
+
+    tensor = torch.from_numpy(np.ascontiguousarray(batch))
+    if nhwc:
+        tensor = tensor.permute(0, 3, 1, 2)
+    if tensor.dtype != torch.uint8:
+        tensor = tensor.float()
+    tensor = tensor.to(device)
+    if channels_last:
+        tensor = tensor.contiguous(memory_format=torch.channels_last)
+    if repeat:
+        tensor = tensor.expand(repeat, -1, -1, -1)
+    return tensor
+
+
+# Inference precisions accepted by run_model
+PRECISIONS = ('fp32', 'bf16')
+
+
+def inference_context(device, precision='fp32'):
+    """``torch.no_grad()``, plus bfloat16 autocast on ``device`` for ``precision='bf16'``."""
+    import torch
+
+    if precision not in PRECISIONS:
+        raise ValueError('Unknown precision {!r}, expected one of {}'.format(precision, ', '.join(PRECISIONS)))
+
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.no_grad())
+    if precision == 'bf16':
+        device_type = 'cuda' if str(device).startswith('cuda') else 'cpu'
+        stack.enter_context(torch.autocast(device_type=device_type, dtype=torch.bfloat16))
+    return stack
+
+
+def gate_silence(batches, weights):
+    """Take frames with lip-sync weight 0 out of the model inputs of each batch.
+
+    ``weights`` holds one value per frame (see ``audio.lip_sync_weights``).
+    Skipped frames stay in the batch with coords ``None``, so
+    :func:`paste_back` / :func:`composite` pass them through untouched;
+    frames with a weight below 1 get it appended to their coords and are
+    blended over the original face.
+    """
+    start = 0
+    for img_batch, mel_batch, frames, coords in batches:
+        batch_weights = weights[start:start + len(frames)]
+        start += len(frames)
+        active = np.flatnonzero(batch_weights > 0)
+        if len(active) < len(frames):
+            # A broadcast still-avatar batch stays a zero-copy view
+            img_batch = img_batch[:len(active)] if img_batch.strides[0] == 0 else img_batch[active]
+            mel_batch = mel_batch[active]
+        coords = [None if w == 0 else c if w == 1 else tuple(c) + (float(w),)
+                  for c, w in zip(coords, batch_weights)]
+        yield img_batch, mel_batch, frames, coords
+
+
+def run_model(batches, model, device, precision='fp32', channels_last=False):
+    """Run Wav2Lip on each batch; yields ``(pred, frames, coords)`` with pred in 0-255 HWC.
+
+    ``precision='bf16'`` runs the generator under bfloat16 autocast (oneDNN
+    kernels on CPU). ``channels_last`` feeds NHWC-strided inputs and expects
+    the model to have been converted with
+    ``model.to(memory_format=torch.channels_last)``.
+    """
+    model = ScaledFaces(model)
+    for img_batch, mel_batch, frames, coords in batches:
+        if len(img_batch) == 0:
+            yield np.empty((0,) + img_batch.shape[2:] + (3,), dtype=np.float32), frames, coords
+            continue
+        img_batch = _to_tensor(img_batch, device, channels_last)
+        mel_batch = _to_tensor(mel_batch, device, channels_last, nhwc=True)
+
+        with inference_context(device, precision):
+            pred = model(mel_batch, img_batch)
+
+        pred = pred.float().cpu().numpy().transpose(0, 2, 3, 1) * 255.
+        yield pred, frames, coords
+
+
+class ScaledFaces:
+    """Wav2Lip fed uint8 face batches: scales them to 0-1 as the first op of the call.
+
+    The batch crosses to the device as uint8 and is converted there, in a
+    single float32 allocation. A broadcast batch (one face expanded over the
+    batch) is scaled once and expanded again.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, audio_sequences, face_sequences):
+        if not face_sequences.is_floating_point():
+            broadcast = len(face_sequences) > 1 and face_sequences.stride(0) == 0
+            faces = face_sequences[:1] if broadcast else face_sequences
+            faces = faces.float().div_(255.)
+            face_sequences = faces.expand_as(face_sequences) if broadcast else faces
+        return self.model(audio_sequences, face_sequences)
+
+
+class StaticFaceModel:
+    """Wav2Lip for a still avatar: the face encoder runs once per job.
+
+    Every frame of a still avatar feeds the same face crop, so the encoder's
+    feature pyramid is computed from the first batch and broadcast across
+    every later one; only the audio encoder and the decoder run per frame.
+    Use one instance per job.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.feats = None
+
+    def __call__(self, audio_sequences, face_sequences):
+        if self.feats is None:
+            self.feats = self.model.encode_face(face_sequences[:1])
+        return self.model.decode(audio_sequences, self.feats)
+
+
+def paste_frame(pred, frame, coords):
+    """Resize a generated face into its box of ``frame`` (in place) and return the frame.
+
+    ``coords`` is ``(y1, y2, x1, x2)``, or ``(y1, y2, x1, x2, weight)`` to
+    blend the face over the original one. Frames without a face (``pred``
+    None) are returned unchanged.
+    """
+    if pred is None:
+        return frame
+    y1, y2, x1, x2 = coords[:4]
+    face = cv2.resize(pred.astype(np.uint8), (x2 - x1, y2 - y1))
+    if len(coords) == 5:
+        face = cv2.addWeighted(face, coords[4], frame[y1:y2, x1:x2], 1. - coords[4], 0)
+    frame[y1:y2, x1:x2] = face
+    return frame
+
+
+def _paste_jobs(results):
+    """``(pred, frame, coords)`` per frame; frames left out by :func:`gate_silence` get no pred."""
+    for pred, frames, coords in results:
+        preds = iter(pred)
+        for f, c in zip(frames, coords):
+            yield (None if c is None else next(preds)), f, c
+
+
+def paste_back(results):
+    """Paste each generated face into its frame and yield the full frames in order."""
+    for p, f, c in _paste_jobs(results):
+        yield paste_frame(p, f, c)
+
+
+def composite(results, workers=4, max_pending=None):
+    """Parallel :func:`paste_back`: frames are pasted on a thread pool and yielded in order.
+
+    cv2 releases the GIL while resizing, so pastes run concurrently with each
+    other and with the model. Submitted pastes wait in a reorder buffer until
+    every earlier frame is done; at most ``max_pending`` (default
+    ``4 * workers``) are in flight before the consumer blocks on the oldest.
+    Run the model upstream behind :func:`prefetch` so it moves on to the next
+    batch while this stage and the writer drain the current one.
+    """
+    max_pending = max_pending or 4 * workers
+    pending = deque()
+    with ThreadPoolExecutor(workers, thread_name_prefix='wav2lip-paste') as executor:
+        try:
+            for p, f, c in _paste_jobs(results):
+                pending.append(executor.submit(paste_frame, p, f, c))
+                while pending and (len(pending) >= max_pending or pending[0].done()):
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class FFmpegWriter:
+    """Write BGR frames as rawvideo into an ffmpeg process over stdin.
+
+    ffmpeg muxes the frames with ``audio_path`` (if given) and encodes them
+    with ``output_args`` in one pass.
+    """
+
+    def __init__(self, ffmpeg_path, output_path, size, fps, audio_path=None, output_args=()):
+        width, height = size
+        cmd = [
+            ffmpeg_path, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', '{}x{}'.format(width, height), '-r', str(fps),
+            '-i', '-',
+        ]
+        if audio_path is not None:
+            cmd += ['-i', str(audio_path), '-map', '0:v:0', '-map', '1:a:0', '-shortest']
+        cmd += list(output_args) + [str(output_path)]
+
+        self.size = (width, height)
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                         stderr=self._stderr)
+
+    def write(self, frame):
+        if frame.shape[1] != self.size[0] or frame.shape[0] != self.size[1]:
+            raise ValueError('Frame size {}x{} does not match writer size {}x{}'.format(
+                frame.shape[1], frame.shape[0], *self.size))
+        try:
+            self._process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+        except BrokenPipeError:
+            self.close()
+
+    def close(self):
+        """Flush the pipe and wait for ffmpeg; raises RuntimeError if it failed."""
+        if self._process.stdin and not self._process.stdin.closed:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self._process.wait()
+        self._stderr.seek(0)
+        error = self._stderr.read().decode(errors='replace')
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError('ffmpeg exited with code {}: {}'.format(returncode, error))
+
+    def abort(self):
+        self._process.kill()
+        self._process.wait()
+        self._stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+_DONE = object()
+
+
+def prefetch(iterable, maxsize=1):
+    """Run ``iterable`` in a background thread, buffering at most ``maxsize`` items.
+
+    Exceptions raised upstream are re-raised in the consumer. If the consumer
+    stops early the producer thread stops at its next put, including the final
+    one, instead of blocking on the full queue forever.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(entry):
+        """Put ``entry`` unless the consumer has stopped; returns whether it was put."""
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_DONE, e))
+
+    thread = threading.Thread(target=produce, name='wav2lip-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Also runs on GeneratorExit when the consumer closes or drops the generator
+        stop.set()
+
+
+class Throughput:
+    """Counts items passing through a stage and reports items per second."""
+
+    def __init__(self):
+        self.frames = 0
+        self.start = None
+        self.end = None
+
+    def track(self, iterable):
+        self.start = time.perf_counter()
+        for item in iterable:
+            self.frames += 1
+            yield item
+        self.end = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        if self.start is None:
+            return 0.
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def fps(self):
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.
@@ -7,6 +7,8 @@ Flask server for video generation pipeline
 import os
 import uuid
 import logging
+import threading
+import multiprocessing
 from pathlib import Path
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
@@ -36,6 +38,7 @@ CORS(app)
 from database import init_db, SessionLocal
 from services.auth_service import AuthService
 from middleware.auth_middleware import require_auth
+from services.readiness import get_readiness
 
 # Configuration
 MODELS_DIR = Path(os.getenv('MODELS_DIR', './models'))
@@ -47,6 +50,12 @@ AVATARS_DIR = Path(os.getenv('AVATARS_DIR', './avatars'))
 for d in [MODELS_DIR, TEMP_DIR, OUTPUT_DIR, AVATARS_DIR, Path('logs')]:
     d.mkdir(parents=True, exist_ok=True)
 
+# Preload Wav2Lip models in each worker process at startup
+WAV2LIP_WARMUP = os.getenv('WAV2LIP_WARMUP', '0') == '1'
+# Without warm-up everything heavy loads on first use, so there is nothing to wait for
+if not WAV2LIP_WARMUP:
+    get_readiness().set_state('ready')
+
 
 @app.route('/', methods=['GET'])
 def root():
@@ -57,12 +66,15 @@ def root():
         'status': 'running',
         'endpoints': {
             'health': '/health',
+            'ready': '/ready',
             'auth_register': '/api/auth/register',
             'auth_login': '/api/auth/login',
             'auth_refresh': '/api/auth/refresh',
             'auth_logout': '/api/auth/logout',
             'auth_me': '/api/auth/me',
             'wav2lip_status': '/api/wav2lip/status',
+            'wav2lip_models': '/api/wav2lip/models',
+            'wav2lip_workers': '/api/wav2lip/workers',
             'generate_tts': '/api/tts/generate',
             'generate_wav2lip': '/api/wav2lip/generate',
             'transcribe': '/api/transcribe',
@@ -76,14 +88,21 @@ def root():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Liveness probe; never imports torch (gpu_available is null until the warm-up has)"""
     return jsonify({
         'status': 'healthy',
         'service': 'wav2lip-backend',
-        'gpu_available': check_gpu_available()
+        'gpu_available': get_readiness().gpu_available
     })
 
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once heavy modules are imported and models are warm, 503 before"""
+    readiness = get_readiness()
+    return jsonify(readiness.snapshot()), 200 if readiness.is_ready() else 503
+
+
 # ============================================================================
 # AUTHENTICATION ROUTES
 # ============================================================================
@@ -259,8 +278,7 @@ def auth_me(current_user):
 def wav2lip_status():
     """Check Wav2Lip dependencies and readiness"""
     try:
-        from services.wav2lip_service import Wav2LipService
-        service = Wav2LipService()
+        service = get_wav2lip_service()
         status = service.check_dependencies()
         
         ready = all([
@@ -273,7 +291,8 @@ def wav2lip_status():
         return jsonify({
             'ready': ready,
             'dependencies': status,
-            'avatars': service.get_available_avatars()
+            'avatars': service.get_available_avatars(),
+            'result_cache': service.result_cache.stats() if service.result_cache else {'enabled': False}
         })
     except Exception as e:
         logger.error(f"Wav2Lip status check failed: {e}")
@@ -283,6 +302,63 @@ def wav2lip_status():
         }), 500
 
 
+@app.route('/api/wav2lip/models', methods=['GET'])
+def wav2lip_models():
+    """Resident model stats: load time, memory footprint and hit counts"""
+    try:
+        from services.model_registry import get_model_registry
+        return jsonify(get_model_registry().stats())
+    except Exception as e:
+        logger.error(f"Model stats failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/wav2lip/models/warmup', methods=['POST'])
+def warmup_wav2lip_models():
+    """Load checkpoints and the face detector into this worker"""
+    try:
+        data = request.json or {}
+        checkpoints = data.get('checkpoints')
+        
+        from services.model_registry import get_model_registry
+        stats = get_model_registry().warm_up(checkpoints)
+        
+        return jsonify({'success': True, **stats})
+    except Exception as e:
+        logger.error(f"Model warm-up failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/wav2lip/models', methods=['DELETE'])
+@app.route('/api/wav2lip/models/<name>', methods=['DELETE'])
+def evict_wav2lip_models(name=None):
+    """Evict one resident model, or all of them"""
+    try:
+        from services.model_registry import get_model_registry
+        evicted = get_model_registry().evict(name)
+        
+        if name is not None and not evicted:
+            return jsonify({'error': f'Model not loaded: {name}'}), 404
+        
+        return jsonify({'success': True, 'evicted': evicted})
+    except Exception as e:
+        logger.error(f"Model eviction failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/wav2lip/workers', methods=['GET'])
+def wav2lip_workers():
+    """Health check the Wav2Lip worker pool, restarting unresponsive workers"""
+    try:
+        pool = get_wav2lip_service().worker_pool
+        if pool is None:
+            return jsonify({'enabled': False})
+        return jsonify({'enabled': True, **pool.health_check()})
+    except Exception as e:
+        logger.error(f"Worker health check failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/tts/generate', methods=['POST'])
 def generate_tts():
     """Generate TTS audio from text"""
@@ -324,16 +400,15 @@ def generate_wav2lip():
         if not audio_path:
             return jsonify({'error': 'Audio path is required'}), 400
         
-        # Import Wav2Lip service
-        from services.wav2lip_service import Wav2LipService
-        wav2lip = Wav2LipService()
+        wav2lip = get_wav2lip_service()
         
         video_path = wav2lip.generate(audio_path, avatar_id, job_id)
         
         return jsonify({
             'success': True,
             'job_id': job_id,
-            'video_path': str(video_path)
+            'video_path': str(video_path),
+            'stats': wav2lip.job_stats.get(job_id)
         })
         
     except Exception as e:
@@ -416,8 +491,7 @@ def render_video():
 def list_avatars():
     """List available AI instructor avatars"""
     try:
-        from services.wav2lip_service import Wav2LipService
-        service = Wav2LipService()
+        service = get_wav2lip_service()
         return jsonify({'avatars': service.get_available_avatars()})
     except Exception as e:
         logger.error(f"Failed to list avatars: {e}")
@@ -613,13 +687,89 @@ def get_temp_audio(filename):
 
 
 
-def check_gpu_available():
-    """Check if CUDA GPU is available"""
-    try:
-        import torch
-        return torch.cuda.is_available()
-    except ImportError:
-        return False
+_wav2lip_service = None
+_wav2lip_service_lock = threading.Lock()
+
+
+def get_wav2lip_service():
+    """Return the Wav2Lip service shared by all requests in this worker"""
+    global _wav2lip_service
+    if _wav2lip_service is None:
+        # Concurrent first requests (and the warm-up thread) must not build two services
+        with _wav2lip_service_lock:
+            if _wav2lip_service is None:
+                from services.wav2lip_service import Wav2LipService
+                _wav2lip_service = Wav2LipService()
+    return _wav2lip_service
+
+
+_warmup_thread = None
+_warmup_pid = None
+
+
+def start_model_warmup():
+    """
+    Import the heavy modules, load the Wav2Lip models this service runs and
+    start the worker pool in the background so the first job skips all three;
+    /ready turns 200 after. Starts at most one warm-up per process; a forked
+    child (gunicorn --preload) starts its own.
+    """
+    global _warmup_thread, _warmup_pid
+    if _warmup_thread is not None and _warmup_pid == os.getpid():
+        return _warmup_thread
+    
+    from services.model_registry import get_model_registry, WARMUP_CHECKPOINTS
+    from services.readiness import WARMUP_MODULES, WAV2LIP_WARMUP_MODULES
+    
+    readiness = get_readiness()
+    
+    def warm_up():
+        readiness.set_state('warming')
+        try:
+            readiness.preload(WARMUP_MODULES)
+            readiness.record_gpu()
+            logger.info(f"GPU Available: {readiness.gpu_available}")
+            
+            service = get_wav2lip_service()
+            readiness.preload(WAV2LIP_WARMUP_MODULES, path=str(service.wav2lip_dir))
+            # The configured variant (int8, onnx, channels_last), not just the fp32 generator
+            service.load_models()
+            others = [name for name in WARMUP_CHECKPOINTS if name != service.checkpoint_name]
+            if others:
+                get_model_registry().warm_up(others)
+        except Exception as e:
+            logger.error(f"Warm-up failed: {e}")
+            readiness.record_error('warmup', e)
+            readiness.set_state('failed')
+            return
+        
+        from services.wav2lip_service import EXECUTION
+        if EXECUTION == 'pool' and service.worker_pool is not None:
+            if not service.worker_pool.wait_ready():
+                readiness.record_error('workers', RuntimeError("Wav2Lip workers did not become ready"))
+                readiness.set_state('failed')
+                return
+        
+        readiness.set_state('ready', warm=True)
+    
+    _warmup_thread = threading.Thread(
+        target=warm_up,
+        name='wav2lip-warmup',
+        daemon=True
+    )
+    _warmup_pid = os.getpid()
+    _warmup_thread.start()
+    return _warmup_thread
+
+
+# Started on import so that WSGI servers (gunicorn imports app:app in each
+# worker) warm up too, not only `python app.py`. With gunicorn --preload the
+# import happens before the fork and threads do not survive it, so also call
+# app.start_model_warmup() from a post_fork hook. Worker pool processes
+# (spawned, so they re-import `python app.py` as __mp_main__) never warm up:
+# they load or adopt their own models in _worker_main.
+if WAV2LIP_WARMUP and __name__ != '__mp_main__' and multiprocessing.parent_process() is None:
+    start_model_warmup()
 
 
 if __name__ == '__main__':
@@ -631,6 +781,5 @@ if __name__ == '__main__':
     init_db()
     
     logger.info(f"Starting Wav2Lip Backend on port {port}")
-    logger.info(f"GPU Available: {check_gpu_available()}")
     
     app.run(host='0.0.0.0', port=port, debug=debug)
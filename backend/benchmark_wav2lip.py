@@ -0,0 +1,586 @@
+"""
+Wav2Lip Benchmark
+Compares generator variants on a real avatar: throughput, and output quality against fp32
+
+Usage (from the backend directory):
+    python benchmark_wav2lip.py precision --avatar avatars/teacher.mp4 --audio temp/audio/sample.wav --precision bf16
+    python benchmark_wav2lip.py backend --avatar avatars/teacher.mp4 --audio temp/audio/sample.wav
+    python benchmark_wav2lip.py quantize --avatar avatars/teacher.mp4 --audio temp/audio/sample.wav
+    python benchmark_wav2lip.py fuse --avatar avatars/teacher.mp4 --audio temp/audio/sample.wav
+    python benchmark_wav2lip.py keyframes --avatar avatars/teacher.mp4 --intervals 5,10,25
+    python benchmark_wav2lip.py keyframes --avatar avatars/teacher.mp4 --intervals 1,10 --scale 0.5
+    python benchmark_wav2lip.py scaling --avatar avatars/teacher.mp4 --audio temp/audio/sample.wav --workers 1,2,4,8
+    python benchmark_wav2lip.py coldstart
+    python benchmark_wav2lip.py allocations --avatar avatars/teacher.mp4 --audio temp/audio/sample.wav
+"""
+
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from services.model_registry import (
+    get_model_registry, import_wav2lip_models, DEFAULT_CHECKPOINT, BACKENDS, FUSION_TOLERANCE
+)
+from services.avatar_cache import AvatarCache
+from services.wav2lip_service import (
+    FACE_PADS, FACE_DET_BATCH_SIZE, FACE_DET_KEYFRAME_THRESHOLD, FACE_DET_SCALE, IMG_SIZE, PRECISIONS
+)
+
+# Lowest mouth-region PSNR against fp32 that bf16 / channels_last may reach (tests/test_precision.py)
+PRECISION_MIN_PSNR = 35.0
+
+
+def load_inputs(avatar_path: Path, audio_path: Path, num_frames: int, batch_size: int):
+    """Model-ready (img_batch, mel_batch) pairs for the first ``num_frames`` frames"""
+    registry = get_model_registry()
+    if str(registry.wav2lip_dir) not in sys.path:
+        sys.path.insert(0, str(registry.wav2lip_dir))
+    import audio
+    import streaming
+
+    cache = AvatarCache(registry, FACE_DET_BATCH_SIZE)
+    boxes = cache.get_boxes(avatar_path, FACE_PADS)
+    faces = cache.get_faces(avatar_path, FACE_PADS, IMG_SIZE)
+
+    fps = streaming.get_fps(avatar_path)
+    mel = audio.melspectrogram(audio.load_wav(str(audio_path), 16000))
+    mel_chunks = audio.mel_chunks(mel, fps)
+    num_frames = min(num_frames, len(mel_chunks))
+
+    frames = streaming.read_frames(avatar_path, num_frames)
+    batches = streaming.bundle_datagen(frames, faces, boxes, mel_chunks[:num_frames], batch_size)
+    return [(np.array(img), mel) for img, mel, _, _ in batches]
+
+
+def run_generator(model, inputs, device: str, precision: str = 'fp32', channels_last: bool = False,
+                  with_latency: bool = False):
+    """Run every batch once; returns (predictions in 0-255 HWC, frames/sec[, mean ms per batch])"""
+    import streaming
+
+    batches = ((img, mel, None, None) for img, mel in inputs)
+    start = time.perf_counter()
+    preds = [pred for pred, _, _ in streaming.run_model(batches, model, device, precision, channels_last)]
+    elapsed = time.perf_counter() - start
+
+    preds = np.concatenate(preds)
+    if with_latency:
+        return preds, len(preds) / elapsed, elapsed * 1000 / len(inputs)
+    return preds, len(preds) / elapsed
+
+
+def mouth_psnr(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """PSNR in dB over the lower half of the generated faces, where the mouth is synthesized"""
+    half = reference.shape[1] // 2
+    reference = np.clip(reference[:, half:], 0, 255).astype(np.float64)
+    candidate = np.clip(candidate[:, half:], 0, 255).astype(np.float64)
+    mse = np.mean((reference - candidate) ** 2)
+    if mse == 0:
+        return float('inf')
+    return 10 * np.log10(255. ** 2 / mse)
+
+
+def cmd_precision(args) -> bool:
+    registry = get_model_registry()
+    device = registry.device
+    inputs = load_inputs(Path(args.avatar), Path(args.audio), args.frames, args.batch_size)
+
+    reference_model = registry.get_wav2lip(args.checkpoint)
+    candidate_model = registry.get_wav2lip(args.checkpoint, channels_last=args.channels_last)
+
+    # Untimed pass so kernel selection does not count against either mode
+    run_generator(reference_model, inputs[:1], device)
+    run_generator(candidate_model, inputs[:1], device, args.precision, args.channels_last)
+
+    reference, reference_fps = run_generator(reference_model, inputs, device)
+    candidate, candidate_fps = run_generator(
+        candidate_model, inputs, device, args.precision, args.channels_last
+    )
+    psnr = mouth_psnr(reference, candidate)
+
+    mode = args.precision + (' + channels_last' if args.channels_last else '')
+    print(f"Device:        {device}")
+    print(f"Frames:        {len(reference)}")
+    print(f"fp32:          {reference_fps:.1f} frames/sec")
+    print(f"{mode + ':':<14} {candidate_fps:.1f} frames/sec ({candidate_fps / reference_fps:.2f}x)")
+    print(f"Mouth PSNR:    {psnr:.2f} dB (minimum {args.min_psnr} dB)")
+
+    return psnr >= args.min_psnr
+
+
+def cmd_backend(args) -> bool:
+    registry = get_model_registry()
+    inputs = load_inputs(Path(args.avatar), Path(args.audio), args.frames, args.batch_size)
+
+    results = {}
+    for backend in BACKENDS:
+        model = registry.get_wav2lip(args.checkpoint, backend=backend)
+        device = 'cpu' if backend == 'onnx' else registry.device
+        run_generator(model, inputs[:1], device)
+        results[backend] = run_generator(model, inputs, device)
+
+    reference, reference_fps = results['torch']
+    print(f"Device:        {registry.device} (onnx runs on cpu)")
+    print(f"Frames:        {len(reference)}")
+    for backend, (preds, fps) in results.items():
+        print(f"{backend + ':':<14} {fps:.1f} frames/sec ({fps / reference_fps:.2f}x)")
+
+    psnr = mouth_psnr(reference, results['onnx'][0])
+    print(f"Mouth PSNR:    {psnr:.2f} dB (minimum {args.min_psnr} dB)")
+    return psnr >= args.min_psnr
+
+
+def cmd_quantize(args) -> bool:
+    registry = get_model_registry()
+    calibration_batches = -(-args.calibration_frames // args.batch_size)
+    inputs = load_inputs(
+        Path(args.avatar), Path(args.audio),
+        args.frames + calibration_batches * args.batch_size, args.batch_size
+    )
+    calibration, inputs = inputs[:calibration_batches], inputs[calibration_batches:]
+    import quantization
+    if not inputs:
+        print("Not enough audio for both calibration and evaluation frames")
+        return False
+
+    # Calibrate on frames that are not part of the evaluation
+    if args.recalibrate or not registry.calibration_path.exists():
+        quantization.save_calibration_sample(
+            registry.calibration_path,
+            np.concatenate([mel[..., 0] for _, mel in calibration]),
+            np.concatenate([img.transpose(0, 2, 3, 1) for img, _ in calibration])
+        )
+        quantized_path = registry.quantized_path(registry.checkpoint_path(args.checkpoint))
+        if quantized_path.exists():
+            quantized_path.unlink()
+        registry.evict(f"{args.checkpoint}:int8")
+        print(f"Saved calibration sample to {registry.calibration_path}")
+
+    reference_model = registry.get_wav2lip(args.checkpoint)
+    quantized_model = registry.get_wav2lip(args.checkpoint, quantized=True)
+
+    run_generator(reference_model, inputs[:1], registry.device)
+    run_generator(quantized_model, inputs[:1], 'cpu')
+    reference, reference_fps, reference_ms = run_generator(
+        reference_model, inputs, registry.device, with_latency=True
+    )
+    candidate, candidate_fps, candidate_ms = run_generator(
+        quantized_model, inputs, 'cpu', with_latency=True
+    )
+    psnr = mouth_psnr(reference, candidate)
+
+    print(f"Device:        {registry.device} (int8 runs on cpu)")
+    print(f"Frames:        {len(reference)} (batch size {args.batch_size})")
+    print(f"fp32:          {reference_ms:.1f} ms/batch, {reference_fps:.1f} frames/sec")
+    print(f"int8:          {candidate_ms:.1f} ms/batch, {candidate_fps:.1f} frames/sec "
+          f"({candidate_fps / reference_fps:.2f}x)")
+    print(f"Mouth PSNR:    {psnr:.2f} dB (minimum {args.min_psnr} dB)")
+    return psnr >= args.min_psnr
+
+
+def _randomize_batchnorm(model):
+    """Give every BatchNorm non-trivial statistics so fusion is exercised on untrained models"""
+    import torch
+
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.5, 0.5)
+    return model.eval()
+
+
+def cmd_fuse(args) -> bool:
+    import torch
+
+    registry = get_model_registry()
+    inputs = load_inputs(Path(args.avatar), Path(args.audio), args.frames, args.batch_size)
+    import fusion
+
+    models = import_wav2lip_models(registry.wav2lip_dir)
+    img, mel = inputs[0]
+    checks = {
+        'Wav2Lip': (
+            registry._load_wav2lip(registry.checkpoint_path(args.checkpoint), fuse=False).cpu(),
+            (torch.from_numpy(mel[:8]).float().permute(0, 3, 1, 2),
+             torch.from_numpy(img[:8]).float() / 255.)
+        ),
+        'SyncNet_color': (
+            _randomize_batchnorm(models.SyncNet_color()),
+            (torch.rand(8, 1, 80, 16), torch.rand(8, 15, 48, 96))
+        ),
+        'Wav2Lip_disc_qual': (
+            _randomize_batchnorm(models.Wav2Lip_disc_qual()),
+            (torch.rand(2, 3, 5, 96, 96),)
+        ),
+    }
+
+    passed = True
+    for name, (model, model_inputs) in checks.items():
+        blocks = sum(1 for module in model.modules() if fusion.is_conv_bn_block(module))
+        error = fusion.max_fusion_error(model, model_inputs)
+        passed = passed and error <= FUSION_TOLERANCE
+        print(f"{name + ':':<19} {blocks} blocks fused, max abs error {error:.2e} (tolerance {FUSION_TOLERANCE:.0e})")
+
+    unfused = registry._load_wav2lip(registry.checkpoint_path(args.checkpoint), fuse=False)
+    fused = registry._load_wav2lip(registry.checkpoint_path(args.checkpoint), fuse=True)
+    run_generator(unfused, inputs[:1], registry.device)
+    run_generator(fused, inputs[:1], registry.device)
+    _, unfused_fps = run_generator(unfused, inputs, registry.device)
+    _, fused_fps = run_generator(fused, inputs, registry.device)
+    print(f"Device:             {registry.device}")
+    print(f"Unfused:            {unfused_fps:.1f} frames/sec")
+    print(f"Fused:              {fused_fps:.1f} frames/sec ({fused_fps / unfused_fps:.2f}x)")
+    return passed
+
+
+def cmd_keyframes(args) -> bool:
+    registry = get_model_registry()
+    if str(registry.wav2lip_dir) not in sys.path:
+        sys.path.insert(0, str(registry.wav2lip_dir))
+    import streaming
+
+    detector = registry.get_face_detector()
+    avatar = Path(args.avatar)
+
+    start = time.perf_counter()
+    boxes = {}
+    for _ in streaming.detect_faces(streaming.read_frames(avatar), detector, FACE_PADS,
+                                    batch_size=FACE_DET_BATCH_SIZE, boxes=boxes):
+        pass
+    reference = np.array([boxes[i] for i in range(len(boxes))])
+    full_time = time.perf_counter() - start
+
+    print(f"Full detection: {len(reference)} frames in {full_time:.1f}s")
+    print(f"{'interval':>8} {'keyframes':>9} {'seconds':>8} {'speedup':>8} "
+          f"{'mean px':>8} {'max px':>8} {'mean IoU':>8} {'min IoU':>8}")
+    passed = True
+    for interval in [int(n) for n in args.intervals.split(',')]:
+        start = time.perf_counter()
+        candidate, keyframes = streaming.detect_keyframe_boxes(
+            streaming.read_frames(avatar), detector, FACE_PADS,
+            interval=interval, threshold=args.threshold, batch_size=FACE_DET_BATCH_SIZE, scale=args.scale
+        )
+        elapsed = time.perf_counter() - start
+        drift = streaming.box_drift(reference, candidate)
+        passed = passed and drift['max_error_px'] <= args.max_error
+        print(f"{interval:>8} {len(keyframes):>9} {elapsed:>8.1f} {full_time / elapsed:>7.2f}x "
+              f"{drift['mean_error_px']:>8.1f} {drift['max_error_px']:>8.1f} "
+              f"{drift['mean_iou']:>8.3f} {drift['min_iou']:>8.3f}")
+    return passed
+
+
+def _process_memory_mb(pid: int):
+    """(resident, shared) MB of a process from /proc, or None off Linux"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+    kb = lambda name: int(fields.get(name, '0 kB').split()[0])
+    return kb('VmRSS') / 1024, (kb('RssFile') + kb('RssShmem')) / 1024
+
+
+def _frame_count(video_path: Path) -> int:
+    import cv2
+    capture = cv2.VideoCapture(str(video_path))
+    frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    return frames
+
+
+def cmd_scaling(args) -> bool:
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from services.wav2lip_service import Wav2LipService
+    from services.worker_pool import Wav2LipWorkerPool
+
+    cpu_count = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = [int(n) for n in args.workers.split(',')]
+    else:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= cpu_count:
+            worker_counts.append(worker_counts[-1] * 2)
+
+    service = Wav2LipService(checkpoint=args.checkpoint, worker_pool=False)
+    shared_weights = None if args.no_share else service.share_weights
+    print(f"CPUs: {cpu_count}, shared weights: {'no' if args.no_share else 'yes'}, "
+          f"affinity: {'yes' if args.affinity else 'no'}")
+    print(f"{'workers':>7} {'threads':>7} {'jobs':>5} {'frames':>7} {'seconds':>8} "
+          f"{'fps':>8} {'speedup':>8} {'rss MB':>8} {'private MB':>10}")
+
+    baseline_fps = None
+    with tempfile.TemporaryDirectory() as out_dir:
+        for size in worker_counts:
+            pool = Wav2LipWorkerPool(
+                size=size,
+                service_options={'checkpoint': args.checkpoint},
+                num_threads=args.threads or max(1, cpu_count // size),
+                affinity=args.affinity,
+                shared_weights=shared_weights
+            )
+            try:
+                if not pool.wait_ready():
+                    print(f"{size} workers did not become ready")
+                    return False
+                outputs = [Path(out_dir) / f"{size}_{i}.mp4" for i in range(size * args.jobs_per_worker)]
+                start = time.perf_counter()
+                with ThreadPoolExecutor(size) as executor:
+                    list(executor.map(lambda output: pool.run(Path(args.avatar), Path(args.audio), output), outputs))
+                elapsed = time.perf_counter() - start
+
+                memory = [_process_memory_mb(w['pid']) for w in pool.health_check()['workers']]
+                memory = [m for m in memory if m]
+            finally:
+                pool.shutdown()
+
+            frames = sum(_frame_count(output) for output in outputs)
+            fps = frames / elapsed
+            baseline_fps = baseline_fps or fps
+            rss = sum(m[0] for m in memory) / len(memory) if memory else float('nan')
+            private = sum(m[0] - m[1] for m in memory) / len(memory) if memory else float('nan')
+            print(f"{size:>7} {pool.num_threads:>7} {len(outputs):>5} {frames:>7} {elapsed:>8.1f} "
+                  f"{fps:>8.1f} {fps / baseline_fps:>7.2f}x {rss:>8.0f} {private:>10.0f}")
+    return True
+
+
+def _cold_load(method: str, checkpoint: str, conn):
+    """Load a generator in a fresh process and report (seconds, rss MB, private MB)"""
+    start = time.perf_counter()
+    import torch
+    registry = get_model_registry()
+    checkpoint_path = registry.checkpoint_path(checkpoint)
+    if method == 'pickle':
+        model = import_wav2lip_models(registry.wav2lip_dir).Wav2Lip()
+        state_dict = torch.load(checkpoint_path, map_location=lambda storage, loc: storage)['state_dict']
+        model.load_state_dict({k.replace('module.', ''): v for k, v in state_dict.items()})
+    else:
+        model = registry._load_wav2lip(checkpoint_path, fuse=False)
+    # Touch every weight, as the first batch would
+    with torch.no_grad():
+        sum(float(t.sum()) for t in model.state_dict().values())
+    seconds = time.perf_counter() - start
+    rss, shared = _process_memory_mb(os.getpid()) or (float('nan'), float('nan'))
+    conn.send((seconds, rss, rss - shared))
+    conn.close()
+
+
+def cmd_coldstart(args) -> bool:
+    import multiprocessing
+    import torch
+
+    registry = get_model_registry()
+    checkpoint_path = registry.checkpoint_path(args.checkpoint)
+    # Make sure the converted file exists and matches the checkpoint
+    converted, _ = registry._load_state_dict(checkpoint_path)
+    reference = torch.load(checkpoint_path, map_location=lambda storage, loc: storage)['state_dict']
+    error = max(float((v.float() - converted[k.replace('module.', '')].float()).abs().max())
+                for k, v in reference.items())
+
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    print(f"{'load':>7} {'seconds':>8} {'rss MB':>8} {'private MB':>10}")
+    for method in ('pickle', 'mmap'):
+        runs = []
+        for _ in range(args.repeats):
+            parent_conn, child_conn = context.Pipe(duplex=False)
+            process = context.Process(target=_cold_load, args=(method, args.checkpoint, child_conn))
+            process.start()
+            runs.append(parent_conn.recv())
+            process.join()
+        seconds, rss, private = (min(run[i] for run in runs) for i in range(3))
+        results[method] = seconds
+        print(f"{method:>7} {seconds:>8.3f} {rss:>8.0f} {private:>10.0f}")
+
+    import mmap_weights
+    half = mmap_weights.read_header(registry.weights_path(checkpoint_path))[1].get('half') == 'True'
+    print(f"Converted file: {registry.weights_path(checkpoint_path).name} ({'fp16' if half else 'fp32'}), "
+          f"max abs error {error:.2e}")
+    print(f"Load speed-up:  {results['pickle'] / results['mmap']:.2f}x")
+    # fp32 files hold the checkpoint's exact values
+    return half or error == 0
+
+
+def _float64_datagen(faces, mels, img_size: int, batch_size: int):
+    """Image batches as datagen built them before the uint8 buffers: float64 NHWC, the allocation baseline"""
+    import cv2
+    import streaming
+
+    img_batch, start = [], 0
+    for frame, (y1, y2, x1, x2) in faces:
+        img_batch.append(cv2.resize(frame[y1:y2, x1:x2], (img_size, img_size)))
+        if len(img_batch) == batch_size:
+            imgs = np.asarray(img_batch)
+            img_masked = imgs.copy()
+            img_masked[:, img_size // 2:] = 0
+            yield np.concatenate((img_masked, imgs), axis=3) / 255., streaming._mel_batch(mels, start, len(img_batch))
+            start += len(img_batch)
+            img_batch = []
+
+
+def cmd_allocations(args) -> bool:
+    import tracemalloc
+    import torch
+    from torch.profiler import profile, ProfilerActivity
+
+    registry = get_model_registry()
+    if str(registry.wav2lip_dir) not in sys.path:
+        sys.path.insert(0, str(registry.wav2lip_dir))
+    import audio
+    import streaming
+
+    avatar_path = Path(args.avatar)
+    cache = AvatarCache(registry, FACE_DET_BATCH_SIZE)
+    boxes = cache.get_boxes(avatar_path, FACE_PADS)
+    faces = cache.get_faces(avatar_path, FACE_PADS, IMG_SIZE)
+    mel = audio.melspectrogram(audio.load_wav(str(args.audio), 16000))
+    mel_chunks = audio.mel_chunks(mel, streaming.get_fps(avatar_path))
+    # Whole batches only, so every variant sees the same frames
+    num_frames = min(args.frames, len(mel_chunks)) // args.batch_size * args.batch_size
+    if not num_frames:
+        print(f"Need at least {args.batch_size} frames of audio")
+        return False
+    mels = mel_chunks[:num_frames]
+
+    # Face crops only, so decoding full frames is not part of the measurement
+    crops, frame_positions = [], []
+    for position, frame in streaming.read_frames(avatar_path, num_frames):
+        x1, y1, x2, y2 = boxes[position]
+        crops.append(np.ascontiguousarray(frame[y1:y2, x1:x2]))
+        frame_positions.append(position)
+    crop_faces = lambda: ((crop, (0, crop.shape[0], 0, crop.shape[1])) for crop in crops)
+    positions = lambda: ((position, None) for position in frame_positions)
+    scale = streaming.ScaledFaces(lambda audio_sequences, face_sequences: face_sequences)
+
+    variants = {
+        'float64': (
+            lambda: _float64_datagen(crop_faces(), mels, IMG_SIZE, args.batch_size),
+            lambda img: torch.FloatTensor(np.transpose(img, (0, 3, 1, 2)))
+        ),
+        'uint8': (
+            lambda: (b[:2] for b in streaming.datagen(crop_faces(), mels, IMG_SIZE, args.batch_size)),
+            lambda img: scale(None, streaming._to_tensor(img, 'cpu'))
+        ),
+        'bundle': (
+            lambda: (b[:2] for b in streaming.bundle_datagen(positions(), faces, boxes, mels, args.batch_size)),
+            lambda img: scale(None, streaming._to_tensor(img, 'cpu'))
+        ),
+    }
+
+    print(f"Frames: {num_frames}, batch size {args.batch_size}")
+    print(f"{'batches':>16} {'buffers':>8} {'numpy KB/frame':>15} {'torch allocs/batch':>19} "
+          f"{'torch KB/frame':>15} {'ms/batch':>9}")
+    outputs, numpy_per_frame, buffers_used = {}, {}, {}
+    for name, (batches, to_tensor) in variants.items():
+        batch_count = 0
+        start = time.perf_counter()
+        for img, _ in batches():
+            to_tensor(img)
+            batch_count += 1
+        ms_per_batch = (time.perf_counter() - start) * 1000 / batch_count
+
+        buffers, numpy_bytes, tensors = set(), 0, []
+        iterator = batches()
+        tracemalloc.start()
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+            while True:
+                # Bytes allocated while building and converting this batch, freed or not
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                batch = next(iterator, None)
+                if batch is None:
+                    break
+                # Reused buffers and bundle slices show up as repeated addresses
+                buffers.add(batch[0].__array_interface__['data'][0])
+                tensors.append(to_tensor(batch[0]))
+                numpy_bytes += tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        allocs = [e.cpu_memory_usage for e in prof.events() if e.name == '[memory]' and e.cpu_memory_usage > 0]
+
+        outputs[name] = torch.cat(tensors)
+        numpy_per_frame[name] = numpy_bytes / num_frames
+        buffers_used[name] = len(buffers)
+        print(f"{name:>7} {batch_count:>8} {len(buffers):>8} {numpy_per_frame[name] / 1024:>15.1f} "
+              f"{len(allocs) / batch_count:>19.1f} {sum(allocs) / num_frames / 1024:>15.1f} {ms_per_batch:>9.2f}")
+
+    errors = {name: float((outputs[name] - outputs['float64']).abs().max()) for name in ('uint8', 'bundle')}
+    print(f"Max abs error vs float64: {', '.join(f'{k} {v:.1e}' for k, v in errors.items())}")
+    return (all(error <= 1e-6 for error in errors.values())
+            and numpy_per_frame['uint8'] < numpy_per_frame['float64']
+            and buffers_used['uint8'] <= 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Wav2Lip generator variants')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    precision = subparsers.add_parser('precision', help='Compare a precision mode against fp32')
+    # int8 needs calibration, which the quantize subcommand runs
+    precision.add_argument('--precision', choices=[p for p in PRECISIONS if p != 'int8'], default='bf16',
+                           help='Autocast precision to compare (use the quantize subcommand for int8)')
+    precision.add_argument('--channels_last', action='store_true')
+    precision.add_argument('--min_psnr', type=float, default=PRECISION_MIN_PSNR,
+                           help='Fail when mouth-region PSNR against fp32 is below this')
+    precision.set_defaults(func=cmd_precision)
+
+    backend = subparsers.add_parser('backend', help='Compare ONNX Runtime against eager PyTorch')
+    backend.add_argument('--min_psnr', type=float, default=45.0,
+                         help='Fail when mouth-region PSNR against PyTorch is below this')
+    backend.set_defaults(func=cmd_backend)
+
+    quantize = subparsers.add_parser('quantize', help='Calibrate int8 and compare it against fp32')
+    quantize.add_argument('--calibration_frames', type=int, default=64)
+    quantize.add_argument('--recalibrate', action='store_true',
+                          help='Replace the saved calibration sample and cached int8 checkpoint')
+    quantize.add_argument('--min_psnr', type=float, default=30.0,
+                          help='Fail when mouth-region PSNR against fp32 is below this')
+    quantize.set_defaults(func=cmd_quantize)
+
+    fuse = subparsers.add_parser('fuse', help='Check Conv+BatchNorm fusion and compare its speed')
+    fuse.set_defaults(func=cmd_fuse)
+
+    keyframes = subparsers.add_parser('keyframes', help='Drift of keyframe face detection against every frame')
+    keyframes.add_argument('--intervals', default='5,10,25,50', help='Comma-separated keyframe intervals')
+    keyframes.add_argument('--threshold', type=float, default=FACE_DET_KEYFRAME_THRESHOLD,
+                           help='Frame-difference threshold that forces a keyframe (0 disables)')
+    keyframes.add_argument('--scale', type=float, default=FACE_DET_SCALE,
+                           help='Detection scale of the keyframe runs (--intervals 1 measures scale alone)')
+    keyframes.add_argument('--max_error', type=float, default=8.0,
+                           help='Fail when any box corner drifts more than this many pixels')
+    keyframes.set_defaults(func=cmd_keyframes)
+
+    scaling = subparsers.add_parser('scaling', help='Aggregate frames/sec of worker pools of increasing size')
+    scaling.add_argument('--workers', help='Comma-separated pool sizes (default: powers of two up to the CPU count)')
+    scaling.add_argument('--threads', type=int, default=0,
+                         help='Torch threads per worker (default: CPUs split evenly between workers)')
+    scaling.add_argument('--jobs_per_worker', type=int, default=2)
+    scaling.add_argument('--affinity', action='store_true', help='Pin each worker to its own CPUs')
+    scaling.add_argument('--no_share', action='store_true', help='Let every worker load its own weights')
+    scaling.set_defaults(func=cmd_scaling)
+
+    coldstart = subparsers.add_parser('coldstart', help='Generator load time and memory, pickled vs memory-mapped')
+    coldstart.add_argument('--repeats', type=int, default=3, help='Fresh processes per load method')
+    coldstart.set_defaults(func=cmd_coldstart)
+
+    allocations = subparsers.add_parser('allocations', help='Allocations per frame of the face batch paths')
+    allocations.set_defaults(func=cmd_allocations)
+
+    for name, subparser in subparsers.choices.items():
+        subparser.add_argument('--avatar', required=name != 'coldstart', help='Avatar video or image')
+        subparser.add_argument('--audio', required=name not in ('keyframes', 'coldstart'),
+                               help='WAV file driving the lip sync')
+        subparser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+        subparser.add_argument('--frames', type=int, default=256)
+        subparser.add_argument('--batch_size', type=int, default=128)
+
+    args = parser.parse_args()
+    sys.exit(0 if args.func(args) else 1)
+
+
+if __name__ == '__main__':
+    main()
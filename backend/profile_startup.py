@@ -0,0 +1,115 @@
+"""
+Startup Profile
+Import-time profile of app.py (python -X importtime), checked against the
+import policy in services/readiness.py and a recorded baseline
+
+Usage (from the backend directory):
+    python profile_startup.py                # slowest top-level packages imported by app.py
+    python profile_startup.py --save         # record profiles/importtime_baseline.txt
+    python profile_startup.py --check        # fail on deferred modules at import time, or a slower startup
+"""
+
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, Tuple
+
+from services.readiness import IMPORT_POLICY
+
+BACKEND_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = BACKEND_DIR / 'profiles' / 'importtime_baseline.txt'
+
+
+def profile_imports(module: str = 'app') -> Tuple[int, Dict[str, int]]:
+    """
+    Import ``module`` in a fresh interpreter under -X importtime
+
+    Returns:
+        (total microseconds, self microseconds per top-level package)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    packages: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return sum(packages.values()), packages
+
+
+def read_baseline(path: Path) -> Tuple[int, Dict[str, int]]:
+    packages = {}
+    with open(path) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            package, self_us = line.split()
+            packages[package] = int(self_us)
+    return sum(packages.values()), packages
+
+
+def write_baseline(path: Path, total: int, packages: Dict[str, int]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        f.write("# python -X importtime -c 'import app', self time per top-level package in microseconds\n")
+        f.write(f"# python {sys.version.split()[0]}, total {total / 1e6:.3f}s; regenerate with: python profile_startup.py --save\n")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1]):
+            f.write(f"{package} {self_us}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile the import time of the Flask backend')
+    parser.add_argument('--module', default='app', help='Module to import')
+    parser.add_argument('--top', type=int, default=15, help='Packages to print')
+    parser.add_argument('--save', action='store_true', help=f'Write the profile to {BASELINE_FILE.name}')
+    parser.add_argument('--check', action='store_true',
+                        help='Fail when a warmup/lazy module is imported or startup is slower than the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed slowdown against the baseline total (0.5 = 50%%)')
+    args = parser.parse_args()
+
+    total, packages = profile_imports(args.module)
+    print(f"import {args.module}: {total / 1e6:.3f}s across {len(packages)} top-level packages")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        policy = IMPORT_POLICY.get(package, '')
+        print(f"  {package:<24} {self_us / 1e3:>9.1f} ms  {policy}")
+
+    if args.save:
+        write_baseline(BASELINE_FILE, total, packages)
+        print(f"Saved {BASELINE_FILE}")
+
+    if not args.check:
+        return
+
+    ok = True
+    deferred = sorted(p for p in packages if IMPORT_POLICY.get(p, 'startup') != 'startup')
+    if deferred:
+        print(f"FAIL: imported at startup despite their policy: {', '.join(deferred)}")
+        ok = False
+
+    if BASELINE_FILE.exists():
+        baseline_total, baseline = read_baseline(BASELINE_FILE)
+        limit = baseline_total * (1 + args.tolerance)
+        new = sorted(set(packages) - set(baseline))
+        print(f"Baseline: {baseline_total / 1e6:.3f}s, limit {limit / 1e6:.3f}s"
+              + (f", new packages: {', '.join(new)}" if new else ''))
+        if total > limit:
+            print(f"FAIL: startup imports take {total / 1e6:.3f}s")
+            ok = False
+    else:
+        print(f"No baseline at {BASELINE_FILE}; record one with --save")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""
+Avatar Cache
+Compiles avatars once into face boxes and model-ready face crops stored next to the avatar
+"""
+
+import os
+import sys
+import uuid
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_NAME = '.cache'
+# Bump when the stored layout or detection pipeline changes
+CACHE_VERSION = 2
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class AvatarCache:
+    """
+    Per-avatar artifacts that do not depend on the lesson audio
+
+    Two memory-mappable ``.npy`` files are kept in ``<avatar dir>/.cache``:
+
+    - ``boxes``: int32 ``(n_frames, 4)`` padded face boxes ``[x1, y1, x2, y2]``
+    - ``faces``: uint8 ``(n_frames, 6, img_size, img_size)`` Wav2Lip face
+      inputs, the lower-half-masked crop stacked on the unmasked crop (NCHW,
+      so a run of frames is a model-ready batch without a copy)
+
+    File names carry a hash of the avatar's content and of the pads / resize /
+    crop-size settings, so editing or replacing the avatar file invalidates
+    its artifacts.
+
+    With ``keyframe_interval`` above 1, faces are detected only on every
+    ``keyframe_interval``-th frame and on frames whose difference from the
+    last keyframe exceeds ``keyframe_threshold``; the boxes in between are
+    interpolated. ``detection_scale`` below 1 runs the detector on downscaled
+    frames; boxes and crops stay at the avatar's full resolution.
+    """
+
+    def __init__(self, registry, face_det_batch_size: int = 16,
+                 keyframe_interval: int = 1, keyframe_threshold: float = 0.0,
+                 detection_scale: float = 1.0):
+        self.registry = registry
+        self.face_det_batch_size = face_det_batch_size
+        self.detection_scale = detection_scale
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_threshold = keyframe_threshold
+        self._digests: Dict[str, tuple] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def content_hash(self, avatar_path: Path) -> str:
+        """SHA-256 of the avatar file, memoized on (size, mtime)"""
+        avatar_path = Path(avatar_path)
+        stat = avatar_path.stat()
+        signature = (stat.st_size, stat.st_mtime_ns)
+
+        cached = self._digests.get(str(avatar_path))
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(avatar_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        self._digests[str(avatar_path)] = (signature, digest)
+        return digest
+
+    def cache_path(self, avatar_path: Path, kind: str, pads: Sequence[int],
+                   resize_factor: int = 1, img_size: Optional[int] = None) -> Path:
+        """Path of an artifact ('boxes' or 'faces') for the given settings"""
+        avatar_path = Path(avatar_path)
+        content = self.content_hash(avatar_path)[:16]
+        settings = (CACHE_VERSION, tuple(int(p) for p in pads), int(resize_factor), img_size)
+        if self.keyframe_interval > 1:
+            settings += (self.keyframe_interval, float(self.keyframe_threshold))
+        if self.detection_scale != 1.0:
+            settings += (('scale', float(self.detection_scale)),)
+        settings = hashlib.sha256(repr(settings).encode()).hexdigest()[:8]
+        # Keyed on the full file name so avatar.mp4 and avatar.jpg never share artifacts
+        return avatar_path.parent / CACHE_DIR_NAME / f"{avatar_path.name}.{content}.{settings}.{kind}.npy"
+
+    def get_boxes(self, avatar_path: Path, pads: Sequence[int], resize_factor: int = 1):
+        """Face boxes for every avatar frame, detecting them on a cache miss"""
+        path = self.populate_boxes(avatar_path, pads, resize_factor)
+        return self._load(path)
+
+    def get_faces(self, avatar_path: Path, pads: Sequence[int], img_size: int = 96, resize_factor: int = 1):
+        """Model-ready face inputs for every avatar frame, compiling them on a cache miss"""
+        path = self.compile_faces(avatar_path, pads, img_size, resize_factor)
+        return self._load(path)
+
+    def compile(self, avatar_path: Path, pads: Sequence[int], img_size: int = 96, resize_factor: int = 1):
+        """Build every artifact of an avatar that is not cached yet"""
+        self.compile_faces(avatar_path, pads, img_size, resize_factor)
+
+    def compile_async(self, avatar_paths: Iterable[Path], pads: Sequence[int],
+                      img_size: int = 96, resize_factor: int = 1):
+        """Compile avatars in a background thread"""
+        def run():
+            for avatar_path in avatar_paths:
+                try:
+                    self.compile(avatar_path, pads, img_size, resize_factor)
+                except Exception as e:
+                    logger.warning(f"Avatar compile failed for {avatar_path}: {e}")
+
+        thread = threading.Thread(target=run, name='avatar-compile', daemon=True)
+        thread.start()
+        return thread
+
+    def is_compiled(self, avatar_path: Path, pads: Sequence[int], img_size: int = 96, resize_factor: int = 1) -> bool:
+        return self.cache_path(avatar_path, 'faces', pads, resize_factor, img_size).exists()
+
+    def populate_boxes(self, avatar_path: Path, pads: Sequence[int], resize_factor: int = 1) -> Path:
+        """Detect faces in every frame of the avatar and write the box file"""
+        import numpy as np
+
+        avatar_path = Path(avatar_path)
+        path = self.cache_path(avatar_path, 'boxes', pads, resize_factor)
+
+        with self._avatar_lock(avatar_path):
+            if path.exists():
+                return path
+
+            streaming = self._import_streaming()
+            logger.info(f"Detecting faces for avatar cache: {avatar_path.name}")
+            frames = streaming.read_frames(avatar_path, transform=self._transform(resize_factor))
+            if self.keyframe_interval > 1:
+                array, keyframes = streaming.detect_keyframe_boxes(
+                    frames, self.registry.get_face_detector(), pads,
+                    interval=self.keyframe_interval, threshold=self.keyframe_threshold,
+                    batch_size=self.face_det_batch_size, scale=self.detection_scale
+                )
+                logger.info(f"Detected faces on {len(keyframes)} of {len(array)} keyframes")
+            else:
+                boxes = {}
+                for _ in streaming.detect_faces(
+                    frames, self.registry.get_face_detector(), pads,
+                    batch_size=self.face_det_batch_size, boxes=boxes, scale=self.detection_scale
+                ):
+                    pass
+                array = np.array([boxes[i] for i in range(len(boxes))], dtype=np.int32)
+
+            self._save(avatar_path, path, array)
+            logger.info(f"Cached {len(array)} face boxes for {avatar_path.name}")
+            return path
+
+    def compile_faces(self, avatar_path: Path, pads: Sequence[int], img_size: int = 96, resize_factor: int = 1) -> Path:
+        """Crop, resize and mask every avatar frame into the faces bundle"""
+        import numpy as np
+        import cv2
+
+        avatar_path = Path(avatar_path)
+        path = self.cache_path(avatar_path, 'faces', pads, resize_factor, img_size)
+        if path.exists():
+            return path
+
+        boxes = self.get_boxes(avatar_path, pads, resize_factor)
+
+        with self._avatar_lock(avatar_path):
+            if path.exists():
+                return path
+
+            streaming = self._import_streaming()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._temp_path(path)
+            try:
+                faces = np.lib.format.open_memmap(
+                    tmp_path, mode='w+', dtype=np.uint8, shape=(len(boxes), 6, img_size, img_size)
+                )
+                frames = streaming.read_frames(avatar_path, transform=self._transform(resize_factor))
+                for position, frame in frames:
+                    x1, y1, x2, y2 = boxes[position]
+                    face = cv2.resize(frame[y1:y2, x1:x2], (img_size, img_size))
+                    streaming.pack_face(faces[position], face)
+                faces.flush()
+                del faces
+
+                self._remove_stale(avatar_path, keep=path)
+                os.replace(tmp_path, path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            logger.info(f"Compiled {len(boxes)} face crops for {avatar_path.name}")
+            return path
+
+    def _save(self, avatar_path: Path, path: Path, array):
+        import numpy as np
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._remove_stale(avatar_path, keep=path)
+        tmp_path = self._temp_path(path)
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    def _temp_path(path: Path) -> Path:
+        """
+        A file name next to ``path``, unique to this write
+
+        Other threads, pool workers and gunicorn workers may compile the same
+        avatar at once; each writes its own file, and the last os.replace wins.
+        """
+        return path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+
+    @staticmethod
+    def _load(path: Path):
+        import numpy as np
+        # Copy-on-write so torch.from_numpy can wrap slices without a copy or warning
+        return np.load(path, mmap_mode='c')
+
+    @staticmethod
+    def _transform(resize_factor: int):
+        if resize_factor <= 1:
+            return None
+
+        import cv2
+        return lambda frame: cv2.resize(
+            frame, (frame.shape[1] // resize_factor, frame.shape[0] // resize_factor)
+        )
+
+    def _remove_stale(self, avatar_path: Path, keep: Path):
+        """Delete artifacts computed from earlier contents of this avatar"""
+        prefix = f"{Path(avatar_path).name}."
+        content = keep.name[len(prefix):].split('.')[0]
+        for stale in keep.parent.iterdir():
+            if not stale.name.startswith(prefix):
+                continue
+            # <content>.<settings>.<kind>.npy; other avatars sharing the prefix have more fields
+            fields = stale.name[len(prefix):].split('.')
+            if len(fields) == 4 and fields[3] == 'npy' and fields[0] != content:
+                stale.unlink()
+
+    def _avatar_lock(self, avatar_path: Path) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(str(avatar_path), threading.Lock())
+
+    def _import_streaming(self):
+        wav2lip_path = str(self.registry.wav2lip_dir)
+        if wav2lip_path not in sys.path:
+            sys.path.insert(0, wav2lip_path)
+        import streaming
+        return streaming
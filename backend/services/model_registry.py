@@ -0,0 +1,671 @@
+"""
+Model Registry
+Keeps Wav2Lip generator checkpoints and the S3FD face detector resident per worker process
+"""
+
+import os
+import sys
+import time
+import uuid
+import logging
+import threading
+import importlib.util
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SERVICE_DIR.parent
+PROJECT_ROOT = BACKEND_DIR.parent
+
+MODELS_DIR = Path(os.getenv('MODELS_DIR', str(BACKEND_DIR / 'models')))
+WAV2LIP_DIR = Path(os.getenv('WAV2LIP_DIR', str(PROJECT_ROOT / 'Wav2Lip-master')))
+
+# Checkpoint name -> file name inside MODELS_DIR/wav2lip
+CHECKPOINTS = {
+    'wav2lip': 'wav2lip.pth',
+    'wav2lip_gan': 'wav2lip_gan.pth',
+}
+FACE_DETECTOR_FILE = 's3fd.pth'
+FACE_DETECTOR_KEY = 's3fd'
+
+# Fold BatchNorm into conv weights of the fp32 / bf16 generator
+FUSE_BATCHNORM = os.getenv('WAV2LIP_FUSE_BN', '1') == '1'
+FUSION_TOLERANCE = 1e-4
+
+# Calibration inputs for int8 quantization, see benchmark_wav2lip.py quantize
+CALIBRATION_FILE = 'calibration.npz'
+
+# Inference backends: eager PyTorch, or ONNX Runtime on the CPU
+BACKENDS = ('torch', 'onnx')
+FACE_DETECTOR_BACKEND = os.getenv('FACE_DETECTOR_BACKEND', 'torch')
+# Maximum detection batches waiting on the shared detector
+FACE_DETECTOR_QUEUE_SIZE = int(os.getenv('FACE_DETECTOR_QUEUE_SIZE', '8'))
+
+DEFAULT_CHECKPOINT = os.getenv('WAV2LIP_CHECKPOINT', 'wav2lip_gan')
+# Checkpoints loaded by warm_up(), comma separated
+WARMUP_CHECKPOINTS = [
+    name.strip() for name in os.getenv('WAV2LIP_CHECKPOINTS', DEFAULT_CHECKPOINT).split(',')
+    if name.strip()
+]
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models.
+
+    Each model is loaded at most once per worker process and shared by every
+    request. Entries can be preloaded with ``warm_up`` and dropped with ``evict``.
+    """
+
+    def __init__(self, models_dir: Path = MODELS_DIR, wav2lip_dir: Path = WAV2LIP_DIR):
+        self.models_dir = Path(models_dir)
+        self.wav2lip_dir = Path(wav2lip_dir).resolve()
+        self._device = None
+        self._models: Dict[str, object] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._shared: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def device(self) -> str:
+        """Device models are placed on ('cuda' when available, else 'cpu')"""
+        if self._device is None:
+            import torch
+            self._device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        return self._device
+
+    def checkpoint_path(self, name: Optional[str] = None) -> Path:
+        """Resolve a checkpoint name (wav2lip / wav2lip_gan) to its weights file"""
+        name = name or DEFAULT_CHECKPOINT
+        if name not in CHECKPOINTS:
+            raise ValueError(
+                f"Unknown Wav2Lip checkpoint: {name}. "
+                f"Expected one of: {', '.join(CHECKPOINTS)}"
+            )
+        return self.models_dir / 'wav2lip' / CHECKPOINTS[name]
+
+    @property
+    def face_detector_path(self) -> Path:
+        return self.models_dir / 'wav2lip' / FACE_DETECTOR_FILE
+
+    def onnx_path(self, weights_path: Path) -> Path:
+        """Exported ONNX model stored next to a PyTorch weights file"""
+        return Path(weights_path).with_suffix('.onnx')
+
+    @property
+    def calibration_path(self) -> Path:
+        return self.models_dir / 'wav2lip' / CALIBRATION_FILE
+
+    def weights_path(self, checkpoint_path: Path) -> Path:
+        """Memory-mappable inference weights converted from a checkpoint, stored next to it"""
+        return Path(checkpoint_path).with_suffix('.safetensors')
+
+    def fused_path(self, checkpoint_path: Path) -> Path:
+        """Cached Conv+BatchNorm fused weights stored next to a checkpoint"""
+        return Path(checkpoint_path).with_suffix('.fused.safetensors')
+
+    def quantized_path(self, checkpoint_path: Path) -> Path:
+        """Cached int8 state dict stored next to a checkpoint"""
+        return Path(checkpoint_path).with_suffix('.int8.pth')
+
+    def get_wav2lip(
+        self,
+        name: Optional[str] = None,
+        channels_last: bool = False,
+        backend: str = 'torch',
+        quantized: bool = False
+    ):
+        """
+        Return the resident Wav2Lip model for a checkpoint, loading it on first use
+
+        Args:
+            name: Checkpoint name (defaults to WAV2LIP_CHECKPOINT)
+            channels_last: Return a copy converted to channels_last memory
+                format, kept resident under ``<name>:channels_last``
+            backend: 'torch', or 'onnx' for an ONNX Runtime session kept
+                resident under ``<name>:onnx`` (exported on first use)
+            quantized: Return the int8 CPU model kept resident under
+                ``<name>:int8`` (calibrated and cached on first use)
+        """
+        name = name or DEFAULT_CHECKPOINT
+        checkpoint_path = self.checkpoint_path(name)
+        key = self.wav2lip_key(name, channels_last, backend, quantized)
+        if backend == 'onnx':
+            return self._get_or_load(key, lambda: self._load_wav2lip_onnx(checkpoint_path))
+        if quantized:
+            return self._get_or_load(key, lambda: self._load_wav2lip_int8(checkpoint_path))
+        return self._get_or_load(key, lambda: self._load_wav2lip(checkpoint_path, channels_last=channels_last))
+
+    @staticmethod
+    def wav2lip_key(name: Optional[str] = None, channels_last: bool = False,
+                    backend: str = 'torch', quantized: bool = False) -> str:
+        """Registry key of a generator variant, as listed in stats() and accepted by evict()"""
+        name = name or DEFAULT_CHECKPOINT
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend: {backend}. Expected one of: {', '.join(BACKENDS)}")
+        if backend == 'onnx':
+            return f"{name}:onnx"
+        if quantized:
+            return f"{name}:int8"
+        if channels_last:
+            return f"{name}:channels_last"
+        return name
+
+    def get_face_detector(self):
+        """Return the resident S3FD face detector, loading it on first use"""
+        return self._get_or_load(FACE_DETECTOR_KEY, self._load_face_detector)
+
+    def warm_up(self, names: Optional[List[str]] = None) -> Dict:
+        """
+        Preload checkpoints and the face detector
+
+        Args:
+            names: Checkpoint names to load (defaults to WAV2LIP_CHECKPOINTS)
+
+        Returns:
+            Registry stats after loading
+        """
+        for name in names or WARMUP_CHECKPOINTS:
+            try:
+                self.get_wav2lip(name)
+            except Exception as e:
+                logger.error(f"Warm-up failed for checkpoint {name}: {e}")
+        try:
+            self.get_face_detector()
+        except Exception as e:
+            logger.error(f"Warm-up failed for face detector: {e}")
+        return self.stats()
+
+    def evict(self, name: Optional[str] = None) -> List[str]:
+        """
+        Drop resident models so their memory can be reclaimed
+
+        Args:
+            name: Model key to evict, or None to evict everything
+
+        Returns:
+            Keys that were evicted
+        """
+        with self._lock:
+            keys = list(self._models) if name is None else [name]
+            evicted = []
+            for key in keys:
+                model = self._models.pop(key, None)
+                if model is None:
+                    continue
+                # The shared detector owns a worker thread
+                if hasattr(model, 'close'):
+                    model.close()
+                evicted.append(key)
+            for key in evicted:
+                self._stats[key]['resident'] = False
+                self._stats[key]['memory_bytes'] = 0
+                self._stats[key]['evictions'] += 1
+
+        if evicted:
+            logger.info(f"Evicted models: {', '.join(evicted)}")
+            self._release_device_memory()
+        return evicted
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def share_weights(self, key: str) -> Dict:
+        """
+        Move a resident CPU model's weights into shared memory
+
+        Returns:
+            Parameter and buffer tensors by name, empty for models that have
+            no torch weights (ONNX sessions) or live on a GPU. Passed to
+            worker processes, which attach them with adopt_shared_weights().
+        """
+        with self._lock:
+            module = self._torch_module(self._models[key])
+            if module is None or self.device != 'cpu' or key.endswith(':int8'):
+                return {}
+            # Workers map the same weights file, so its pages are already shared
+            if getattr(module, 'weights_file', None):
+                return {}
+            module.share_memory()
+            tensors = dict(module.named_parameters())
+            tensors.update(module.named_buffers())
+            return {name: tensor.data for name, tensor in tensors.items()}
+
+    def adopt_shared_weights(self, shared: Dict[str, Dict]):
+        """
+        Use weights shared by a parent process for models loaded from now on
+
+        Args:
+            shared: Registry key -> tensors returned by share_weights()
+        """
+        with self._lock:
+            self._shared.update({key: tensors for key, tensors in shared.items() if tensors})
+
+    def stats(self) -> Dict:
+        """Load time, memory footprint and hit counts per model"""
+        with self._lock:
+            return {
+                'device': self._device,
+                'default_checkpoint': DEFAULT_CHECKPOINT,
+                'models': {key: dict(value) for key, value in self._stats.items()},
+                'memory_bytes': sum(s['memory_bytes'] for s in self._stats.values()),
+            }
+
+    def _get_or_load(self, key: str, loader):
+        with self._lock:
+            stats = self._stats.setdefault(key, {
+                'resident': False,
+                'hits': 0,
+                'misses': 0,
+                'loads': 0,
+                'evictions': 0,
+                'load_time_seconds': None,
+                'memory_bytes': 0,
+                'shared_memory': False,
+                'weights_file': None,
+                'loaded_at': None,
+            })
+
+            model = self._models.get(key)
+            if model is not None:
+                stats['hits'] += 1
+                return model
+
+            stats['misses'] += 1
+            start = time.perf_counter()
+            model = loader()
+            if key in self._shared:
+                # The private copy just loaded is freed once every tensor is swapped out
+                self._attach_weights(self._torch_module(model), self._shared[key])
+                shared = True
+            else:
+                shared = False
+            load_time = time.perf_counter() - start
+
+            self._models[key] = model
+            stats.update({
+                'resident': True,
+                'loads': stats['loads'] + 1,
+                'load_time_seconds': round(load_time, 3),
+                'memory_bytes': self._memory_footprint(model),
+                'shared_memory': shared,
+                'weights_file': getattr(self._torch_module(model), 'weights_file', None),
+                'loaded_at': time.time(),
+            })
+            logger.info(f"Loaded {key} in {load_time:.2f}s")
+            return model
+
+    def _ensure_wav2lip_path(self):
+        wav2lip_path = str(self.wav2lip_dir)
+        if wav2lip_path not in sys.path:
+            sys.path.insert(0, wav2lip_path)
+
+    def _load_wav2lip(self, checkpoint_path: Path, channels_last: bool = False, fuse: bool = FUSE_BATCHNORM):
+        """
+        Load a Wav2Lip generator checkpoint
+
+        The weights come from the memory-mapped file converted from the
+        checkpoint (see Wav2Lip-master/convert_weights.py), created on first
+        use. With ``fuse`` the BatchNorm layers are folded into their convs;
+        the fused weights are cached next to the checkpoint as well and
+        reused while the checkpoint is unchanged.
+        """
+        import torch
+
+        weights_path = self.weights_path(checkpoint_path)
+        if not checkpoint_path.exists() and not weights_path.exists():
+            raise FileNotFoundError(
+                f"Wav2Lip model not found at {checkpoint_path}. "
+                "Please download it from https://github.com/Rudrabha/Wav2Lip "
+                "and place it in the models/wav2lip directory."
+            )
+
+        self._ensure_wav2lip_path()
+        import fusion
+        import mmap_weights
+
+        Wav2Lip = import_wav2lip_models(self.wav2lip_dir).Wav2Lip
+        model = Wav2Lip().eval()
+        fused_path = self.fused_path(checkpoint_path)
+
+        loaded = self._load_converted(fused_path, checkpoint_path) if fuse else None
+        if loaded is not None:
+            logger.info(f"Mapping fused weights from: {fused_path}")
+            fusion.fuse_model(model)
+            mmap_weights.assign(model, loaded[0])
+            mapped = loaded[1]
+        else:
+            state_dict, mapped = self._load_state_dict(checkpoint_path)
+            mmap_weights.assign(model, state_dict)
+            if fuse:
+                self._fuse_and_cache(model, fused_path, checkpoint_path)
+                mapped = None
+
+        model = model.to(self.device)
+        if channels_last:
+            model = model.to(memory_format=torch.channels_last)
+            mapped = None
+        # Weights still backed by the file rather than by private memory
+        model.weights_file = str(mapped) if mapped and self.device == 'cpu' else None
+        return model.eval()
+
+    def _load_state_dict(self, checkpoint_path: Path):
+        """
+        Inference weights of a checkpoint, converting it on first use
+
+        Returns:
+            (state dict, path of the file it is mapped from or None)
+        """
+        import torch
+        import mmap_weights
+
+        weights_path = self.weights_path(checkpoint_path)
+        loaded = self._load_converted(weights_path, checkpoint_path)
+        if loaded is not None:
+            logger.info(f"Mapping weights from: {weights_path}")
+            return loaded
+
+        logger.info(f"Loading checkpoint from: {checkpoint_path}")
+        checkpoint = torch.load(checkpoint_path, map_location=lambda storage, loc: storage)
+        state_dict = mmap_weights.strip_checkpoint(checkpoint)
+        try:
+            mmap_weights.save(state_dict, weights_path,
+                              metadata={'source': mmap_weights.source_signature(checkpoint_path)})
+        except OSError as e:
+            # A read-only models directory only costs the faster load next time
+            logger.warning(f"Could not save {weights_path.name}, using the checkpoint as loaded: {e}")
+            return state_dict, None
+        logger.info(f"Converted {checkpoint_path.name} to {weights_path.name}")
+        return state_dict, None
+
+    @staticmethod
+    def _load_converted(path: Path, checkpoint_path: Path):
+        """
+        Map a converted weights file unless it is missing or older than its checkpoint
+
+        Returns:
+            (state dict, path if the tensors are still file-backed else None), or None
+        """
+        import torch
+        import mmap_weights
+
+        if not path.exists():
+            return None
+        try:
+            state_dict, metadata = mmap_weights.load(path, dtype=torch.float32)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable {path.name}: {e}")
+            return None
+        # Without the original checkpoint the converted file is all there is
+        if checkpoint_path.exists() and metadata.get('source') != mmap_weights.source_signature(checkpoint_path):
+            logger.info(f"{path.name} is older than {checkpoint_path.name}, converting again")
+            return None
+        # fp16 files are upcast on load, which copies the tensors out of the mapping
+        return state_dict, (None if metadata.get('half') == 'True' else path)
+
+    def _fuse_and_cache(self, model, fused_path: Path, checkpoint_path: Path):
+        """Fold BatchNorm into the convs after checking outputs are unchanged, and save the result"""
+        import torch
+        import fusion
+        import mmap_weights
+
+        inputs = (torch.rand(2, 1, 80, 16), torch.rand(2, 6, 96, 96))
+        error = fusion.max_fusion_error(model, inputs)
+        if error > FUSION_TOLERANCE:
+            raise ValueError(f"Conv+BatchNorm fusion changed outputs by {error:.2e}")
+
+        blocks = fusion.fuse_model(model)
+        metadata = {}
+        if checkpoint_path.exists():
+            metadata['source'] = mmap_weights.source_signature(checkpoint_path)
+        try:
+            mmap_weights.save(model.state_dict(), fused_path, metadata=metadata)
+        except OSError as e:
+            logger.warning(f"Fused {blocks} Conv+BatchNorm blocks but could not save {fused_path.name}: {e}")
+            return
+        logger.info(f"Fused {blocks} Conv+BatchNorm blocks into {fused_path.name} (max error {error:.2e})")
+
+    def _load_wav2lip_onnx(self, checkpoint_path: Path):
+        """Load a Wav2Lip checkpoint as an ONNX Runtime session, exporting it if needed"""
+        self._ensure_wav2lip_path()
+        import onnx_backend
+
+        onnx_path = self.onnx_path(checkpoint_path)
+        if not self._onnx_current(onnx_path, checkpoint_path):
+            model = self._load_wav2lip(checkpoint_path).cpu()
+            error = self._export(
+                onnx_path,
+                lambda path: onnx_backend.export_wav2lip(model, path),
+                lambda path: onnx_backend.verify_wav2lip(model, path),
+                source=checkpoint_path
+            )
+            logger.info(f"Exported {onnx_path.name} (max abs error vs PyTorch {error:.2e})")
+
+        return onnx_backend.OnnxWav2Lip(onnx_path)
+
+    def _load_wav2lip_int8(self, checkpoint_path: Path):
+        """Load the int8 model for a checkpoint, calibrating and caching it if needed"""
+        import torch
+
+        self._ensure_wav2lip_path()
+        import quantization
+
+        # Quantization folds the BatchNorm layers itself
+        model = self._load_wav2lip(checkpoint_path, fuse=False).cpu()
+        engine = quantization.quantized_engine()
+        quantized_path = self.quantized_path(checkpoint_path)
+
+        if quantized_path.exists():
+            saved = torch.load(quantized_path, map_location='cpu')
+            if saved.get('torch_version') == torch.__version__ and saved.get('engine') == engine:
+                return quantization.quantized_from_state_dict(model, saved['state_dict'], engine)
+            logger.info(f"{quantized_path.name} was built by another torch version or engine, recalibrating")
+
+        if not self.calibration_path.exists():
+            raise FileNotFoundError(
+                f"Calibration sample not found at {self.calibration_path}. "
+                "Create it with: python benchmark_wav2lip.py quantize --avatar <avatar> --audio <speech.wav>"
+            )
+
+        start = time.perf_counter()
+        quantized = quantization.quantize(
+            model, quantization.load_calibration_sample(self.calibration_path), engine
+        )
+        tmp_path = _temp_path(quantized_path)
+        try:
+            torch.save({
+                'state_dict': quantized.state_dict(),
+                'torch_version': torch.__version__,
+                'engine': engine,
+            }, tmp_path)
+            os.replace(tmp_path, quantized_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        logger.info(f"Calibrated {quantized_path.name} in {time.perf_counter() - start:.1f}s")
+        return quantized
+
+    def _load_face_detector(self):
+        """Load the S3FD face detector as a thread-safe shared instance"""
+        self._ensure_wav2lip_path()
+        import face_detection
+
+        path_to_detector = self._face_detector_weights()
+        if path_to_detector is not None:
+            path_to_detector = str(path_to_detector)
+
+        if FACE_DETECTOR_BACKEND == 'onnx':
+            return face_detection.get_shared_detector(
+                device='cpu',
+                path_to_detector=path_to_detector,
+                max_pending=FACE_DETECTOR_QUEUE_SIZE,
+                path_to_onnx=str(self._export_face_detector())
+            )
+
+        detector = face_detection.get_shared_detector(
+            device=self.device,
+            path_to_detector=path_to_detector,
+            max_pending=FACE_DETECTOR_QUEUE_SIZE
+        )
+        if path_to_detector is not None and path_to_detector.endswith('.safetensors') and self.device == 'cpu':
+            import mmap_weights
+            _, metadata, _ = mmap_weights.read_header(path_to_detector)
+            if metadata.get('half') != 'True':
+                self._torch_module(detector).weights_file = path_to_detector
+        return detector
+
+    def _face_detector_weights(self) -> Optional[Path]:
+        """
+        S3FD weights converted to the memory-mappable format, converting them on first use
+
+        The original weights file is returned when the conversion cannot be saved
+        (a read-only models directory).
+        """
+        if not self.face_detector_path.exists() and not self.weights_path(self.face_detector_path).exists():
+            return None
+        self._ensure_wav2lip_path()
+        weights_path = self.weights_path(self.face_detector_path)
+        if self._load_converted(weights_path, self.face_detector_path) is None:
+            self._load_state_dict(self.face_detector_path)
+            if self._load_converted(weights_path, self.face_detector_path) is None:
+                return self.face_detector_path
+        return weights_path
+
+    def _export_face_detector(self) -> Path:
+        """Export S3FD to ONNX next to its weights unless already done"""
+        import onnx_backend
+        import mmap_weights
+        from face_detection.detection.sfd.net_s3fd import s3fd
+
+        onnx_path = self.onnx_path(self.face_detector_path)
+        if self._onnx_current(onnx_path, self.face_detector_path):
+            return onnx_path
+        weights_path = self._face_detector_weights()
+        if weights_path is None:
+            raise FileNotFoundError(
+                f"S3FD weights not found at {self.face_detector_path}; "
+                "they are needed to export the ONNX face detector."
+            )
+
+        net = s3fd()
+        mmap_weights.assign(net, self._load_state_dict(self.face_detector_path)[0])
+        error = self._export(
+            onnx_path,
+            lambda path: onnx_backend.export_s3fd(net, path),
+            lambda path: onnx_backend.verify_s3fd(net, path),
+            source=self.face_detector_path
+        )
+        logger.info(f"Exported {onnx_path.name} (max abs error vs PyTorch {error:.2e})")
+        return onnx_path
+
+    @staticmethod
+    def _onnx_current(onnx_path: Path, source: Path) -> bool:
+        """True when ``onnx_path`` exists and was exported from the current ``source`` weights"""
+        import onnx_backend
+
+        if not onnx_path.exists():
+            return False
+        # Without the original weights the export is all there is
+        if source.exists() and not onnx_backend.exported_from(onnx_path, source):
+            logger.info(f"{onnx_path.name} is older than {source.name}, exporting again")
+            return False
+        return True
+
+    @staticmethod
+    def _export(path: Path, export, verify, source: Path) -> float:
+        """
+        Export into a temporary file, check it against PyTorch, then move it into
+        place and record ``source``, the weights it was exported from
+        """
+        import onnx_backend
+
+        tmp_path = _temp_path(path, suffix='.tmp.onnx')
+        try:
+            export(tmp_path)
+            error = verify(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        # Recorded after the model is in place, so an interrupted export runs again
+        if source.exists():
+            onnx_backend.record_source(path, source)
+        return error
+
+    @staticmethod
+    def _torch_module(model):
+        """The nn.Module holding a model's weights (the S3FD net for the shared detector)"""
+        module = getattr(model, 'face_detector', model)
+        module = getattr(module, 'face_detector', module)
+        return module if hasattr(module, 'named_parameters') else None
+
+    def _attach_weights(self, module, tensors: Dict):
+        """Point a module's parameters and buffers at the given tensors, without copying"""
+        self._ensure_wav2lip_path()
+        import mmap_weights
+        mmap_weights.assign(module, tensors, strict=False)
+
+    @staticmethod
+    def _memory_footprint(model) -> int:
+        """Bytes held by parameters and buffers of a model (or of its .face_detector)"""
+        module = getattr(model, 'face_detector', model)
+        module = getattr(module, 'face_detector', module)
+        if hasattr(module, 'session'):
+            return os.path.getsize(module.path)
+        if not hasattr(module, 'parameters'):
+            return 0
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def _release_device_memory(self):
+        if self._device == 'cuda':
+            import torch
+            torch.cuda.empty_cache()
+
+
+def _temp_path(path: Path, suffix: str = '.tmp') -> Path:
+    """A file name next to ``path``, unique to this write; each process converting a model writes its own"""
+    return path.with_name(f"{path.name}.{uuid.uuid4().hex}{suffix}")
+
+
+def import_wav2lip_models(wav2lip_dir: Path = WAV2LIP_DIR):
+    """
+    Import the Wav2Lip ``models`` package under a private module name
+
+    The backend has its own ``models`` package (auth models), so a plain
+    ``from models import Wav2Lip`` resolves to whichever was imported first.
+    """
+    module = sys.modules.get('wav2lip_models')
+    if module is not None:
+        return module
+
+    package_dir = Path(wav2lip_dir).resolve() / 'models'
+    spec = importlib.util.spec_from_file_location(
+        'wav2lip_models',
+        package_dir / '__init__.py',
+        submodule_search_locations=[str(package_dir)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['wav2lip_models'] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules['wav2lip_models']
+        raise
+    return module
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Return the process-wide model registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
@@ -0,0 +1,146 @@
+"""
+Readiness
+Import policy for heavy modules, and the warm-up state reported by /ready
+"""
+
+import sys
+import time
+import logging
+import importlib
+import threading
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# When each heavy third-party module may be imported. profile_startup.py --check
+# fails when app.py pulls in a module below 'startup' at import time.
+#   startup: imported with app.py; every request needs it (routing, auth, database)
+#   warmup:  imported by the warm-up thread (WAV2LIP_WARMUP=1), else by the first lip-sync job
+#   lazy:    imported by the one endpoint that uses it; too rarely needed to pay for up front
+IMPORT_POLICY = {
+    'flask': 'startup',
+    'flask_cors': 'startup',
+    'dotenv': 'startup',
+    'sqlalchemy': 'startup',
+    'jwt': 'startup',
+    'numpy': 'warmup',
+    'cv2': 'warmup',
+    'torch': 'warmup',
+    'scipy': 'warmup',
+    'librosa': 'warmup',
+    'onnxruntime': 'warmup',
+    'whisper': 'lazy',
+    'elevenlabs': 'lazy',
+}
+
+# Imported by the warm-up thread ahead of the models (onnxruntime comes with
+# the ONNX models); the Wav2Lip modules need its directory on sys.path
+WARMUP_MODULES = ['numpy', 'cv2', 'torch', 'scipy.signal', 'librosa']
+WAV2LIP_WARMUP_MODULES = ['audio', 'streaming', 'face_detection']
+
+STATES = ('starting', 'warming', 'ready', 'failed')
+
+
+class Readiness:
+    """
+    Warm-up progress of this process
+
+    ``/health`` only reports that the process is up; ``/ready`` reports
+    this state, which turns 'ready' once the warm-up thread has imported the
+    heavy modules and loaded the models (or at startup when warm-up is
+    disabled and everything loads on first use).
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._state = 'starting'
+        self._warm = False
+        self._imports: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._gpu_available: Optional[bool] = None
+        self._ready_after: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def gpu_available(self) -> Optional[bool]:
+        """CUDA availability recorded by the warm-up, None until then"""
+        return self._gpu_available
+
+    def record_gpu(self):
+        """Record CUDA availability; only called once torch is imported"""
+        torch = sys.modules.get('torch')
+        if torch is not None:
+            self._gpu_available = bool(torch.cuda.is_available())
+
+    def is_ready(self) -> bool:
+        return self._state == 'ready'
+
+    def set_state(self, state: str, warm: bool = False):
+        if state not in STATES:
+            raise ValueError(f"Unknown readiness state: {state}. Expected one of: {', '.join(STATES)}")
+        with self._lock:
+            self._state = state
+            self._warm = warm
+            if state in ('ready', 'failed'):
+                self._ready_after = round(time.time() - self.started_at, 3)
+        logger.info(f"Readiness: {state}")
+
+    def preload(self, modules: Iterable[str], path: Optional[str] = None) -> Dict[str, float]:
+        """
+        Import modules ahead of the first request, timing each
+
+        Args:
+            modules: Module names to import
+            path: Directory added to sys.path first (the Wav2Lip checkout)
+
+        Returns:
+            Seconds per module imported by this call
+        """
+        if path is not None and path not in sys.path:
+            sys.path.insert(0, path)
+
+        timings = {}
+        for name in modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                logger.warning(f"Preloading {name} failed: {e}")
+                with self._lock:
+                    self._errors[name] = str(e)
+                continue
+            timings[name] = round(time.perf_counter() - start, 3)
+
+        with self._lock:
+            self._imports.update(timings)
+        logger.info(f"Preloaded {', '.join(timings)} in {sum(timings.values()):.2f}s")
+        return timings
+
+    def record_error(self, name: str, error: Exception):
+        with self._lock:
+            self._errors[name] = str(error)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'ready': self._state == 'ready',
+                'state': self._state,
+                'warm': self._warm,
+                'uptime_seconds': round(time.time() - self.started_at, 3),
+                'ready_after_seconds': self._ready_after,
+                'gpu_available': self._gpu_available,
+                'imports_seconds': dict(self._imports),
+                'errors': dict(self._errors),
+            }
+
+
+_readiness = Readiness()
+
+
+def get_readiness() -> Readiness:
+    """Return the readiness state of this process"""
+    return _readiness
@@ -31,6 +31,21 @@ VIDEO_SPECS = {
 }
 
 
+def h264_output_args(resolution: Tuple[int, int], fps: int) -> list:
+    """FFmpeg output options for the final H.264/AAC render"""
+    width, height = resolution
+    return [
+        '-c:v', VIDEO_SPECS['CODEC'],  # Video codec
+        '-preset', 'medium',  # Encoding preset
+        '-crf', str(VIDEO_SPECS['CRF']),  # Quality (lower = better)
+        '-pix_fmt', 'yuv420p',
+        '-c:a', VIDEO_SPECS['AUDIO_CODEC'],  # Audio codec
+        '-b:a', VIDEO_SPECS['AUDIO_BITRATE'],  # Audio bitrate
+        '-r', str(fps),  # Frame rate
+        '-vf', f'scale={width}:{height}',  # Resolution
+    ]
+
+
 class RenderService:
     """
     Video rendering service for final output
@@ -105,20 +120,20 @@ class RenderService:
         """Render video using FFmpeg"""
         logger.info(f"Rendering video: {output_path}")
         
-        width, height = self.resolution
+        if self._is_render_ready(video_path):
+            # Lip-sync output was already encoded to the final spec: copy the
+            # video stream instead of decoding and re-encoding it
+            logger.info("Input already matches output spec, copying video stream")
+            video_args = ['-c:v', 'copy', '-c:a', VIDEO_SPECS['AUDIO_CODEC'], '-b:a', VIDEO_SPECS['AUDIO_BITRATE']]
+        else:
+            video_args = h264_output_args(self.resolution, self.fps)
         
         cmd = [
             'ffmpeg',
             '-y',  # Overwrite output
             '-i', str(video_path),  # Input video
             '-i', str(audio_path),  # Input audio
-            '-c:v', 'libx264',  # Video codec
-            '-preset', 'medium',  # Encoding preset
-            '-crf', '23',  # Quality (lower = better)
-            '-c:a', 'aac',  # Audio codec
-            '-b:a', '192k',  # Audio bitrate
-            '-r', str(self.fps),  # Frame rate
-            '-vf', f'scale={width}:{height}',  # Resolution
+            *video_args,
             '-map', '0:v:0',  # Use video from first input
             '-map', '1:a:0',  # Use audio from second input
             '-shortest',  # Match shortest stream
@@ -139,6 +154,29 @@ class RenderService:
         
         logger.info(f"Video rendered successfully: {output_path}")
     
+    def _is_render_ready(self, video_path: Path) -> bool:
+        """Check whether a video is already H.264 at the output resolution and frame rate"""
+        try:
+            video_info = self.get_video_info(str(video_path))
+        except Exception:
+            return False
+        
+        streams = video_info.get('streams', [])
+        video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        if not video_stream:
+            return False
+        
+        fps_str = video_stream.get('r_frame_rate', '0/1')
+        num, den = map(int, fps_str.split('/')) if '/' in fps_str else (float(fps_str), 1)
+        fps = num / den if den > 0 else 0
+        
+        return (
+            video_stream.get('codec_name') == 'h264'
+            and video_stream.get('pix_fmt') == 'yuv420p'
+            and (video_stream.get('width'), video_stream.get('height')) == tuple(self.resolution)
+            and abs(fps - self.fps) < 0.01
+        )
+    
     def _generate_thumbnail(self, video_path: Path, output_path: Path):
         """Generate thumbnail from video"""
         cmd = [
@@ -0,0 +1,128 @@
+"""
+Result Cache
+Content-addressed store of finished lip-sync videos with size-bounded LRU eviction
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SERVICE_DIR.parent
+RESULT_CACHE_DIR = Path(os.getenv('WAV2LIP_RESULT_CACHE_DIR', str(BACKEND_DIR / 'cache' / 'lipsync')))
+# Total size of cached videos before the least recently used are evicted (0 disables the cache)
+RESULT_CACHE_MB = int(os.getenv('WAV2LIP_RESULT_CACHE_MB', '2048'))
+# Bump when the rendering pipeline changes what a key produces
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class ResultCache:
+    """
+    Lip-sync outputs keyed by the content of their inputs
+
+    A key hashes the input files (avatar, audio, checkpoint, ...) by content
+    together with the settings that change the rendered pixels. Entries are
+    ``<key>.mp4`` files in ``root``; a hit refreshes the file's mtime, and
+    once the store exceeds ``max_bytes`` the entries with the oldest mtime
+    are deleted.
+    """
+
+    def __init__(self, root: Path = RESULT_CACHE_DIR, max_bytes: int = RESULT_CACHE_MB << 20):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._digests: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def key(self, files: Iterable[Path], settings: Dict) -> str:
+        """Hex key of a job from its input files and rendering settings"""
+        parts = [CACHE_VERSION, [self.file_hash(path) for path in files], settings]
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def file_hash(self, path: Path) -> str:
+        """SHA-256 of a file, memoized on (size, mtime)"""
+        path = Path(path)
+        stat = path.stat()
+        signature = (stat.st_size, stat.st_mtime_ns)
+
+        cached = self._digests.get(str(path))
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        self._digests[str(path)] = (signature, digest)
+        return digest
+
+    def get(self, key: str, output_path: Path) -> bool:
+        """Copy the cached result for ``key`` to ``output_path``; False on a miss"""
+        path = self._entry_path(key)
+        with self._lock:
+            if not path.exists():
+                self._stats['misses'] += 1
+                return False
+            self._stats['hits'] += 1
+            os.utime(path)
+            shutil.copyfile(path, output_path)
+            return True
+
+    def put(self, key: str, result_path: Path):
+        """Store a finished result under ``key`` and evict down to ``max_bytes``"""
+        path = self._entry_path(key)
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + '.tmp')
+            shutil.copyfile(result_path, tmp_path)
+            os.replace(tmp_path, path)
+            self._stats['stores'] += 1
+            self._evict()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._entries()
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(
+                self._stats,
+                hit_rate=round(self._stats['hits'] / lookups, 3) if lookups else None,
+                entries=len(entries),
+                bytes=sum(size for _, _, size in entries),
+                max_bytes=self.max_bytes,
+            )
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / f"{key}.mp4"
+
+    def _entries(self):
+        """(mtime, path, size) of every cached result, oldest first"""
+        if not self.root.exists():
+            return []
+        entries = []
+        for path in self.root.glob('*.mp4'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        return sorted(entries)
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self._stats['evictions'] += 1
+            logger.info(f"Evicted cached lip-sync result {path.name}")
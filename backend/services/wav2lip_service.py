@@ -5,13 +5,24 @@ Generates lip-synced video from audio and avatar video using the Wav2Lip model
 
 import os
 import sys
+import time
 import logging
 import subprocess
+from fractions import Fraction
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 import tempfile
 import imageio_ffmpeg
 
+from .model_registry import (
+    get_model_registry, DEFAULT_CHECKPOINT, BACKENDS, FACE_DETECTOR_KEY, FACE_DETECTOR_BACKEND, FUSE_BATCHNORM
+)
+from .render_service import RenderService, h264_output_args
+from .avatar_cache import AvatarCache
+from .result_cache import ResultCache, RESULT_CACHE_MB
+from .worker_pool import Wav2LipWorkerPool, JOBS_DIR, WAV2LIP_WORKERS
+
 logger = logging.getLogger(__name__)
 
 # Configuration from environment
@@ -24,16 +35,88 @@ TEMP_DIR = Path(os.getenv('TEMP_DIR', str(BACKEND_DIR / 'temp')))
 AVATARS_DIR = Path(os.getenv('AVATARS_DIR', str(BACKEND_DIR / 'avatars')))
 WAV2LIP_DIR = Path(os.getenv('WAV2LIP_DIR', str(PROJECT_ROOT / 'Wav2Lip-master')))
 
+FACE_PADS = [0, 10, 0, 0]  # top, bottom, left, right
+FACE_DET_BATCH_SIZE = 16
+# Detect faces on every Nth avatar frame (1 = every frame) and on frames that
+# differ from the last keyframe by more than the threshold (mean gray levels)
+FACE_DET_KEYFRAME_INTERVAL = int(os.getenv('FACE_DET_KEYFRAME_INTERVAL', '1'))
+FACE_DET_KEYFRAME_THRESHOLD = float(os.getenv('FACE_DET_KEYFRAME_THRESHOLD', '0'))
+# Run face detection on frames downscaled by this factor (boxes and lip-sync
+# stay at full resolution)
+FACE_DET_SCALE = float(os.getenv('FACE_DET_SCALE', '1.0'))
+IMG_SIZE = 96  # Wav2Lip face crop size
+# Threads pasting generated faces back into frames
+COMPOSITE_WORKERS = int(os.getenv('WAV2LIP_COMPOSITE_WORKERS', '4'))
+
+# Generator precision: fp32, bf16 autocast (oneDNN on CPU-only nodes) or
+# int8 static quantization of the conv blocks (CPU)
+PRECISIONS = ('fp32', 'bf16', 'int8')
+DEFAULT_PRECISION = os.getenv('WAV2LIP_PRECISION', 'fp32')
+CHANNELS_LAST = os.getenv('WAV2LIP_CHANNELS_LAST', '0') == '1'
+# Generator runtime: eager PyTorch, or ONNX Runtime on the CPU
+DEFAULT_BACKEND = os.getenv('WAV2LIP_BACKEND', 'torch')
+# Where jobs run: in the request's process (workers only retry failures),
+# or always on the worker pool
+EXECUTION_MODES = ('inline', 'pool')
+EXECUTION = os.getenv('WAV2LIP_EXECUTION', 'inline')
+# Load the weights once here and map them into the workers from shared memory
+SHARE_WEIGHTS = os.getenv('WAV2LIP_SHARE_WEIGHTS', '1') == '1'
+# Long jobs are split at silences into segments of about this many seconds,
+# rendered in parallel on the worker pool (0 disables splitting)
+SEGMENT_SECONDS = float(os.getenv('WAV2LIP_SEGMENT_SECONDS', '30'))
+# Frames quieter than this many dB below the loudest frame count as silence
+SILENCE_THRESHOLD_DB = float(os.getenv('WAV2LIP_SILENCE_DB', '40'))
+# Keep the original avatar face in pauses of at least SILENCE_MIN_SECONDS
+# instead of running the model, crossfading over CROSSFADE_FRAMES at each end
+SKIP_SILENCE = os.getenv('WAV2LIP_SKIP_SILENCE', '0') == '1'
+SILENCE_MIN_SECONDS = float(os.getenv('WAV2LIP_SILENCE_MIN_SECONDS', '0.5'))
+CROSSFADE_FRAMES = int(os.getenv('WAV2LIP_CROSSFADE_FRAMES', '3'))
+# Stats of this many recent jobs are kept for /api/wav2lip/generate responses
+JOB_STATS_LIMIT = 100
+
 
 class Wav2LipService:
     """Wav2Lip lip-sync video generation service"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        checkpoint: Optional[str] = None,
+        precision: Optional[str] = None,
+        channels_last: Optional[bool] = None,
+        backend: Optional[str] = None,
+        worker_pool: Optional[bool] = None
+    ):
         self.wav2lip_dir = WAV2LIP_DIR.resolve()
-        self.checkpoint_path = MODELS_DIR / 'wav2lip' / 'wav2lip_gan.pth'
-        self.face_det_path = MODELS_DIR / 'wav2lip' / 's3fd.pth'
-        self._model = None
-        self._device = None
+        self.registry = get_model_registry()
+        self.checkpoint_name = checkpoint or DEFAULT_CHECKPOINT
+        self.checkpoint_path = self.registry.checkpoint_path(self.checkpoint_name)
+        
+        self.precision = precision or DEFAULT_PRECISION
+        if self.precision not in PRECISIONS:
+            raise ValueError(
+                f"Unknown Wav2Lip precision: {self.precision}. "
+                f"Expected one of: {', '.join(PRECISIONS)}"
+            )
+        self.channels_last = CHANNELS_LAST if channels_last is None else channels_last
+        
+        self.backend = backend or DEFAULT_BACKEND
+        if self.backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown Wav2Lip backend: {self.backend}. "
+                f"Expected one of: {', '.join(BACKENDS)}"
+            )
+        if self.backend == 'onnx' and (self.precision != 'fp32' or self.channels_last):
+            raise ValueError("The onnx backend only runs fp32 without channels_last")
+        if self.precision == 'int8' and (self.backend != 'torch' or self.channels_last):
+            raise ValueError("int8 runs on the torch backend without channels_last")
+        self.face_det_path = self.registry.face_detector_path
+        self.avatar_cache = AvatarCache(
+            self.registry,
+            FACE_DET_BATCH_SIZE,
+            keyframe_interval=FACE_DET_KEYFRAME_INTERVAL,
+            keyframe_threshold=FACE_DET_KEYFRAME_THRESHOLD,
+            detection_scale=FACE_DET_SCALE
+        )
         
         # Get FFmpeg executable path
         # Get FFmpeg executable path
@@ -47,6 +130,11 @@ class Wav2LipService:
             logger.warning(f"imageio-ffmpeg at {self.ffmpeg_path} failed, trying system 'ffmpeg' command")
             self.ffmpeg_path = 'ffmpeg'
         
+        # Lip-sync output is encoded straight to the final render spec
+        renderer = RenderService()
+        self.output_fps = renderer.fps
+        self.output_args = h264_output_args(renderer.resolution, renderer.fps)
+        
         # Ensure temp directories exist
         (TEMP_DIR / 'video').mkdir(parents=True, exist_ok=True)
         (TEMP_DIR / 'audio').mkdir(parents=True, exist_ok=True)
@@ -59,6 +147,32 @@ class Wav2LipService:
         if not self.checkpoint_path.exists():
             logger.warning(f"Wav2Lip model not found at {self.checkpoint_path}")
             logger.info("Download wav2lip_gan.pth from: https://github.com/Rudrabha/Wav2Lip")
+        
+        if EXECUTION not in EXECUTION_MODES:
+            raise ValueError(
+                f"Unknown Wav2Lip execution mode: {EXECUTION}. "
+                f"Expected one of: {', '.join(EXECUTION_MODES)}"
+            )
+        
+        # Isolated worker processes run jobs (pool mode) or retry jobs that fail in-process;
+        # they start with the first job (or the warm-up), not when the service is built
+        self.worker_pool = None
+        if WAV2LIP_WORKERS > 0 if worker_pool is None else worker_pool:
+            self.worker_pool = Wav2LipWorkerPool(
+                service_options={
+                    'checkpoint': self.checkpoint_name,
+                    'precision': self.precision,
+                    'channels_last': self.channels_last,
+                    'backend': self.backend,
+                },
+                shared_weights=self.share_weights if SHARE_WEIGHTS else None
+            )
+        
+        # Stats of recent jobs by job id (frames, skipped silent frames, time)
+        self.job_stats: Dict[str, Dict] = OrderedDict()
+        
+        # Finished videos keyed by input content, reused by retries and reruns
+        self.result_cache = ResultCache() if RESULT_CACHE_MB > 0 else None
     
     def generate(self, audio_path: str, avatar_id: str = 'default', job_id: str = None) -> Path:
         """
@@ -85,10 +199,24 @@ class Wav2LipService:
         output_dir.mkdir(parents=True, exist_ok=True)
         output_path = output_dir / f"{job_id}_lipsync.mp4"
         
+        cache_key = None
+        if self.result_cache is not None:
+            try:
+                cache_key = self.result_cache_key(avatar_path, audio_path)
+                if self.result_cache.get(cache_key, output_path):
+                    logger.info(f"Reusing cached lip-sync result {cache_key[:16]} for job {job_id}")
+                    return output_path
+            except OSError as e:
+                logger.warning(f"Lip-sync result cache unavailable: {e}")
+                cache_key = None
+        
         # Run Wav2Lip inference
         try:
-            self._run_wav2lip(avatar_path, audio_path, output_path)
-            return output_path
+            stats = self._run_wav2lip(avatar_path, audio_path, output_path)
+            if stats:
+                self.job_stats[job_id] = stats
+                while len(self.job_stats) > JOB_STATS_LIMIT:
+                    self.job_stats.popitem(last=False)
         except Exception as e:
             logger.error(f"Wav2Lip generation failed: {e}")
             logger.info("Falling back to original avatar video (no lip-sync)")
@@ -96,6 +224,53 @@ class Wav2LipService:
             import shutil
             shutil.copy2(avatar_path, output_path)
             return output_path
+        
+        # Outside the inference try: a failed cache write must not replace a good render
+        if cache_key is not None:
+            try:
+                # Keyed again: the render may have created the int8 or ONNX models
+                cache_key = self.result_cache_key(avatar_path, audio_path)
+                self.result_cache.put(cache_key, output_path)
+            except OSError as e:
+                logger.warning(f"Could not store lip-sync result {cache_key[:16]}: {e}")
+        return output_path
+    
+    def result_cache_key(self, avatar_path: Path, audio_path: Path) -> str:
+        """
+        Result cache key of a job: input file contents plus every setting that
+        changes the rendered video (batch sizes, worker counts and segmenting
+        do not)
+        
+        Models derived from the checkpoint (the int8 model and its calibration
+        sample, ONNX exports) count as inputs once they exist.
+        """
+        files = [avatar_path, audio_path, self.checkpoint_path]
+        if self.face_det_path.exists():
+            files.append(self.face_det_path)
+        derived = []
+        if self.precision == 'int8':
+            # The int8 model also records the quantized engine it was built for
+            derived += [self.registry.calibration_path, self.registry.quantized_path(self.checkpoint_path)]
+        if self.backend == 'onnx':
+            derived.append(self.registry.onnx_path(self.checkpoint_path))
+        if FACE_DETECTOR_BACKEND == 'onnx':
+            derived.append(self.registry.onnx_path(self.face_det_path))
+        files += [path for path in derived if path.exists()]
+        settings = {
+            'checkpoint': self.checkpoint_name,
+            'precision': self.precision,
+            'backend': self.backend,
+            'channels_last': self.channels_last,
+            'fuse_batchnorm': FUSE_BATCHNORM,
+            'pads': FACE_PADS,
+            'img_size': IMG_SIZE,
+            'keyframes': [FACE_DET_KEYFRAME_INTERVAL, FACE_DET_KEYFRAME_THRESHOLD],
+            'detection_scale': FACE_DET_SCALE,
+            'face_detector_backend': FACE_DETECTOR_BACKEND,
+            'skip_silence': [SKIP_SILENCE, SILENCE_THRESHOLD_DB, SILENCE_MIN_SECONDS, CROSSFADE_FRAMES],
+            'output_args': self.output_args,
+        }
+        return self.result_cache.key(files, settings)
     
     def _get_avatar_path(self, avatar_id: str) -> Path:
         """Get path to avatar video or image file"""
@@ -120,9 +295,12 @@ class Wav2LipService:
         
         raise FileNotFoundError(f"Avatar not found: {avatar_id}")
 
-    def _run_wav2lip(self, face_path: Path, audio_path: Path, output_path: Path):
+    def _run_wav2lip(self, face_path: Path, audio_path: Path, output_path: Path) -> Optional[Dict]:
         """
         Run Wav2Lip inference using the Wav2Lip-master inference script
+        
+        Returns:
+            Job stats: frames, skipped silent frames and their fraction, seconds
         """
         # Check if model exists
         if not self.checkpoint_path.exists():
@@ -138,20 +316,31 @@ class Wav2LipService:
         logger.info(f"  Output: {output_path}")
         logger.info(f"  Checkpoint: {self.checkpoint_path}")
         
-        # If input is an image, we MUST use subprocess (native implementation here is video-only)
+        # Images run natively through the still-avatar fast path, with no fallback
         is_image = face_path.suffix.lower() in ['.jpg', '.jpeg', '.png']
         
-        if is_image:
-            logger.info("Input is an image, using subprocess inference")
-            self._run_wav2lip_subprocess(face_path, audio_path, output_path)
-            return
-
-        # Try native Python integration first, fall back to subprocess
+        if self.worker_pool is not None:
+            # Spawns in the background, so a retry finds its worker already loading
+            self.worker_pool.start()
+        
+        if self.worker_pool is not None and self.worker_pool.size > 1 and SEGMENT_SECONDS > 0:
+            stats = self._run_segmented(face_path, audio_path, output_path)
+            if stats is not None:
+                return stats
+        
+        if EXECUTION == 'pool' and self.worker_pool is not None:
+            return self.worker_pool.run(face_path, audio_path, output_path)
+        
+        # Run in-process first, then retry videos on an isolated worker process
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
         try:
-            self._run_wav2lip_native(face_path, audio_path, output_path)
+            with tempfile.TemporaryDirectory(dir=JOBS_DIR) as work_dir:
+                return self._run_wav2lip_native(face_path, audio_path, output_path, Path(work_dir))
         except Exception as e:
-            logger.warning(f"Native Wav2Lip failed: {e}, trying subprocess method")
-            self._run_wav2lip_subprocess(face_path, audio_path, output_path)
+            if is_image or self.worker_pool is None:
+                raise
+            logger.warning(f"Native Wav2Lip failed: {e}, retrying on a worker process")
+            return self.worker_pool.run(face_path, audio_path, output_path)
     
     # ... (rest of native methods) ...
 
@@ -174,85 +363,193 @@ class Wav2LipService:
             })
         return avatars
     
-    def _run_wav2lip_native(self, face_path: Path, audio_path: Path, output_path: Path):
-        """Run Wav2Lip using native Python integration"""
-        import torch
-        import numpy as np
-        import cv2
+    def load_models(self) -> Tuple[object, str]:
+        """
+        Load this instance's generator variant and the face detector
+        
+        Returns:
+            (model, device) with the model resident in the registry
+        """
+        quantized = self.precision == 'int8'
+        model = self.registry.get_wav2lip(
+            self.checkpoint_name,
+            channels_last=self.channels_last,
+            backend=self.backend,
+            quantized=quantized
+        )
+        self.registry.get_face_detector()
+        device = 'cpu' if self.backend == 'onnx' or quantized else self.registry.device
+        return model, device
+    
+    def share_weights(self) -> Dict:
+        """
+        Load this instance's models and move their weights to shared memory
+        
+        Returns:
+            Registry key -> tensors, for Wav2LipWorkerPool workers to adopt.
+            Models without shareable torch weights (ONNX, int8, GPU) are omitted.
+        """
+        self.load_models()
+        keys = [FACE_DETECTOR_KEY]
+        if self.backend == 'torch' and self.precision != 'int8':
+            keys.append(self.registry.wav2lip_key(self.checkpoint_name, self.channels_last))
+        shared = {key: self.registry.share_weights(key) for key in keys}
+        return {key: tensors for key, tensors in shared.items() if tensors}
+    
+    def _run_segmented(self, face_path: Path, audio_path: Path, output_path: Path) -> Optional[Dict]:
+        """
+        Lip-sync a long job as segments rendered in parallel on the worker pool
+        
+        The audio is cut in silences. Every segment is encoded video-only with
+        the same settings, then the segments are joined with ffmpeg's concat
+        demuxer (stream copy) and the full audio track is muxed once.
+        
+        Returns:
+            Stats summed over the segments, or None (having rendered nothing)
+            when the job is too short to split
+        """
+        from concurrent.futures import ThreadPoolExecutor
         
-        # Add Wav2Lip directory to path
         wav2lip_path = str(self.wav2lip_dir)
         if wav2lip_path not in sys.path:
             sys.path.insert(0, wav2lip_path)
         
-        # Import Wav2Lip modules
-        try:
-            import audio as wav2lip_audio
-            from models import Wav2Lip
-        except ImportError as e:
-            raise ImportError(f"Failed to import Wav2Lip modules: {e}")
-        
-        # Set device
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        logger.info(f"Using device: {device}")
+        import audio as wav2lip_audio
+        import streaming
+        
+        fps = streaming.get_fps(face_path)
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=JOBS_DIR) as work_dir:
+            work_dir = Path(work_dir)
+            mel = self._load_mel(audio_path, work_dir)
+            num_frames = len(wav2lip_audio.mel_chunks(mel, fps))
+            speech = wav2lip_audio.speech_mask(
+                wav2lip_audio.frame_levels(mel, fps, num_frames), SILENCE_THRESHOLD_DB
+            )
+            
+            # Cut only where a whole number of output frames has elapsed, so
+            # the segment durations add up to the unsplit video exactly
+            segment_frames = int(SEGMENT_SECONDS * fps)
+            quantum = (Fraction(self.output_fps) / Fraction(fps).limit_denominator(1001)).denominator
+            if quantum > segment_frames // 2:
+                quantum = 1
+            segments = wav2lip_audio.split_at_silence(speech, segment_frames, quantum)
+            if len(segments) < 2:
+                return None
+            
+            # Compile the avatar once here instead of in every worker at once
+            self.avatar_cache.compile(face_path, FACE_PADS, IMG_SIZE)
+            
+            logger.info(
+                f"Rendering {num_frames} frames as {len(segments)} segments "
+                f"on {self.worker_pool.size} workers"
+            )
+            start = time.perf_counter()
+            segment_paths = [work_dir / f"segment_{i:04d}.mp4" for i in range(len(segments))]
+            with ThreadPoolExecutor(self.worker_pool.size) as executor:
+                segment_stats = list(executor.map(
+                    lambda job: self.worker_pool.run(face_path, audio_path, job[0], segment=job[1]),
+                    zip(segment_paths, segments)
+                ))
+            self._concat_segments(segment_paths, audio_path, output_path, work_dir)
+        
+        elapsed = time.perf_counter() - start
+        logger.info(f"Lip-synced {num_frames} frames in {len(segments)} segments in {elapsed:.1f}s")
+        skipped = sum(stats['skipped_frames'] for stats in segment_stats if stats)
+        return {
+            'frames': num_frames,
+            'skipped_frames': skipped,
+            'skipped_fraction': round(skipped / num_frames, 4) if num_frames else 0.0,
+            'seconds': round(elapsed, 2),
+            'segments': len(segments),
+        }
+    
+    def _concat_segments(self, segment_paths: list, audio_path: Path, output_path: Path, work_dir: Path):
+        """Join video-only segments without re-encoding and mux the audio track"""
+        list_path = work_dir / 'segments.txt'
+        list_path.write_text(''.join(f"file '{path.as_posix()}'\n" for path in segment_paths))
+        
+        options = dict(zip(self.output_args[::2], self.output_args[1::2]))
+        audio_args = [arg for key in ('-c:a', '-b:a') if key in options for arg in (key, options[key])]
+        result = subprocess.run([
+            self.ffmpeg_path, '-y', '-loglevel', 'error',
+            '-f', 'concat', '-safe', '0', '-i', str(list_path),
+            '-i', str(audio_path),
+            '-map', '0:v:0', '-map', '1:a:0',
+            '-c:v', 'copy', *audio_args, '-shortest',
+            str(output_path)
+        ], capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg concat failed: {result.stderr.decode(errors='replace')}")
+    
+    def _load_mel(self, audio_path: Path, work_dir: Path):
+        """Mel spectrogram of the job audio, converting it to 16 kHz WAV first if needed"""
+        import numpy as np
+        import audio as wav2lip_audio
         
-        # Load model
-        if self._model is None:
-            self._model = self._load_wav2lip_model(device)
-            self._device = device
+        audio_file = str(audio_path)
+        if not audio_file.endswith('.wav'):
+            temp_wav = work_dir / 'audio.wav'
+            subprocess.call([
+                self.ffmpeg_path, '-y', '-i', audio_file, 
+                '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1',
+                str(temp_wav)
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            audio_file = str(temp_wav)
         
-        # Process video
-        self._process_video_native(
-            face_path, audio_path, output_path, 
-            self._model, device
-        )
+        wav = wav2lip_audio.load_wav(audio_file, 16000)
+        mel = wav2lip_audio.melspectrogram(wav)
         
-        logger.info(f"Wav2Lip generation complete: {output_path}")
+        if np.isnan(mel.reshape(-1)).sum() > 0:
+            raise ValueError('Mel spectrogram contains NaN values')
+        return mel
     
-    def _load_wav2lip_model(self, device: str):
-        """Load the Wav2Lip model"""
-        import torch
-        
-        # Add Wav2Lip to path
+    def _run_wav2lip_native(
+        self,
+        face_path: Path,
+        audio_path: Path,
+        output_path: Path,
+        work_dir: Path,
+        segment: Optional[Tuple[int, int]] = None
+    ):
+        """Run Wav2Lip using native Python integration"""
+        # Add Wav2Lip directory to path
         wav2lip_path = str(self.wav2lip_dir)
         if wav2lip_path not in sys.path:
             sys.path.insert(0, wav2lip_path)
         
-        from models import Wav2Lip
-        
-        model = Wav2Lip()
-        logger.info(f"Loading checkpoint from: {self.checkpoint_path}")
-        
-        if device == 'cuda':
-            checkpoint = torch.load(self.checkpoint_path)
-        else:
-            checkpoint = torch.load(
-                self.checkpoint_path, 
-                map_location=lambda storage, loc: storage
-            )
-        
-        # Handle state dict with 'module.' prefix
-        state_dict = checkpoint["state_dict"]
-        new_state_dict = {}
-        for k, v in state_dict.items():
-            new_state_dict[k.replace('module.', '')] = v
+        # Resident model shared by every request in this process
+        model, device = self.load_models()
+        logger.info(
+            f"Using device: {device} ({self.backend}, {self.precision}"
+            f"{', channels_last' if self.channels_last else ''})"
+        )
         
-        model.load_state_dict(new_state_dict)
-        model = model.to(device)
+        # Process video
+        stats = self._process_video_native(
+            face_path, audio_path, output_path, 
+            model, device, work_dir, segment
+        )
         
-        logger.info("Wav2Lip model loaded successfully")
-        return model.eval()
-
+        logger.info(f"Wav2Lip generation complete: {output_path}")
+        return stats
+    
     def _process_video_native(
         self, 
         face_path: Path, 
         audio_path: Path, 
         output_path: Path,
         model,
-        device: str
+        device: str,
+        work_dir: Path,
+        segment: Optional[Tuple[int, int]] = None
     ):
-        """Process video with Wav2Lip model natively"""
-        import torch
+        """
+        Process video with Wav2Lip model natively as a bounded stream of frames
+        
+        With ``segment`` only output frames ``[start, end)`` are rendered, as
+        video without audio, for _run_segmented to join.
+        """
         import numpy as np
         import cv2
         
@@ -262,263 +559,119 @@ class Wav2LipService:
             sys.path.insert(0, wav2lip_path)
         
         import audio as wav2lip_audio
-        import face_detection
+        import streaming
         
         # Configuration
-        img_size = 96
+        img_size = IMG_SIZE
         mel_step_size = 16
         batch_size = 128
-        pads = [0, 10, 0, 0]  # top, bottom, left, right
-        
-        # Read video frames
-        video_stream = cv2.VideoCapture(str(face_path))
-        fps = video_stream.get(cv2.CAP_PROP_FPS) or 25
+        pads = FACE_PADS
         
-        full_frames = []
-        while True:
-            ret, frame = video_stream.read()
-            if not ret:
-                break
-            full_frames.append(frame)
-        video_stream.release()
-        
-        if not full_frames:
-            raise ValueError(f"Could not read frames from {face_path}")
-        
-        logger.info(f"Read {len(full_frames)} frames at {fps} fps")
+        fps = streaming.get_fps(face_path)
         
         # Convert audio to wav if needed and load mel spectrogram
-        audio_file = str(audio_path)
-        if not audio_file.endswith('.wav'):
-            temp_wav = TEMP_DIR / 'audio' / 'temp_audio.wav'
-            subprocess.call([
-                self.ffmpeg_path, '-y', '-i', audio_file, 
-                '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1',
-                str(temp_wav)
-            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            audio_file = str(temp_wav)
+        mel = self._load_mel(audio_path, work_dir)
         
-        wav = wav2lip_audio.load_wav(audio_file, 16000)
-        mel = wav2lip_audio.melspectrogram(wav)
-        
-        if np.isnan(mel.reshape(-1)).sum() > 0:
-            raise ValueError('Mel spectrogram contains NaN values')
+        # One mel window per video frame, as a strided view over the spectrogram
+        mel_chunks = wav2lip_audio.mel_chunks(mel, fps, mel_step_size)
         
-        # Create mel chunks
-        mel_chunks = []
-        mel_idx_multiplier = 80.0 / fps
-        i = 0
-        while True:
-            start_idx = int(i * mel_idx_multiplier)
-            if start_idx + mel_step_size > len(mel[0]):
-                mel_chunks.append(mel[:, len(mel[0]) - mel_step_size:])
-                break
-            mel_chunks.append(mel[:, start_idx:start_idx + mel_step_size])
-            i += 1
-        
-        logger.info(f"Created {len(mel_chunks)} mel chunks")
-        
-        # Trim frames to match mel chunks
-        full_frames = full_frames[:len(mel_chunks)]
-        
-        # Detect faces
-        detector = face_detection.FaceAlignment(
-            face_detection.LandmarksType._2D,
-            flip_input=False,
-            device=device
-        )
+        logger.info(f"Created {len(mel_chunks)} mel chunks at {fps} fps")
         
-        face_det_results = self._detect_faces(full_frames, detector, pads)
-        del detector
+        # Face boxes and masked/unmasked crops come precompiled from the avatar
+        # cache (memory-mapped); detection and cropping only run on a miss
+        boxes = self.avatar_cache.get_boxes(face_path, pads)
+        faces = self.avatar_cache.get_faces(face_path, pads, img_size)
         
-        # Generate lip-synced frames
-        frame_h, frame_w = full_frames[0].shape[:2]
-        temp_video = TEMP_DIR / 'video' / 'temp_result.avi'
+        # Frames deep inside pauses keep the original avatar face; the model
+        # only runs on speech and on the crossfades around each pause
+        weights = None
+        if SKIP_SILENCE:
+            speech = wav2lip_audio.speech_mask(
+                wav2lip_audio.frame_levels(mel, fps, len(mel_chunks)), SILENCE_THRESHOLD_DB
+            )
+            weights = wav2lip_audio.lip_sync_weights(
+                speech, int(round(SILENCE_MIN_SECONDS * fps)), CROSSFADE_FRAMES
+            )
         
-        out = cv2.VideoWriter(
-            str(temp_video),
-            cv2.VideoWriter_fourcc(*'DIVX'),
-            fps,
-            (frame_w, frame_h)
+        # A segment starts mid-render: same mel windows and looped avatar
+        # frames as the full render, and no audio until the segments are joined
+        first_frame = 0
+        if segment is not None:
+            start, end = segment
+            mel_chunks = wav2lip_audio.MelChunks(mel_chunks.windows, mel_chunks.starts[start:end])
+            first_frame = start % len(boxes)
+            audio_path = None
+            if weights is not None:
+                weights = weights[start:end]
+        skipped = 0 if weights is None else int((weights == 0).sum())
+        
+        # A still avatar feeds the same face crop every frame, so the face
+        # encoder runs once and only the audio encoder and decoder run per batch
+        if len(faces) == 1 and hasattr(model, 'encode_face'):
+            logger.info("Still avatar, reusing face encoder features for every frame")
+            model = streaming.StaticFaceModel(model)
+        
+        # decode -> mel-align run in a background thread, one batch ahead of the
+        # model, so only a couple of batches of frames are ever in memory
+        frames = streaming.read_frames(face_path, len(mel_chunks), start=first_frame)
+        batches = streaming.bundle_datagen(frames, faces, boxes, mel_chunks, batch_size)
+        if weights is not None:
+            batches = streaming.gate_silence(batches, weights)
+        batches = streaming.prefetch(batches)
+        # int8 is baked into the model, which then runs on plain float inputs
+        precision = 'fp32' if self.precision == 'int8' else self.precision
+        # The model runs in its own thread, one batch ahead of compositing;
+        # faces are pasted back on a thread pool and come out in frame order
+        predictions = streaming.prefetch(
+            streaming.run_model(batches, model, device, precision, self.channels_last)
         )
+        results = streaming.composite(predictions, COMPOSITE_WORKERS)
         
-        # Process in batches
-        for batch_data in self._generate_batches(
-            full_frames, mel_chunks, face_det_results, img_size, batch_size
-        ):
-            img_batch, mel_batch, frame_batch, coords_batch = batch_data
-            
-            img_batch = torch.FloatTensor(
-                np.transpose(img_batch, (0, 3, 1, 2))
-            ).to(device)
-            mel_batch = torch.FloatTensor(
-                np.transpose(mel_batch, (0, 3, 1, 2))
-            ).to(device)
-            
-            with torch.no_grad():
-                pred = model(mel_batch, img_batch)
-            
-            pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.0
-            
-            for p, f, c in zip(pred, frame_batch, coords_batch):
-                y1, y2, x1, x2 = c
-                p = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
-                f[y1:y2, x1:x2] = p
-                out.write(f)
-        
-        out.release()
-        
-        # Combine video with audio using ffmpeg
-        subprocess.call([
-            self.ffmpeg_path, '-y',
-            '-i', str(audio_path),
-            '-i', str(temp_video),
-            '-strict', '-2',
-            '-q:v', '1',
-            str(output_path)
-        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Pipe lip-synced frames into a single ffmpeg process that muxes the
+        # audio, scales and encodes H.264 in one pass
+        writer = None
+        meter = streaming.Throughput()
         
-        # Cleanup temp file
-        if temp_video.exists():
-            temp_video.unlink()
-
-    def _detect_faces(self, frames: list, detector, pads: list) -> list:
-        """Detect faces in all frames"""
-        import numpy as np
-        
-        batch_size = 16
-        predictions = []
-        
-        for i in range(0, len(frames), batch_size):
-            batch = np.array(frames[i:i + batch_size])
-            preds = detector.get_detections_for_batch(batch)
-            predictions.extend(preds)
-        
-        results = []
-        pady1, pady2, padx1, padx2 = pads
-        
-        for rect, image in zip(predictions, frames):
-            if rect is None:
-                raise ValueError(
-                    'Face not detected in frame. '
-                    'Ensure the video contains a visible face in all frames.'
-                )
-            
-            y1 = max(0, rect[1] - pady1)
-            y2 = min(image.shape[0], rect[3] + pady2)
-            x1 = max(0, rect[0] - padx1)
-            x2 = min(image.shape[1], rect[2] + padx2)
-            
-            results.append([image[y1:y2, x1:x2], (y1, y2, x1, x2)])
-        
-        return results
-    
-    def _generate_batches(
-        self, 
-        frames: list, 
-        mels: list, 
-        face_det_results: list,
-        img_size: int,
-        batch_size: int
-    ):
-        """Generate batches for Wav2Lip inference"""
-        import numpy as np
-        import cv2
-        
-        img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
-        
-        for i, m in enumerate(mels):
-            idx = i % len(frames)
-            frame_to_save = frames[idx].copy()
-            face, coords = face_det_results[idx]
-            face = face.copy()
-            
-            face = cv2.resize(face, (img_size, img_size))
-            
-            img_batch.append(face)
-            mel_batch.append(m)
-            frame_batch.append(frame_to_save)
-            coords_batch.append(coords)
-            
-            if len(img_batch) >= batch_size:
-                img_batch = np.asarray(img_batch)
-                mel_batch = np.asarray(mel_batch)
-                
-                # Mask lower half of face
-                img_masked = img_batch.copy()
-                img_masked[:, img_size // 2:] = 0
-                
-                img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.0
-                mel_batch = np.reshape(
-                    mel_batch, 
-                    [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1]
-                )
-                
-                yield img_batch, mel_batch, frame_batch, coords_batch
-                img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
-        
-        # Yield remaining
-        if len(img_batch) > 0:
-            img_batch = np.asarray(img_batch)
-            mel_batch = np.asarray(mel_batch)
-            
-            img_masked = img_batch.copy()
-            img_masked[:, img_size // 2:] = 0
-            
-            img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.0
-            mel_batch = np.reshape(
-                mel_batch, 
-                [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1]
+        try:
+            for frame in meter.track(results):
+                if writer is None:
+                    frame_h, frame_w = frame.shape[:2]
+                    writer = streaming.FFmpegWriter(
+                        self.ffmpeg_path,
+                        output_path,
+                        (frame_w, frame_h),
+                        fps,
+                        audio_path=audio_path,
+                        output_args=self.output_args
+                    )
+                writer.write(frame)
+        except streaming.FaceNotDetectedError:
+            if writer is not None:
+                writer.abort()
+            raise ValueError(
+                'Face not detected in frame. '
+                'Ensure the video contains a visible face in all frames.'
             )
-            
-            yield img_batch, mel_batch, frame_batch, coords_batch
-    
-    def _run_wav2lip_subprocess(self, face_path: Path, audio_path: Path, output_path: Path):
-        """Run Wav2Lip using subprocess (fallback method)"""
-        inference_script = self.wav2lip_dir / 'inference.py'
-        
-        if not inference_script.exists():
-            raise FileNotFoundError(f"Wav2Lip inference.py not found at {inference_script}")
-        
-        # Ensure temp directory exists in Wav2Lip folder
-        wav2lip_temp = self.wav2lip_dir / 'temp'
-        wav2lip_temp.mkdir(exist_ok=True)
-        
-        # Prepare environment with ffmpeg in path
-        env = os.environ.copy()
-        ffmpeg_dir = str(Path(self.ffmpeg_path).parent)
-        env['PATH'] = f"{ffmpeg_dir}{os.pathsep}{env.get('PATH', '')}"
-        
-        cmd = [
-            sys.executable,
-            str(inference_script),
-            '--checkpoint_path', str(self.checkpoint_path),
-            '--face', str(face_path),
-            '--audio', str(audio_path),
-            '--outfile', str(output_path),
-            '--pads', '0', '10', '0', '0',
-        ]
-        
-        logger.info(f"Running Wav2Lip subprocess: {' '.join(cmd)}")
-        logger.info(f"Using FFmpeg dir in PATH: {ffmpeg_dir}")
-        
-        result = subprocess.run(
-            cmd,
-            cwd=str(self.wav2lip_dir),
-            capture_output=True,
-            text=True,
-            env=env
-        )
-        
-        if result.returncode != 0:
-            logger.error(f"Wav2Lip stderr: {result.stderr}")
-            raise RuntimeError(f"Wav2Lip inference failed: {result.stderr}")
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
         
-        if not output_path.exists():
-            raise RuntimeError(f"Wav2Lip did not produce output file: {output_path}")
+        if writer is None:
+            raise ValueError(f"Could not read frames from {face_path}")
+        writer.close()
         
-        logger.info(f"Wav2Lip subprocess complete: {output_path}")
-    
+        logger.info(
+            f"Lip-synced {meter.frames} frames in {meter.elapsed:.1f}s "
+            f"({meter.fps:.1f} frames/sec, {skipped} silent frames skipped)"
+        )
+        return {
+            'frames': meter.frames,
+            'skipped_frames': skipped,
+            'skipped_fraction': round(skipped / meter.frames, 4) if meter.frames else 0.0,
+            'seconds': round(meter.elapsed, 2),
+        }
+
     def get_available_avatars(self) -> list:
         """Get list of available avatar videos and images"""
         AVATARS_DIR.mkdir(parents=True, exist_ok=True)
@@ -528,14 +681,23 @@ class Wav2LipService:
         files = []
         for ext in ['*.mp4', '*.jpg', '*.jpeg', '*.png']:
             files.extend(AVATARS_DIR.glob(ext))
-            
+        
+        uncached = []
         for f in files:
+            face_cache = self.avatar_cache.is_compiled(f, FACE_PADS, IMG_SIZE)
+            if not face_cache:
+                uncached.append(f)
             avatars.append({
                 'id': f.stem,
                 'name': f.stem.replace('_', ' ').replace('-', ' ').title(),
                 'path': str(f),
-                'type': 'image' if f.suffix.lower() in ['.jpg', '.jpeg', '.png'] else 'video'
+                'type': 'image' if f.suffix.lower() in ['.jpg', '.jpeg', '.png'] else 'video',
+                'face_cache': face_cache
             })
+        
+        # Compile new or changed avatars ahead of their first job
+        if uncached:
+            self.avatar_cache.compile_async(uncached, FACE_PADS, IMG_SIZE)
         return avatars
     
     def check_dependencies(self) -> dict:
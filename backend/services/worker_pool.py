@@ -0,0 +1,420 @@
+"""
+Wav2Lip Worker Pool
+Persistent worker processes that keep Wav2Lip models resident and run lip-sync jobs in isolation
+"""
+
+import os
+import time
+import uuid
+import queue
+import shutil
+import logging
+import threading
+import traceback
+import multiprocessing
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SERVICE_DIR.parent
+TEMP_DIR = Path(os.getenv('TEMP_DIR', str(BACKEND_DIR / 'temp')))
+JOBS_DIR = TEMP_DIR / 'jobs'
+
+# Number of worker processes (0 disables the pool)
+WAV2LIP_WORKERS = int(os.getenv('WAV2LIP_WORKERS', '1'))
+# Seconds a job may run before its worker is killed and restarted
+JOB_TIMEOUT = int(os.getenv('WAV2LIP_JOB_TIMEOUT', '1800'))
+# Seconds a worker may take to start and load its models
+READY_TIMEOUT = int(os.getenv('WAV2LIP_WORKER_READY_TIMEOUT', '300'))
+PING_TIMEOUT = 10
+# Seconds before starting a worker again after it failed to start, doubling up to the max
+SPAWN_BACKOFF = 1
+SPAWN_BACKOFF_MAX = 60
+# Intra-op threads per worker (0 splits the CPUs evenly between workers)
+WORKER_THREADS = int(os.getenv('WAV2LIP_WORKER_THREADS', '0'))
+# Pin each worker to its own block of CPUs
+WORKER_AFFINITY = os.getenv('WAV2LIP_WORKER_AFFINITY', '0') == '1'
+
+
+class WorkerCrashedError(RuntimeError):
+    """A worker process died while running a job"""
+
+
+class _Worker:
+    """Parent-side handle of one worker process"""
+
+    def __init__(self, index: int, service_options: Dict, runtime: Dict):
+        self.index = index
+        self.service_options = service_options
+        self.runtime = runtime
+        self.process = None
+        self.conn = None
+        self.jobs = 0
+        self.failures = 0
+        self.start_failures = 0
+        self.restarts = -1
+        self.started_at = None
+        self.ready = False
+        self.last_ping_ms = None
+
+    def start(self):
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.service_options, self.runtime),
+            name=f"wav2lip-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.ready = False
+        self.restarts += 1
+        self.started_at = time.time()
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Wait for the worker to report its models are loaded"""
+        message = self._recv(timeout)
+        if message and message[0] == 'ready':
+            self.ready = True
+            logger.info(f"Wav2Lip worker {self.index} ready (pid {self.process.pid})")
+            return True
+        error = message[1] if message else 'no response'
+        logger.error(f"Wav2Lip worker {self.index} failed to start: {error}")
+        return False
+
+    def ping(self, timeout: float = PING_TIMEOUT) -> bool:
+        if not self.is_alive():
+            return False
+        start = time.perf_counter()
+        try:
+            self.conn.send(('ping',))
+        except (BrokenPipeError, OSError):
+            return False
+        message = self._recv(timeout)
+        if not message or message[0] != 'pong':
+            return False
+        self.last_ping_ms = round((time.perf_counter() - start) * 1000, 1)
+        return True
+
+    def run(self, job: tuple, timeout: float):
+        """Send a job and wait for its stats, raising on failure, crash or timeout"""
+        try:
+            self.conn.send(job)
+        except (BrokenPipeError, EOFError, OSError) as e:
+            raise WorkerCrashedError(f"Wav2Lip worker {self.index} is gone: {e}")
+        deadline = time.monotonic() + timeout
+
+        while True:
+            if self.conn.poll(1.0):
+                try:
+                    message = self.conn.recv()
+                except (EOFError, OSError):
+                    raise WorkerCrashedError(f"Wav2Lip worker {self.index} crashed during job")
+                self.jobs += 1
+                if message[0] == 'done':
+                    return message[1]
+                self.failures += 1
+                logger.error(f"Wav2Lip worker {self.index} job failed:\n{message[2]}")
+                raise RuntimeError(message[1])
+
+            if not self.is_alive():
+                raise WorkerCrashedError(
+                    f"Wav2Lip worker {self.index} crashed during job "
+                    f"(exit code {self.process.exitcode})"
+                )
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Wav2Lip job exceeded {timeout}s")
+
+    def stop(self, timeout: float = 5):
+        if self.process is None:
+            return
+        if self.is_alive():
+            try:
+                self.conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout)
+        if self.is_alive():
+            self.process.kill()
+            self.process.join()
+        if self.conn is not None:
+            self.conn.close()
+        self.ready = False
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def status(self) -> Dict:
+        return {
+            'index': self.index,
+            'pid': self.process.pid if self.process else None,
+            'alive': self.is_alive(),
+            'ready': self.ready,
+            'jobs': self.jobs,
+            'failures': self.failures,
+            'start_failures': self.start_failures,
+            'restarts': max(self.restarts, 0),
+            'num_threads': self.runtime['num_threads'],
+            'cpus': self.runtime['cpus'],
+            'started_at': self.started_at,
+            'last_ping_ms': self.last_ping_ms,
+        }
+
+    def _recv(self, timeout: float):
+        try:
+            if self.conn.poll(timeout):
+                return self.conn.recv()
+        except (EOFError, OSError):
+            pass
+        return None
+
+
+class Wav2LipWorkerPool:
+    """
+    Pool of persistent Wav2Lip worker processes
+
+    Each worker builds its own Wav2LipService with the pool's options, loads
+    the models once and then serves jobs over a pipe. A job runs in its own
+    temp directory. Crashed, hung or unresponsive workers are restarted.
+
+    Every worker gets a fixed torch thread budget (optionally pinned to its
+    own CPUs) so that workers do not oversubscribe the machine. When
+    ``shared_weights`` is given it is called once in this process and must
+    return model weights in shared memory, keyed like the model registry;
+    workers then map those tensors instead of keeping private copies.
+    """
+
+    def __init__(
+        self,
+        size: int = WAV2LIP_WORKERS,
+        service_options: Optional[Dict] = None,
+        job_timeout: float = JOB_TIMEOUT,
+        ready_timeout: float = READY_TIMEOUT,
+        num_threads: int = WORKER_THREADS,
+        affinity: bool = WORKER_AFFINITY,
+        shared_weights: Optional[Callable[[], Dict]] = None
+    ):
+        self.size = size
+        self.service_options = dict(service_options or {})
+        self.job_timeout = job_timeout
+        self.ready_timeout = ready_timeout
+        self.num_threads = num_threads or max(1, (os.cpu_count() or 1) // max(size, 1))
+        self.affinity = affinity
+        self._shared_weights_loader = shared_weights
+        self._shared = None
+        self._shared_lock = threading.Lock()
+        self._workers: List[_Worker] = []
+        self._idle: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Spawn the workers; each joins the pool once its models are loaded"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            JOBS_DIR.mkdir(parents=True, exist_ok=True)
+            for index in range(self.size):
+                worker = _Worker(index, self.service_options, {
+                    'num_threads': self.num_threads,
+                    'cpus': self._cpu_block(index) if self.affinity else None,
+                })
+                self._workers.append(worker)
+                self._spawn(worker)
+
+    def run(self, face_path: Path, audio_path: Path, output_path: Path, segment: Optional[Tuple[int, int]] = None):
+        """Run one lip-sync job (or the ``(start, end)`` frame segment of one) on the next free worker
+
+        Returns:
+            The job's stats, as returned by Wav2LipService._run_wav2lip_native
+        """
+        self.start()
+        worker = self._next_idle()
+
+        work_dir = JOBS_DIR / uuid.uuid4().hex
+        work_dir.mkdir(parents=True)
+        job = ('job', str(face_path), str(audio_path), str(output_path), str(work_dir), segment)
+        try:
+            stats = worker.run(job, self.job_timeout)
+        except (WorkerCrashedError, TimeoutError):
+            self._restart(worker)
+            raise
+        except Exception:
+            self._idle.put(worker)
+            raise
+        else:
+            self._idle.put(worker)
+            return stats
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _next_idle(self) -> _Worker:
+        """
+        Wait for a free worker
+
+        Until a worker has loaded its models this waits up to ready_timeout;
+        after that the others are busy with jobs, which may run for
+        job_timeout (and a restart for ready_timeout) before one frees up.
+        """
+        start = time.monotonic()
+        while True:
+            started = any(worker.ready for worker in self._workers)
+            limit = self.job_timeout + self.ready_timeout if started else self.ready_timeout
+            remaining = start + limit - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("No Wav2Lip worker became available")
+            try:
+                return self._idle.get(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                continue
+
+    def health_check(self) -> Dict:
+        """Ping idle workers, restart dead or unresponsive ones, and report every worker"""
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+        for worker in idle:
+            if worker.ping():
+                self._idle.put(worker)
+            else:
+                logger.warning(f"Wav2Lip worker {worker.index} failed health check, restarting")
+                self._restart(worker)
+
+        workers = [worker.status() for worker in self._workers]
+        return {
+            'size': self.size,
+            'started': self._started,
+            'ready': sum(1 for w in workers if w['ready'] and w['alive']),
+            'idle': self._idle.qsize(),
+            'num_threads': self.num_threads,
+            'shared_weights': sorted(self._shared or {}),
+            'workers': workers,
+        }
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until every worker has loaded its models"""
+        self.start()
+        deadline = time.monotonic() + (self.ready_timeout if timeout is None else timeout)
+        while time.monotonic() < deadline:
+            if all(worker.ready and worker.is_alive() for worker in self._workers):
+                return True
+            time.sleep(0.2)
+        return False
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._idle = queue.Queue()
+            self._started = False
+
+    def _spawn(self, worker: _Worker):
+        """
+        Start a worker and add it to the idle queue once ready, without blocking
+
+        A worker that fails to start is started again after a backoff, until
+        the pool shuts down; its start_failures show in health_check.
+        """
+        def start():
+            delay = SPAWN_BACKOFF
+            while True:
+                try:
+                    worker.runtime['shared'] = self._shared_weights()
+                    worker.start()
+                    if worker.wait_ready(self.ready_timeout):
+                        self._idle.put(worker)
+                        return
+                except Exception as e:
+                    logger.error(f"Starting Wav2Lip worker {worker.index} failed: {e}")
+                worker.stop()
+                worker.start_failures += 1
+                if worker not in self._workers:
+                    return
+                logger.warning(f"Retrying Wav2Lip worker {worker.index} in {delay}s")
+                time.sleep(delay)
+                if worker not in self._workers:
+                    return
+                delay = min(delay * 2, SPAWN_BACKOFF_MAX)
+
+        threading.Thread(target=start, name=f"wav2lip-worker-{worker.index}-start", daemon=True).start()
+
+    def _restart(self, worker: _Worker):
+        worker.stop()
+        self._spawn(worker)
+
+    def _shared_weights(self) -> Dict:
+        """Resolve the shared-memory weights once; an empty dict makes workers load their own"""
+        with self._shared_lock:
+            if self._shared is None:
+                self._shared = {}
+                if self._shared_weights_loader is not None:
+                    try:
+                        self._shared = self._shared_weights_loader()
+                    except Exception as e:
+                        logger.warning(f"Sharing Wav2Lip weights failed, workers load their own: {e}")
+                if self._shared:
+                    # Registers the pickling of tensors as shared-memory handles
+                    import torch.multiprocessing  # noqa: F401
+                    logger.info(f"Sharing weights of {', '.join(sorted(self._shared))} with Wav2Lip workers")
+            return self._shared
+
+    def _cpu_block(self, index: int) -> List[int]:
+        """The CPUs of worker ``index``: consecutive blocks of num_threads, wrapping around"""
+        if hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(os.cpu_count() or 1))
+        start = index * self.num_threads
+        return [cpus[(start + i) % len(cpus)] for i in range(self.num_threads)]
+
+
+def _worker_main(conn, service_options: Dict, runtime: Dict):
+    """Entry point of a worker process"""
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s [worker {os.getpid()}] %(levelname)s %(message)s')
+
+    try:
+        if runtime['cpus'] and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, runtime['cpus'])
+        import torch
+        torch.set_num_threads(runtime['num_threads'])
+
+        from services.wav2lip_service import Wav2LipService
+        service = Wav2LipService(worker_pool=False, **service_options)
+        if runtime.get('shared'):
+            service.registry.adopt_shared_weights(runtime['shared'])
+        service.load_models()
+    except Exception as e:
+        conn.send(('failed', f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if message[0] == 'stop':
+            break
+        if message[0] == 'ping':
+            conn.send(('pong',))
+            continue
+
+        _, face_path, audio_path, output_path, work_dir, segment = message
+        try:
+            stats = service._run_wav2lip_native(
+                Path(face_path), Path(audio_path), Path(output_path), Path(work_dir), segment=segment
+            )
+            conn.send(('done', stats))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}", traceback.format_exc()))
@@ -0,0 +1,14 @@
+"""
+Test setup
+Puts the backend and the Wav2Lip checkout on sys.path, as app.py and the services do
+"""
+
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+WAV2LIP_DIR = BACKEND_DIR.parent / 'Wav2Lip-master'
+
+for path in (BACKEND_DIR, WAV2LIP_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,72 @@
+"""
+S3FD batch decoding
+The vectorized decode_batch against the per-hit loop batch_detect used to run
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+torch = pytest.importorskip('torch')
+pytest.importorskip('cv2')
+pytest.importorskip('scipy')
+
+from face_detection.detection.sfd.bbox import batch_decode
+from face_detection.detection.sfd.detect import decode_batch
+
+
+def decode_per_hit(olist):
+    """The original batch_detect loop: one prior and one batch_decode call per thresholded hit"""
+    BB = olist[0].size(0)
+    bboxlist = []
+    for i in range(len(olist) // 2):
+        ocls, oreg = olist[i * 2], olist[i * 2 + 1]
+        stride = 2**(i + 2)
+        poss = zip(*np.where(ocls[:, 1, :, :] > 0.05))
+        for Iindex, hindex, windex in poss:
+            axc, ayc = stride / 2 + windex * stride, stride / 2 + hindex * stride
+            score = ocls[:, 1, hindex, windex]
+            loc = oreg[:, :, hindex, windex].contiguous().view(BB, 1, 4)
+            priors = torch.Tensor([[axc / 1.0, ayc / 1.0, stride * 4 / 1.0, stride * 4 / 1.0]]).view(1, 1, 4)
+            variances = [0.1, 0.2]
+            box = batch_decode(loc, priors, variances)
+            box = box[:, 0] * 1.0
+            bboxlist.append(torch.cat([box, score.unsqueeze(1)], 1).cpu().numpy())
+    bboxlist = np.array(bboxlist)
+    if 0 == len(bboxlist):
+        bboxlist = np.zeros((1, BB, 5))
+    return bboxlist
+
+
+def random_olist(batch_size, size=32, levels=6, scale=1.0, seed=0):
+    """Softmaxed classification and raw regression maps shaped like the S3FD outputs"""
+    generator = torch.Generator().manual_seed(seed)
+    olist = []
+    for i in range(levels):
+        side = max(size >> i, 1)
+        ocls = torch.randn(batch_size, 2, side, side, generator=generator) * scale
+        olist.append(torch.softmax(ocls, dim=1))
+        olist.append(torch.randn(batch_size, 4, side, side, generator=generator))
+    return olist
+
+
+@pytest.mark.parametrize('batch_size', [1, 4])
+@pytest.mark.parametrize('scale', [1.0, 4.0])
+def test_decode_batch_matches_per_hit_loop(batch_size, scale):
+    olist = random_olist(batch_size, scale=scale)
+    expected = decode_per_hit(olist)
+    actual = decode_batch(olist)
+
+    assert len(actual) > 1
+    # Same rows, in the same order, from the same float32 arithmetic
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_decode_batch_without_hits():
+    olist = random_olist(3)
+    for i in range(0, len(olist), 2):
+        olist[i][:, 1] = 0.
+    expected = decode_per_hit(olist)
+    actual = decode_batch(olist)
+
+    assert actual.shape == expected.shape == (1, 3, 5)
+    np.testing.assert_array_equal(actual, expected)
@@ -0,0 +1,44 @@
+"""
+Conv + BatchNorm fusion
+Fused models against their unfused originals, with the tolerance the model registry enforces
+"""
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+import fusion
+from benchmark_wav2lip import _randomize_batchnorm
+from services.model_registry import import_wav2lip_models, WAV2LIP_DIR, FUSION_TOLERANCE
+
+
+def models_and_inputs():
+    models = import_wav2lip_models(WAV2LIP_DIR)
+    torch.manual_seed(0)
+    return {
+        'Wav2Lip': (models.Wav2Lip(), (torch.rand(2, 1, 80, 16), torch.rand(2, 6, 96, 96))),
+        'SyncNet_color': (models.SyncNet_color(), (torch.rand(2, 1, 80, 16), torch.rand(2, 15, 48, 96))),
+    }
+
+
+@pytest.mark.parametrize('name', ['Wav2Lip', 'SyncNet_color'])
+def test_fusion_preserves_outputs(name):
+    model, inputs = models_and_inputs()[name]
+    model = _randomize_batchnorm(model)
+
+    assert sum(1 for module in model.modules() if fusion.is_conv_bn_block(module)) > 0
+    assert fusion.max_fusion_error(model, inputs) <= FUSION_TOLERANCE
+
+
+def test_fuse_model_removes_every_batchnorm():
+    model, _ = models_and_inputs()['Wav2Lip']
+    blocks = fusion.fuse_model(_randomize_batchnorm(model))
+
+    assert blocks > 0
+    assert not any(isinstance(module, torch.nn.BatchNorm2d) for module in model.modules())
+
+
+def test_fuse_model_rejects_training_mode():
+    model, _ = models_and_inputs()['Wav2Lip']
+    with pytest.raises(ValueError):
+        fusion.fuse_model(model.train())
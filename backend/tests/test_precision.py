@@ -0,0 +1,52 @@
+"""
+bf16 and channels_last
+The reduced-precision generator against fp32, with the bound of benchmark_wav2lip.py precision
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+torch = pytest.importorskip('torch')
+
+from benchmark_wav2lip import run_generator, mouth_psnr, _randomize_batchnorm, PRECISION_MIN_PSNR
+from services.model_registry import import_wav2lip_models, WAV2LIP_DIR
+
+
+def random_model():
+    """An untrained generator whose BatchNorm statistics spread its outputs"""
+    torch.manual_seed(0)
+    return _randomize_batchnorm(import_wav2lip_models(WAV2LIP_DIR).Wav2Lip())
+
+
+def random_inputs(batches=2, batch_size=4, seed=0):
+    """(faces, mels) batches as streaming.bundle_datagen yields them: uint8 NCHW faces, NHWC mels"""
+    rng = np.random.default_rng(seed)
+    return [
+        (rng.integers(0, 256, (batch_size, 6, 96, 96), dtype=np.uint8),
+         rng.standard_normal((batch_size, 80, 16, 1)).astype(np.float32))
+        for _ in range(batches)
+    ]
+
+
+@pytest.mark.parametrize('channels_last', [False, True])
+def test_bf16_mouth_psnr(channels_last):
+    model = random_model()
+    inputs = random_inputs()
+
+    reference, _ = run_generator(model, inputs, 'cpu')
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    candidate, _ = run_generator(model, inputs, 'cpu', 'bf16', channels_last)
+
+    assert candidate.shape == reference.shape
+    assert mouth_psnr(reference, candidate) >= PRECISION_MIN_PSNR
+
+
+def test_channels_last_fp32_matches():
+    model = random_model()
+    inputs = random_inputs(batches=1)
+
+    reference, _ = run_generator(model, inputs, 'cpu')
+    candidate, _ = run_generator(model.to(memory_format=torch.channels_last), inputs, 'cpu', 'fp32', True)
+
+    np.testing.assert_allclose(candidate, reference, atol=1e-2)